@@ -0,0 +1,2 @@
+#!/usr/bin/env bash
+PYTHONPATH=src python3 -m bench "$@"
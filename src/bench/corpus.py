@@ -0,0 +1,96 @@
+import random
+
+WORDS = (
+    "the ring hobbit shire elf wizard road mountain river forest song king "
+    "tower shadow light star sword horse ship gate hall fire stone tree "
+    "journey council riddle dragon dwarf map lantern bridge valley"
+).split()
+
+PROFILES = ("small", "huge", "links", "lists")
+
+
+def _words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def _inline(rng, n, link_ratio=0.05):
+    parts = []
+    for _ in range(n):
+        roll = rng.random()
+        if roll < link_ratio:
+            parts.append(f"[{_words(rng, 2)}](/blog/{rng.choice(WORDS)})")
+        elif roll < link_ratio + 0.03:
+            parts.append(f"**{_words(rng, 2)}**")
+        elif roll < link_ratio + 0.06:
+            parts.append(f"_{_words(rng, 2)}_")
+        elif roll < link_ratio + 0.08:
+            parts.append(f"`{rng.choice(WORDS)}()`")
+        elif roll < link_ratio + 0.09:
+            parts.append(f"![{rng.choice(WORDS)}](/images/{rng.choice(WORDS)}.png)")
+        else:
+            parts.append(rng.choice(WORDS))
+    return " ".join(parts)
+
+
+def _block(rng, link_ratio=0.05, list_items=(2, 6)):
+    roll = rng.random()
+    if roll < 0.45:
+        lines = [_inline(rng, rng.randint(8, 20), link_ratio) for _ in range(rng.randint(1, 4))]
+        return "\n".join(lines)
+    if roll < 0.55:
+        return "#" * rng.randint(2, 4) + " " + _words(rng, rng.randint(2, 6))
+    if roll < 0.65:
+        lines = [f"    {_words(rng, rng.randint(2, 6))}" for _ in range(rng.randint(2, 8))]
+        return "```\n" + "\n".join(lines) + "\n```"
+    if roll < 0.72:
+        return "\n".join(f"> {_inline(rng, 10, link_ratio)}" for _ in range(rng.randint(1, 3)))
+    count = rng.randint(*list_items)
+    if roll < 0.86:
+        return "\n".join(f"- {_inline(rng, 6, link_ratio)}" for _ in range(count))
+    return "\n".join(f"{i}. {_inline(rng, 6, link_ratio)}" for i in range(1, count + 1))
+
+
+def generate_page(rng, blocks, link_ratio=0.05, list_items=(2, 6)):
+    parts = [f"# {_words(rng, 4).title()}"]
+    for _ in range(blocks):
+        parts.append(_block(rng, link_ratio, list_items))
+    return "\n\n".join(parts) + "\n"
+
+
+def _link_dense_page(rng, paragraphs):
+    parts = [f"# {_words(rng, 3).title()}"]
+    for _ in range(paragraphs):
+        parts.append(" ".join(f"[{_words(rng, 2)}](/p/{rng.randint(0, 10**6)})" for _ in range(200)))
+    return "\n\n".join(parts) + "\n"
+
+
+def _list_page(rng, lists, items):
+    parts = [f"# {_words(rng, 3).title()}"]
+    for _ in range(lists):
+        parts.append("\n".join(f"- {_inline(rng, 5)}" for _ in range(items)))
+        parts.append("\n".join(f"{i}. {_inline(rng, 5)}" for i in range(1, items + 1)))
+    return "\n\n".join(parts) + "\n"
+
+
+def generate_corpus(profile, seed=0, scale=1.0):
+    # Deterministic for a given (profile, seed, scale): benchmark runs made on
+    # different days or machines parse exactly the same input.
+    rng = random.Random(f"{profile}:{seed}")
+    pages = {}
+
+    if profile == "small":
+        for i in range(max(1, int(500 * scale))):
+            pages[f"small/{i:05d}/index.md"] = generate_page(rng, rng.randint(5, 20))
+    elif profile == "huge":
+        for i in range(3):
+            pages[f"huge/{i}/index.md"] = generate_page(rng, max(1, int(5000 * scale)))
+    elif profile == "links":
+        for i in range(max(1, int(20 * scale))):
+            pages[f"links/{i:03d}/index.md"] = _link_dense_page(rng, 25)
+    elif profile == "lists":
+        for i in range(max(1, int(20 * scale))):
+            pages[f"lists/{i:03d}/index.md"] = _list_page(rng, 10, 200)
+    else:
+        raise ValueError(f"Unknown corpus profile: {profile}")
+
+    return pages
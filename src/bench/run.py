@@ -0,0 +1,193 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench.corpus import PROFILES, generate_corpus
+from htmlnode import ParentNode
+from inline_markdown import text_to_textnodes
+from markdown_blocks import inline_cache, BlockType, block_to_block_type, block_to_html_node, markdown_to_blocks, scan_blocks
+from template import compile_template
+from textnode import text_node_to_html_node
+from urls import SiteUrls
+
+STAGES = ("split", "type", "inline", "nodes", "serialize", "template", "io")
+
+BENCH_TEMPLATE = """<!doctype html>
+<html>
+  <head>
+    <title>{{ Title }}</title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article>{{ Content }}</article>
+  </body>
+</html>
+"""
+
+
+def inline_texts(block):
+    lines = block.lines
+    if block.block_type == BlockType.PARAGRAPH:
+        return [" ".join(lines)]
+    if block.block_type == BlockType.HEADING:
+        return ["\n".join(lines).lstrip("#").strip()]
+    if block.block_type == BlockType.QUOTE:
+        return [" ".join(line.lstrip(">").lstrip(" ") for line in lines)]
+    if block.block_type == BlockType.ULIST:
+        return [line[2:] for line in lines]
+    if block.block_type == BlockType.OLIST:
+        return [line[line.find(". ") + 2 :] for line in lines]
+    return []
+
+
+def _timed(fn, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, {"min": min(times), "mean": sum(times) / len(times), "runs": repeat}
+
+
+def bench_corpus(pages, repeat=3):
+    # Each stage gets the previous stage's output precomputed, so the numbers
+    # measure that stage alone rather than everything before it.
+    docs = list(pages.values())
+    stages = {}
+
+    blocks, stages["split"] = _timed(lambda: [markdown_to_blocks(md) for md in docs], repeat)
+    _, stages["type"] = _timed(
+        lambda: [[block_to_block_type(b) for b in doc_blocks] for doc_blocks in blocks],
+        repeat,
+    )
+
+    scanned = [list(scan_blocks(md)) for md in docs]
+    texts = [text for doc in scanned for block in doc for text in inline_texts(block)]
+    textnodes, stages["inline"] = _timed(lambda: [text_to_textnodes(t) for t in texts], repeat)
+    _, stages["nodes"] = _timed(
+        lambda: [[text_node_to_html_node(tn) for tn in tns] for tns in textnodes],
+        repeat,
+    )
+
+    def build_trees():
+        # Start cold each run so only repeats within the corpus hit the cache.
+        inline_cache.clear()
+        return [ParentNode("div", [block_to_html_node(b) for b in doc]) for doc in scanned]
+
+    trees, build = _timed(build_trees, repeat)
+    tracemalloc.start()
+    peak_trees = build_trees()
+    tree_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del peak_trees
+
+    html, stages["serialize"] = _timed(lambda: [tree.to_html() for tree in trees], repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, "template.html")
+        with open(template_path, "w") as f:
+            f.write(BENCH_TEMPLATE)
+        template = compile_template(template_path, SiteUrls("/site/"))
+        rendered, stages["template"] = _timed(
+            lambda: [template.render(Title="Title", Content=h) for h in html],
+            repeat,
+        )
+
+        def io_round_trip():
+            for i, page in enumerate(rendered):
+                path = os.path.join(tmp, f"{i}.html")
+                with open(path, "w") as f:
+                    f.write(page)
+                with open(path, "r") as f:
+                    f.read()
+
+        _, stages["io"] = _timed(io_round_trip, repeat)
+
+    return {
+        "pages": len(docs),
+        "bytes": sum(len(md.encode("utf-8")) for md in docs),
+        "blocks": sum(len(doc) for doc in scanned),
+        "inline_texts": len(texts),
+        "stages": stages,
+        "tree_build": build,
+        "tree_peak_bytes": tree_peak,
+        "inline_cache": inline_cache.stats(),
+        "total_min": sum(stage["min"] for stage in stages.values()),
+    }
+
+
+def run(profiles=PROFILES, seed=0, scale=1.0, repeat=3):
+    results = {}
+    for profile in profiles:
+        pages = generate_corpus(profile, seed, scale)
+        results[profile] = bench_corpus(pages, repeat)
+
+    return {
+        "meta": {
+            "seed": seed,
+            "scale": scale,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def compare(old, new):
+    lines = []
+    for profile, result in new["results"].items():
+        before = old["results"].get(profile)
+        if before is None:
+            continue
+        for stage in STAGES:
+            a = before["stages"][stage]["min"]
+            b = result["stages"][stage]["min"]
+            ratio = b / a if a else float("inf")
+            lines.append(f"{profile:>6} {stage:>10}: {a * 1000:9.2f} ms -> {b * 1000:9.2f} ms  x{ratio:.2f}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the generator on synthetic corpora.")
+    parser.add_argument("profiles", nargs="*", metavar="profile", help=f"any of {', '.join(PROFILES)} (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", help="write the JSON results to this file")
+    parser.add_argument("--compare", help="print per-stage ratios against an earlier JSON result")
+    args = parser.parse_args(argv)
+
+    for profile in args.profiles:
+        if profile not in PROFILES:
+            parser.error(f"unknown profile {profile!r}")
+
+    report = run(args.profiles or PROFILES, args.seed, args.scale, args.repeat)
+
+    for profile, result in report["results"].items():
+        stages = "  ".join(f"{name}={stage['min'] * 1000:.1f}ms" for name, stage in result["stages"].items())
+        print(
+            f"{profile}: {result['pages']} pages, {result['bytes']} bytes  {stages}"
+            f"  tree_build={result['tree_build']['min'] * 1000:.1f}ms"
+            f"  tree_peak={result['tree_peak_bytes'] / 2**20:.1f}MiB",
+            file=sys.stderr,
+        )
+
+    if args.compare:
+        with open(args.compare) as f:
+            for line in compare(json.load(f), report):
+                print(line, file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        print()
@@ -0,0 +1,35 @@
+import unittest
+
+from bench.corpus import PROFILES, generate_corpus
+from bench.run import STAGES, bench_corpus, compare, run
+from markdown_blocks import markdown_to_html_node
+
+
+class TestCorpus(unittest.TestCase):
+    def test_generation_is_seeded(self):
+        self.assertEqual(generate_corpus("small", 7, 0.01), generate_corpus("small", 7, 0.01))
+        self.assertNotEqual(generate_corpus("small", 7, 0.01), generate_corpus("small", 8, 0.01))
+
+    def test_every_profile_parses(self):
+        for profile in PROFILES:
+            for markdown in generate_corpus(profile, 0, 0.01).values():
+                markdown_to_html_node(markdown).to_html()
+
+    def test_unknown_profile_raises(self):
+        with self.assertRaises(ValueError):
+            generate_corpus("nope")
+
+
+class TestRun(unittest.TestCase):
+    def test_bench_corpus_times_every_stage(self):
+        result = bench_corpus(generate_corpus("small", 0, 0.01), repeat=1)
+        self.assertEqual(sorted(result["stages"]), sorted(STAGES))
+        self.assertGreater(result["bytes"], 0)
+
+    def test_compare_reports_each_stage(self):
+        report = run(["links"], scale=0.01, repeat=1)
+        self.assertEqual(len(compare(report, report)), len(STAGES))
+
+
+if __name__ == "__main__":
+    unittest.main()
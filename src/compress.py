@@ -0,0 +1,96 @@
+import gzip
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from manifest import replace_if_changed
+
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".svg", ".json", ".js", ".xml", ".txt")
+
+# A sidecar must be at least this much smaller than its output to be worth
+# serving; otherwise the edge server might as well send the original.
+MIN_SAVING = 0.1
+
+SIDECAR_SUFFIX = ".gz"
+
+
+def is_compressible(path):
+    return path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def gzip_output(path):
+    # Writes path.gz and returns its hash, or removes it and returns None when
+    # compression doesn't pay off. mtime=0 keeps the bytes reproducible, so an
+    # unchanged output always yields an unchanged sidecar.
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+    sidecar = path + SIDECAR_SUFFIX
+    if len(compressed) > len(data) * (1 - MIN_SAVING):
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+        return None
+
+    tmp_path = sidecar + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(compressed)
+    return replace_if_changed(tmp_path, sidecar)
+
+
+def _gzip_job(path):
+    try:
+        return None, gzip_output(path)
+    except OSError as e:
+        return f"{type(e).__name__}: {e}", None
+
+
+def remove_sidecars(manifest, paths):
+    for path in paths:
+        sidecar = path + SIDECAR_SUFFIX
+        if os.path.exists(sidecar):
+            os.remove(sidecar)
+        manifest.forget_output(sidecar)
+        del manifest.sidecars[path]
+    return len(paths)
+
+
+def compress_outputs(manifest, jobs=1):
+    # Only outputs whose hash moved since their sidecar was made are
+    # recompressed; sidecars of removed outputs are deleted. Sidecars are
+    # recorded as outputs themselves so they show up in the deploy delta.
+    removed = remove_sidecars(manifest, [p for p in manifest.sidecars if p not in manifest.outputs])
+
+    compressible = [path for path in manifest.outputs if is_compressible(path)]
+    todo = sorted(path for path in compressible if manifest.sidecars.get(path) != manifest.outputs[path])
+
+    if jobs == 1 or len(todo) <= 1:
+        written, failures = _record_sidecars(manifest, todo, map(_gzip_job, todo))
+    else:
+        workers = jobs or os.cpu_count() or 1
+        chunksize = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(_gzip_job, todo, chunksize=chunksize)
+            written, failures = _record_sidecars(manifest, todo, results)
+
+    skipped = len(todo) - written - len(failures)
+    current = len(compressible) - len(todo)
+    print(f"{written} gzip sidecars written, {skipped} not worth it, {current} up to date, {removed} removed")
+    return failures
+
+
+def _record_sidecars(manifest, todo, results):
+    written = 0
+    failures = []
+    for path, (error, digest) in zip(todo, results):
+        sidecar = path + SIDECAR_SUFFIX
+        if error is not None:
+            print(f"Error compressing {path}: {error}")
+            failures.append((path, error))
+            continue
+        if digest is None:
+            manifest.forget_output(sidecar)
+        else:
+            manifest.record_output(sidecar, digest)
+            written += 1
+        manifest.sidecars[path] = manifest.outputs[path]
+    return written, failures
@@ -1,17 +1,202 @@
 import os
 import shutil
 
+from manifest import hash_file, remove_output
+from siteindex import DEFAULT_IGNORE, scan_static
+from urls import FINGERPRINT_EXTENSIONS, fingerprint_name
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request for a copy-on-write clone (Linux btrfs/xfs/...).
+FICLONE = 0x40049409
+
 def copy_files_recursive(src, dst):
-    if os.path.exists(dst):
-        shutil.rmtree(dst)
-    os.mkdir(dst)
-
-    for name in os.listdir(src):
-        src_path = os.path.join(src, name)
-        dst_path = os.path.join(dst, name)
-
-        if os.path.isfile(src_path):
-            shutil.copy(src_path, dst_path)
-        else:
-            os.mkdir(dst_path)
-            copy_files_recursive(src_path, dst_path)
+    os.makedirs(dst, exist_ok=True)
+
+    for f in scan_static(src, dst, ignore=()):
+        os.makedirs(os.path.dirname(f.output), exist_ok=True)
+        shutil.copy(f.path, f.output)
+
+def _clone_or_copy(src_path, tmp_path):
+    with open(src_path, "rb") as fsrc, open(tmp_path, "wb") as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError:
+                pass
+
+        if hasattr(os, "copy_file_range"):
+            size = os.fstat(fsrc.fileno()).st_size
+            try:
+                copied = 0
+                while copied < size:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size - copied)
+                    if n == 0:
+                        break
+                    copied += n
+                return
+            except OSError:
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+    # copyfile uses sendfile where the platform has it.
+    shutil.copyfile(src_path, tmp_path)
+
+def copy_file(src_path, dst_path, st, link=False):
+    # Copies land in a temp file first so readers never see half a file, then
+    # take the source's mtime so the next sync can compare size and mtime.
+    tmp_path = dst_path + ".tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+
+    if link:
+        try:
+            os.link(src_path, tmp_path)
+            os.replace(tmp_path, dst_path)
+            return
+        except OSError:
+            pass
+
+    _clone_or_copy(src_path, tmp_path)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_path, dst_path)
+
+def _is_current(src_path, st, dst_path, use_hash):
+    try:
+        dst_st = os.stat(dst_path)
+    except FileNotFoundError:
+        return False
+
+    if dst_st.st_size != st.st_size:
+        return False
+    if use_hash:
+        return hash_file(src_path) == hash_file(dst_path)
+    return dst_st.st_mtime_ns == st.st_mtime_ns
+
+def _sync_file(src_path, dst_dir, url, manifest, use_hash, link, assets, images, css, src_st=None):
+    # Copy one static file unless its output is current. Returns the output
+    # path and whether it was copied. `src_st` is the source's stat, if the
+    # caller already has it.
+    name = os.path.basename(src_path)
+    digest = manifest.file_hash(src_path, src_st) if manifest is not None else None
+
+    copy_path = src_path
+    output_digest = digest
+    if images is not None and name.endswith(".png"):
+        if digest is None:
+            digest = hash_file(src_path)
+        copy_path, output_digest, size = images.process(src_path, digest)
+        if size is not None and assets is not None:
+            assets.add_size(url, size)
+
+    if css is not None and name.endswith(".css"):
+        if digest is None:
+            digest = hash_file(src_path)
+        copy_path, output_digest = css.process(src_path, digest)
+        style = css.inline_text(copy_path) if assets is not None else None
+        if style is not None:
+            assets.add_style(url, style)
+
+    if assets is not None and assets.fingerprint and name.endswith(FINGERPRINT_EXTENSIONS):
+        if digest is None:
+            digest = hash_file(src_path)
+        name = fingerprint_name(name, digest)
+        assets.add(url, url[: -len(os.path.basename(url))] + name)
+
+    dst_path = os.path.join(dst_dir, name)
+    st = src_st if src_st is not None and copy_path == src_path else os.stat(copy_path)
+    copied = not _is_current(copy_path, st, dst_path, use_hash)
+    if copied:
+        # Hardlinks only make sense to the source itself, not to a cached
+        # optimised or minified copy.
+        copy_file(copy_path, dst_path, st, link and copy_path == src_path)
+
+    if manifest is not None:
+        manifest.record_asset(dst_path, src_path)
+        # A copy has its source's bytes, so reuse that hash.
+        manifest.record_output(dst_path, output_digest)
+    return dst_path, copied
+
+def sync_files(
+    src,
+    dst,
+    manifest=None,
+    use_hash=False,
+    link=False,
+    assets=None,
+    images=None,
+    css=None,
+    files=None,
+    ignore=DEFAULT_IGNORE,
+):
+    # Only files whose size or mtime (or hash) differ are copied, and only
+    # outputs the manifest knows came from `src` are ever deleted. `files`
+    # are the SourceFiles of a SiteIndex's static tree; without them `src`
+    # is scanned here. With an AssetMap in `assets`, fingerprintable files
+    # are written under content-hashed names and the map is filled with
+    # their URLs. An ImageProcessor in `images` measures PNGs (into
+    # `assets`) and may swap in an optimised copy; a CssMinifier in `css`
+    # swaps in minified stylesheets and offers small ones to `assets` for
+    # inlining.
+    if files is None:
+        files = scan_static(src, dst, ignore)
+    seen = []
+    copied = 0
+    os.makedirs(dst, exist_ok=True)
+    made = {dst}
+    for f in files:
+        dst_dir = os.path.dirname(f.output)
+        if dst_dir not in made:
+            os.makedirs(dst_dir, exist_ok=True)
+            made.add(dst_dir)
+
+        dst_path, was_copied = _sync_file(
+            f.path,
+            dst_dir,
+            "/" + f.rel,
+            manifest,
+            use_hash,
+            link,
+            assets,
+            images,
+            css,
+            f.stat,
+        )
+        seen.append(dst_path)
+        copied += was_copied
+
+    removed = []
+    if manifest is not None:
+        prefix = os.path.join(dst, "")
+        removed = [p for p in manifest.stale_assets(seen) if p.startswith(prefix)]
+        for dst_path in removed:
+            remove_output(dst_path, dst)
+            manifest.forget_asset(dst_path)
+            manifest.forget_output(dst_path)
+
+    print(f"{copied} static files copied, {len(seen) - copied} up to date, {len(removed)} removed")
+    return seen
+
+def sync_paths(paths, src, dst, manifest=None, use_hash=False, link=False, images=None, css=None, ignore=DEFAULT_IGNORE):
+    # Sync just the given changed paths under `src`, e.g. from a file watcher.
+    # Not for fingerprinted builds: those need the whole tree's asset map.
+    for src_path in paths:
+        dst_path = os.path.join(dst, os.path.relpath(src_path, src))
+
+        if os.path.isdir(src_path):
+            sync_files(src_path, dst_path, manifest, use_hash, link, images=images, css=css, ignore=ignore)
+        elif os.path.isfile(src_path):
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            url = "/" + os.path.relpath(src_path, src).replace(os.sep, "/")
+            _sync_file(src_path, os.path.dirname(dst_path), url, manifest, use_hash, link, None, images, css)
+        elif manifest is not None:
+            prefix = dst_path + os.sep
+            for stale in [p for p in manifest.assets if p == dst_path or p.startswith(prefix)]:
+                remove_output(stale, dst)
+                manifest.forget_asset(stale)
+                manifest.forget_output(stale)
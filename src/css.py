@@ -0,0 +1,87 @@
+import os
+import re
+
+from manifest import write_derived
+
+# Strings are copied through untouched; comments and whitespace runs are
+# what the minifier removes.
+css_token_pattern = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|(/\*.*?\*/)|(\s+)|([{};,>])',
+    re.DOTALL,
+)
+
+# Whitespace next to these is never significant. "+" and "-" are not among
+# them (calc() needs the spaces), and ":" only drops the space after it:
+# "a :hover" and "a:hover" are different selectors.
+TIGHT = set("{};,>")
+TIGHT_AFTER = TIGHT | {":"}
+
+# Inlined stylesheets end up inside pages at any depth, so anything that
+# resolves relative to the stylesheet's own URL rules inlining out.
+_not_inlinable = re.compile(r"url\(|@import|</style", re.IGNORECASE)
+
+
+def minify_css(text):
+    out = []
+    space = False
+    pos = 0
+
+    def emit(piece):
+        nonlocal space
+        if space and out and out[-1][-1] not in TIGHT_AFTER and piece[0] not in TIGHT:
+            out.append(" ")
+        space = False
+        out.append(piece)
+
+    for match in css_token_pattern.finditer(text):
+        if match.start() > pos:
+            emit(text[pos : match.start()])
+        pos = match.end()
+
+        string, comment, whitespace, punct = match.groups()
+        if string is not None:
+            emit(string)
+        elif comment is not None or whitespace is not None:
+            # A comment separates tokens just like whitespace does.
+            space = True
+        elif punct == "}" and out and out[-1] == ";":
+            out[-1] = "}"
+            space = False
+        else:
+            emit(punct)
+    if pos < len(text):
+        emit(text[pos:])
+    return "".join(out)
+
+
+def can_inline(css):
+    return _not_inlinable.search(css) is None
+
+
+class CssMinifier:
+    # Minified copies of stylesheets, cached in `cache_dir` and keyed by the
+    # source hash in `table` (the manifest's css table): each stylesheet is
+    # minified once per change, however many pages use it. Minified sheets
+    # of at most `inline_limit` bytes are offered for inlining.
+    def __init__(self, cache_dir, table, inline_limit=0):
+        self.cache_dir = cache_dir
+        self.table = table
+        self.inline_limit = inline_limit
+
+    def process(self, src_path, digest):
+        # Returns (path to copy into the output, its hash).
+        cache_path = os.path.join(self.cache_dir, digest + ".css")
+        minified_digest = self.table.get(digest)
+        if minified_digest is None or not os.path.exists(cache_path):
+            with open(src_path, "r", encoding="utf-8") as f:
+                css = f.read()
+            minified_digest = write_derived(cache_path, minify_css(css).encode("utf-8"), src_path)
+            self.table[digest] = minified_digest
+        return cache_path, minified_digest
+
+    def inline_text(self, minified_path):
+        if not self.inline_limit or os.path.getsize(minified_path) > self.inline_limit:
+            return None
+        with open(minified_path, "r", encoding="utf-8") as f:
+            css = f.read()
+        return css if can_inline(css) else None
@@ -1,11 +1,28 @@
 import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from markdown_blocks import markdown_to_html_node
+from markdown_blocks import (
+    configure_inline_cache,
+    inline_cache,
+    markdown_to_html_node,
+    read_lines,
+    write_markdown_html,
+)
+from manifest import generator_hash, remove_output, replace_if_changed
+from parsecache import CHUNK_SIZE, TeeWriter
+from pipeline import run_pipeline
+from htmlminify import HtmlMinifier, minify_html
+from instrument import NullTimer, Progress, StageTimer
+from linkcheck import PageLinks
+from search import PageText
+from siteindex import SiteIndex
+from template import LAYOUT_NAME, load_template
+from urls import SiteUrls
 
-def extract_title(markdown: str):
-    lines = markdown.split("\n")
-
-    for line in lines:
+def extract_title(markdown):
+    # `markdown` may also be a text file object; reading stops at the h1.
+    for line in read_lines(markdown):
         stripped = line.lstrip()
 
         if stripped.startswith("# "):
@@ -15,42 +32,519 @@ def extract_title(markdown: str):
 
 def generate_page(from_path, template_path, dest_path, basepath):
     print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    with open(from_path, "r") as f:
-        markdown = f.read()
+    write_page(from_path, template_path, dest_path, basepath)
+
+class PageOptions:
+    # Build-wide settings shipped with every page job; must stay picklable.
+    def __init__(
+        self,
+        parse_cache=None,
+        assets=None,
+        minify_html=False,
+        search=False,
+        check_links=False,
+        stream=False,
+        site_dir=None,
+    ):
+        self.parse_cache = parse_cache
+        # AssetMap of fingerprinted static files, or None.
+        self.assets = assets
+        # The output directory pages are served from; with an asset map,
+        # relative references to fingerprinted files are resolved against
+        # each page's directory in it.
+        self.site_dir = site_dir
+        self.minify_html = minify_html
+        # Collect each page's search terms and link targets while rendering it.
+        self.search = search
+        self.check_links = check_links
+        # Stream each page from its source into its output block by block
+        # (see write_page) to bound memory by the largest block.
+        self.stream = stream
+
+    def urls(self, basepath, dest_path=None):
+        page_dir = None
+        if self.assets is not None and self.site_dir is not None and dest_path is not None:
+            rel = os.path.relpath(os.path.dirname(dest_path), self.site_dir).replace(os.sep, "/")
+            page_dir = "/" if rel == "." else f"/{rel}/"
+        return SiteUrls(basepath, self.assets, page_dir)
+
+def _cached_info(parse_cache, key, options, urls):
+    # The search terms and links kept with a cache entry, or None if it was
+    # cached by a build that didn't collect them, or an asset it links to
+    # renders differently now, and it must be parsed again.
+    if urls.assets is not None:
+        states = parse_cache.get_meta(key, "assets")
+        if states is None or not urls.reuse(states):
+            return None
+    info = {}
+    if options.search:
+        info["terms"] = parse_cache.get_meta(key, "terms")
+    if options.check_links:
+        info["links"] = parse_cache.get_meta(key, "links")
+    if None in info.values():
+        return None
+    return info
 
-    with open(template_path, "r") as f:
-        template = f.read()
+def _parse_page(markdown, urls, options, timer):
+    # Returns (title, node, html, cache key, info). The body comes back as
+    # html if the parse cache had it, else as a node tree.
+    parse_cache = options.parse_cache
+    node = None
+    html = None
+    key = None
+    cached = None
+    info = {}
+    if parse_cache is not None:
+        key = parse_cache.key(markdown, urls)
+        cached = parse_cache.get(key)
+        if cached is not None:
+            info = _cached_info(parse_cache, key, options, urls)
+            if info is None:
+                cached = None
+                info = {}
 
-    html = markdown_to_html_node(markdown).to_html()
+    if cached is not None:
+        title, html = cached
+    else:
+        page_text = PageText() if options.search else None
+        page_links = PageLinks() if options.check_links else None
+        with timer.stage("parse"):
+            node = markdown_to_html_node(markdown, urls, page_text, page_links)
 
-    title = extract_title(markdown)
+        title = extract_title(markdown)
+        if page_text is not None:
+            info["terms"] = page_text.terms()
+        if page_links is not None:
+            info["links"] = page_links.links
+        if parse_cache is not None:
+            _put_cached_info(parse_cache, key, info, urls)
+    if options.search:
+        info["title"] = title
+    return title, node, html, key, info
 
-    page = template.replace("{{ Title }}", title)
-    page = page.replace("{{ Content }}", html)
+def _put_cached_info(parse_cache, key, info, urls):
+    for name, data in info.items():
+        parse_cache.put_meta(key, name, data)
+    if urls.assets is not None:
+        parse_cache.put_meta(key, "assets", urls.asset_states(urls.used))
 
-    if not basepath.startswith("/"):
-        basepath = "/" + basepath
-    basepath = basepath.rstrip("/")
+def _add_asset_states(info, urls, template):
+    # With an asset map, the page's info also gets the states of every
+    # asset its body and template use, so it is redone only when they change.
+    if urls.assets is not None:
+        states = urls.asset_states(urls.used)
+        states.update(template.asset_states)
+        info["assets"] = states
+    return info
 
-    page = page.replace('href="/', f'href="{basepath}/')
-    page = page.replace('src="/', f'src="{basepath}/')
+def render_page(markdown, template_path, basepath, timer=None, options=None, dest_path=None):
+    # The whole page as one string, for callers that do their own I/O; the
+    # bytes are the ones write_page streams. Returns (page, info).
+    if timer is None:
+        timer = NullTimer()
+    if options is None:
+        options = PageOptions()
+    parse_cache = options.parse_cache
+    urls = options.urls(basepath, dest_path)
+    template = load_template(template_path, urls, options.minify_html)
+    title, node, html, key, info = _parse_page(markdown, urls, options, timer)
 
+    with timer.stage("to_html"):
+        if html is None:
+            html = node.to_html()
+            if parse_cache is not None:
+                parse_cache.put(key, title, html)
+        if options.minify_html:
+            html = minify_html(html)
+    with timer.stage("template"):
+        page = template.render(Title=title, Content=html)
+    return page, _add_asset_states(info, urls, template)
+
+def write_output(dest_path, page):
+    # Pages are written to a temp file first and only moved into place if
+    # their bytes changed; see replace_if_changed.
+    dest_dir = os.path.dirname(dest_path)
+    if dest_dir:
+        os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = dest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(page)
+    return replace_if_changed(tmp_path, dest_path)
+
+def write_page(from_path, template_path, dest_path, basepath, timer=None, options=None):
+    # Returns the written page's content hash and what was collected from it:
+    # with options.search, "title" and "terms" ({term: weight}); with
+    # options.check_links, "links" ([line, kind, url] targets).
+    if timer is None:
+        timer = NullTimer()
+    if options is None:
+        options = PageOptions()
+    parse_cache = options.parse_cache
+
+    if options.stream:
+        # Reading, parsing and writing are interleaved block by block, so
+        # instrumented builds time them as one stage.
+        with timer.stage("write"):
+            return _stream_page(from_path, template_path, dest_path, basepath, options)
+
+    with timer.stage("read"):
+        with open(from_path, "r") as f:
+            markdown = f.read()
+
+    if timer.enabled:
+        # Instrumented builds serialize, fill and write as separate steps so
+        # each one can be timed; the bytes written are the same.
+        page, info = render_page(markdown, template_path, basepath, timer, options, dest_path)
+        with timer.stage("write"):
+            return write_output(dest_path, page), info
+
+    urls = options.urls(basepath, dest_path)
+    template = load_template(template_path, urls, options.minify_html)
+    title, node, html, key, info = _parse_page(markdown, urls, options, timer)
+
+    def content(out):
+        # The cache always gets the unminified body, so one entry serves
+        # builds with and without minification.
+        minifier = None
+        if options.minify_html:
+            out = minifier = HtmlMinifier(out)
+        if node is None:
+            out.write(html)
+        elif parse_cache is None:
+            node.write_html(out)
+        else:
+            # Fill the cache entry from the same pass that writes the page.
+            with parse_cache.writer(key, title) as cache_out:
+                node.write_html(TeeWriter(out, cache_out))
+        if minifier is not None:
+            minifier.flush()
+
+    return _write_template(dest_path, template, title, content), _add_asset_states(info, urls, template)
+
+def _write_template(dest_path, template, title, content):
     dest_dir = os.path.dirname(dest_path)
 
     if dest_dir:
         os.makedirs(dest_dir, exist_ok=True)
 
-    with open(dest_path, "w") as f:
-        f.write(page)
+    tmp_path = dest_path + ".tmp"
+
+    # The page is streamed into the temp file (see write_output); don't
+    # leave a truncated one behind if serialisation fails half way.
+    try:
+        with open(tmp_path, "w") as f:
+            template.write(f, Title=title, Content=content)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return replace_if_changed(tmp_path, dest_path)
+
+def _stream_page(from_path, template_path, dest_path, basepath, options):
+    # write_page without whole-page strings or node trees: the source is
+    # read as a stream for the title, again for the cache key, and once
+    # more for the blocks, each rendered straight into the output. A cached
+    # body is copied in chunks. The bytes written are the same.
+    parse_cache = options.parse_cache
+    urls = options.urls(basepath, dest_path)
+    template = load_template(template_path, urls, options.minify_html)
+    page_text = PageText() if options.search else None
+    page_links = PageLinks() if options.check_links else None
+
+    with open(from_path, "r") as source:
+        title = extract_title(source)
+        key = None
+        cached = None
+        info = {}
+        if parse_cache is not None:
+            source.seek(0)
+            key = parse_cache.key(source, urls)
+            cached = parse_cache.open(key)
+            if cached is not None:
+                info = _cached_info(parse_cache, key, options, urls)
+                if info is None:
+                    cached.close()
+                    cached = None
+                    info = {}
+        written = []
+
+        def content(out):
+            # Called once per Content slot; only the first pass collects
+            # and fills the cache.
+            minifier = None
+            if options.minify_html:
+                out = minifier = HtmlMinifier(out)
+            source.seek(0)
+            if cached is not None:
+                cached.seek(0)
+                cached.readline()
+                shutil.copyfileobj(cached, out, CHUNK_SIZE)
+            elif written:
+                write_markdown_html(source, out, urls)
+            elif parse_cache is None:
+                write_markdown_html(source, out, urls, page_text, page_links)
+            else:
+                with parse_cache.writer(key, title) as cache_out:
+                    write_markdown_html(source, TeeWriter(out, cache_out), urls, page_text, page_links)
+            written.append(True)
+            if minifier is not None:
+                minifier.flush()
+
+        try:
+            digest = _write_template(dest_path, template, title, content)
+        finally:
+            if cached is not None:
+                cached.close()
+        if not written and cached is None:
+            # A template without a Content slot: collect into a writer
+            # that discards the HTML.
+            source.seek(0)
+            write_markdown_html(source, TeeWriter(), urls, page_text, page_links)
+
+    if cached is None:
+        if page_text is not None:
+            info["terms"] = page_text.terms()
+        if page_links is not None:
+            info["links"] = page_links.links
+        if parse_cache is not None:
+            _put_cached_info(parse_cache, key, info, urls)
+    if options.search:
+        info["title"] = title
+    return digest, _add_asset_states(info, urls, template)
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
-    for name in os.listdir(dir_path_content):
-        from_path = os.path.join(dir_path_content, name)
-        dest_path = os.path.join(dest_dir_path, name)
+def page_for_source(from_path, dir_path_content, template_path, dest_dir_path):
+    # The page SiteIndex.pages would give for one file, without walking the tree.
+    rel_path = os.path.relpath(from_path, dir_path_content)
+    directories = [dir_path_content]
+    parent = os.path.dirname(rel_path)
+    if parent:
+        for part in parent.split(os.sep):
+            directories.append(os.path.join(directories[-1], part))
 
-        if os.path.isfile(from_path):
-            if from_path.endswith(".md"):
-                dest_path = Path(dest_path).with_suffix(".html")
-                generate_page(from_path, template_path, dest_path, basepath)
+    for directory in directories:
+        if os.path.isfile(os.path.join(directory, LAYOUT_NAME)):
+            template_path = os.path.join(directory, LAYOUT_NAME)
+
+    dest_path = os.path.join(dest_dir_path, rel_path)
+    return (from_path, template_path, str(Path(dest_path).with_suffix(".html")))
+
+def page_inputs(manifest, from_path, template_path, urls, generator, minify=False, index=None):
+    # With a SiteIndex, file stats come from its scan rather than os.stat.
+    stat = index.stat if index is not None else os.stat
+    files = {str(from_path): manifest.file_hash(from_path, stat(from_path))}
+    try:
+        dependencies = load_template(template_path, urls, minify).dependencies
+    except (OSError, ValueError):
+        # Leave the page dirty so the worker reports the broken template.
+        return None
+    for dep in dependencies:
+        files[dep] = manifest.file_hash(dep, stat(dep))
+
+    return {
+        "generator": generator,
+        "basepath": urls.basepath,
+        # Which assets a page uses, and their states, are checked against
+        # the manifest's page_assets table instead.
+        "assets": urls.assets is not None,
+        "minify": minify,
+        "files": files,
+    }
+
+def _generate_page_job(job):
+    from_path, template_path, dest_path, basepath, instrument, options = job
+    timer = StageTimer() if instrument else None
+    try:
+        digest, info = write_page(from_path, template_path, dest_path, basepath, timer, options)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}", None, None, None
+    finally:
+        if timer is not None:
+            timer.close()
+    return None, timer.stages if timer else None, digest, info
+
+def _read_source(job):
+    with open(job[0], "r") as f:
+        return f.read()
+
+def _render_page_job(job, markdown):
+    _, template_path, dest_path, basepath, _, options = job
+    return render_page(markdown, template_path, basepath, options=options, dest_path=dest_path)
+
+def _write_page_job(job, rendered):
+    page, info = rendered
+    return write_output(job[2], page), info
+
+def _pipeline_pages(work, jobs, depth):
+    # Reads run ahead and writes behind on I/O threads while pages render
+    # on a process pool (or one thread with jobs=1); see run_pipeline.
+    if jobs == 1:
+        executor = ThreadPoolExecutor(max_workers=1)
+        renderers = 1
+    else:
+        workers = jobs or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=configure_inline_cache,
+            initargs=(inline_cache.maxsize,),
+        )
+        # Two pages per worker, so none idles while a result is shipped back.
+        renderers = workers * 2
+    with executor:
+        results = run_pipeline(
+            work, _read_source, _render_page_job, _write_page_job, executor, renderers, depth
+        )
+    return [
+        (f"{type(result).__name__}: {result}", None, None, None)
+        if isinstance(result, Exception)
+        else (None, None, result[0], result[1])
+        for result in results
+    ]
+
+def generate_pages(pages, basepath, jobs=1, report=None, options=None, manifest=None, search=None, pipeline=0):
+    # Pages are rendered in worker processes, but results come back in input
+    # order so log lines and failure reports stay deterministic. With a
+    # manifest, each written page's content hash (and link targets) are
+    # recorded in it; with a SearchIndex, its search terms. A `pipeline`
+    # depth overlaps reading and writing with rendering, except in
+    # instrumented builds, which time each stage in one place.
+    instrument = report is not None
+    work = [
+        (from_path, template_path, dest_path, basepath, instrument, options)
+        for from_path, template_path, dest_path in pages
+    ]
+
+    if pipeline and not instrument and work:
+        return _report_pages(work, _pipeline_pages(work, jobs, pipeline), report, manifest, search)
+
+    if jobs == 1 or len(work) <= 1:
+        results = map(_generate_page_job, work)
+        return _report_pages(work, results, report, manifest, search)
+
+    workers = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(work) // (workers * 4))
+    # Each worker gets its own inline cache, sized like the parent's.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=configure_inline_cache,
+        initargs=(inline_cache.maxsize,),
+    ) as executor:
+        results = executor.map(_generate_page_job, work, chunksize=chunksize)
+        return _report_pages(work, results, report, manifest, search)
+
+def _report_pages(work, results, report=None, manifest=None, search=None):
+    # With a report, per-page log lines give way to a rate-limited progress
+    # line; errors are still printed as they arrive.
+    progress = Progress(len(work)) if report is not None else None
+    failures = []
+    for (from_path, template_path, dest_path, _, _, _), (error, stages, digest, info) in zip(work, results):
+        if progress is None:
+            print(f"Generating page from {from_path} to {dest_path} using {template_path}")
+        else:
+            report.add_page(from_path, stages)
+            progress.update(error is not None)
+        if error is not None:
+            print(f"Error generating page {from_path}: {error}")
+            failures.append((from_path, dest_path, error))
         else:
-            generate_pages_recursive(from_path, template_path, dest_path, basepath)
+            if manifest is not None:
+                manifest.record_output(dest_path, digest)
+                if "links" in info:
+                    manifest.record_links(dest_path, info["links"])
+                if "assets" in info:
+                    manifest.record_page_assets(dest_path, info["assets"])
+            if search is not None and "terms" in info:
+                search.update(dest_path, info["title"], info["terms"])
+    if progress is not None:
+        progress.finish()
+    return failures
+
+def update_pages(
+    pages,
+    basepath,
+    manifest,
+    jobs=1,
+    generator=None,
+    report=None,
+    options=None,
+    search=None,
+    index=None,
+    pipeline=0,
+):
+    # Regenerate the pages among `pages` whose inputs or used assets changed
+    # since the manifest last saw them, or whose search terms or links were
+    # not collected yet. Returns (number of dirty pages, failures).
+    if generator is None:
+        generator = generator_hash()
+    if options is None:
+        options = PageOptions()
+    urls = options.urls(basepath)
+
+    dirty = []
+    for page in pages:
+        from_path, page_template, dest_path = page
+        inputs = page_inputs(manifest, from_path, page_template, urls, generator, options.minify_html, index)
+        if (
+            manifest.page_is_current(dest_path, inputs)
+            and (urls.assets is None or manifest.page_assets_current(dest_path, urls))
+            and (search is None or search.has(dest_path))
+            and (not options.check_links or manifest.has_links(dest_path))
+        ):
+            continue
+
+        manifest.forget_page(dest_path)
+        dirty.append((page, inputs))
+
+    failures = generate_pages(
+        [page for page, _ in dirty], basepath, jobs, report, options, manifest, search, pipeline
+    )
+    failed = {dest_path for _, dest_path, _ in failures}
+    for (from_path, _, dest_path), inputs in dirty:
+        if dest_path not in failed and inputs is not None:
+            manifest.record_page(dest_path, from_path, inputs)
+
+    return len(dirty), failures
+
+def generate_pages_recursive(
+    dir_path_content,
+    template_path,
+    dest_dir_path,
+    basepath,
+    manifest=None,
+    jobs=1,
+    report=None,
+    options=None,
+    search=None,
+    index=None,
+    pipeline=0,
+):
+    # `index` is a SiteIndex of the content tree; without one it is scanned.
+    if index is None:
+        index = SiteIndex.scan(dir_path_content, dest_dir_path)
+    pages = index.pages(template_path)
+
+    if manifest is None:
+        return generate_pages(pages, basepath, jobs, report, options, search=search, pipeline=pipeline)
+
+    dirty, failures = update_pages(
+        pages,
+        basepath,
+        manifest,
+        jobs,
+        report=report,
+        options=options,
+        search=search,
+        index=index,
+        pipeline=pipeline,
+    )
+
+    removed = manifest.stale_pages(dest_path for _, _, dest_path in pages)
+    for dest_path in removed:
+        print(f"Removing stale page {dest_path}")
+        remove_output(dest_path, dest_dir_path)
+        manifest.forget_page(dest_path)
+        manifest.forget_output(dest_path)
+        if search is not None:
+            search.remove(dest_path)
+
+    skipped = len(pages) - dirty
+    print(f"{dirty - len(failures)} pages generated, {skipped} up to date, {len(removed)} removed, {len(failures)} failed")
+    return failures
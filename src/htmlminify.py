@@ -0,0 +1,172 @@
+import io
+import re
+
+whitespace_pattern = re.compile(r"\s+")
+tag_name_pattern = re.compile(r"<(/?)([a-zA-Z!][a-zA-Z0-9-]*)")
+# A "<" only starts a tag before "!" or a tag name that is followed by
+# whitespace, "/" or ">"; any other "<" is text.
+tag_start_pattern = re.compile(r"<(!|/?[a-zA-Z][a-zA-Z0-9-]*)")
+
+# Whitespace inside these is significant (or not HTML at all) and is copied
+# through as is; that covers the <pre><code> of every code block.
+PRESERVE_TAGS = {"pre", "code", "textarea", "script", "style"}
+
+# Whitespace next to these never renders, so it can go entirely. Around any
+# other tag a run of whitespace still collapses to a single space.
+BLOCK_TAGS = {
+    "!doctype", "html", "head", "body", "title", "meta", "link", "base", "style", "script",
+    "div", "p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "dl", "dt", "dd",
+    "article", "section", "header", "footer", "nav", "main", "aside", "blockquote", "pre",
+    "table", "thead", "tbody", "tfoot", "tr", "th", "td", "figure", "figcaption", "hr",
+}
+
+
+class HtmlMinifier:
+    # A writer that collapses insignificant whitespace and drops comments
+    # (except <!--[if ...]> conditionals) in one pass over whatever is written
+    # to it, in pieces of any size. Call flush() after the last write.
+    def __init__(self, out, at_block=False):
+        self.out = out
+        self._pending = ""
+        self._space = False
+        # Whether the last thing written was a block tag, so whitespace after
+        # it can go. False when what came before is unknown.
+        self._at_block = at_block
+        self._preserve = 0
+
+    def write(self, text):
+        data = self._pending + text if self._pending else text
+        self._pending = ""
+        pos = 0
+        while pos < len(data):
+            lt = data.find("<", pos)
+            if lt == -1:
+                self._text(data[pos:])
+                break
+            if lt > pos:
+                self._text(data[pos:lt])
+
+            if data.startswith("<!--", lt):
+                end = data.find("-->", lt + 4)
+                if end == -1:
+                    self._pending = data[lt:]
+                    break
+                self._comment(data[lt : end + 3])
+                pos = end + 3
+                continue
+
+            start = tag_start_pattern.match(data, lt)
+            if start is None:
+                is_tag = None if data[lt:] in ("<", "</") else False
+            elif start.group(1) == "!":
+                is_tag = True
+            elif start.end() == len(data):
+                is_tag = None
+            else:
+                is_tag = data[start.end()] in " \t\n\r\f/>"
+            if is_tag is None:
+                # Can't tell yet whether this starts a tag; wait for the rest.
+                self._pending = data[lt:]
+                break
+            if not is_tag:
+                # A bare "<", e.g. `a<b:` in a code block, is text.
+                self._text("<")
+                pos = lt + 1
+                continue
+
+            end = data.find(">", lt)
+            if end == -1:
+                # An unfinished tag (or "<!-" of a comment); wait for the rest.
+                self._pending = data[lt:]
+                break
+            self._tag(data[lt : end + 1])
+            pos = end + 1
+
+    def _text(self, text):
+        if self._preserve:
+            self._emit(text)
+            return
+        text = whitespace_pattern.sub(" ", text)
+        if text.startswith(" "):
+            self._space = True
+            text = text[1:]
+        if not text:
+            return
+        trailing = text.endswith(" ")
+        if trailing:
+            text = text[:-1]
+        if text:
+            self._emit(text)
+        self._space = trailing
+
+    def _emit(self, text):
+        if self._space and not self._at_block:
+            self.out.write(" ")
+        self._space = False
+        self.out.write(text)
+        self._at_block = False
+
+    def _comment(self, comment):
+        if comment.startswith("<!--[if") or self._preserve:
+            self._emit(comment)
+
+    def _tag(self, tag):
+        match = tag_name_pattern.match(tag)
+        name = match.group(2).lower() if match else ""
+        closing = bool(match and match.group(1))
+        is_block = name in BLOCK_TAGS
+
+        if self._space and not (is_block or self._at_block):
+            self.out.write(" ")
+        self._space = False
+        self.out.write(tag)
+        self._at_block = is_block
+
+        if name in PRESERVE_TAGS:
+            if closing:
+                self._preserve = max(0, self._preserve - 1)
+            elif not tag.endswith("/>"):
+                self._preserve += 1
+
+    def boundary(self):
+        # Something we can't see (a template slot) comes next: keep a pending
+        # space, since it may be between two words.
+        self.flush()
+        self._at_block = False
+
+    def flush(self):
+        if self._pending:
+            self._emit(self._pending)
+            self._pending = ""
+        if self._space and not self._at_block:
+            self.out.write(" ")
+        self._space = False
+
+
+def minify_html(html, at_block=False):
+    out = io.StringIO()
+    minifier = HtmlMinifier(out, at_block)
+    minifier.write(html)
+    minifier.flush()
+    return out.getvalue()
+
+
+def minify_chunks(chunks):
+    # Minify a compiled template's chunks (None marks a slot) in one pass, so
+    # state such as being inside <pre> carries across slots.
+    out = io.StringIO()
+    minifier = HtmlMinifier(out, at_block=True)
+    minified = list(chunks)
+    for i, chunk in enumerate(chunks):
+        if chunk is None:
+            minifier.boundary()
+            continue
+        minifier.write(chunk)
+        if i + 1 < len(chunks):
+            minifier.boundary()
+        else:
+            minifier.flush()
+        minified[i] = out.getvalue()
+        out.seek(0)
+        out.truncate()
+    return minified
@@ -1,4 +1,7 @@
 class HTMLNode:
+    # Pages allocate millions of nodes; slots keep each one small.
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -6,6 +9,14 @@ class HTMLNode:
         self.props = props
 
     def to_html(self):
+        parts = []
+        self.render(parts.append)
+        return "".join(parts)
+
+    def write_html(self, out):
+        self.render(out.write)
+
+    def render(self, write):
         raise NotImplementedError()
 
     def props_to_html(self):
@@ -13,60 +24,81 @@ class HTMLNode:
             return ""
 
         parts = []
-        for key, value in self.props.items():
-            part = f' {key}="{value}"'
-            parts.append(part)
+        self.render_props(parts.append)
         return "".join(parts)
 
+    def render_props(self, write):
+        # Straight into the serializer's sink, without a per-node string.
+        for key, value in self.props.items():
+            write(f' {key}="{value}"')
+
     def __repr__(self):
         return f"HTMLNode(tag={self.tag}, value={self.value}, children={self.children}, props={self.props})"
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
-        super().__init__(
-            tag=tag,
-            value=value,
-            children=None,
-            props=props,
-        )
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
 
-    def to_html(self):
+    def render(self, write):
         if self.value is None:
             raise ValueError("LeafNode must have a value")
 
         if self.tag is None:
-            return self.value
+            write(self.value)
+            return
 
-        props_str = self.props_to_html()
+        if not self.props:
+            write(f"<{self.tag}>{self.value}</{self.tag}>")
+            return
 
-        return f"<{self.tag}{props_str}>{self.value}</{self.tag}>"
+        write(f"<{self.tag}")
+        self.render_props(write)
+        write(f">{self.value}</{self.tag}>")
 
     def __repr__(self):
         return f"LeafNode(tag={self.tag}, value={self.value}, props={self.props})"
 
 
 class ParentNode(HTMLNode):
-    def __init__(self, tag, children, props=None):
-        super().__init__(
-            tag=tag,
-            children=children,
-            props=props,
-        )
-
-    def to_html(self):
-        if self.tag is None:
-            raise ValueError("ParentNode must have a tag")
-
-        if self.children is None or len(self.children) == 0:
-            raise ValueError("ParentNode must have children")
+    __slots__ = ()
 
-        children_html = ""
-        for child in self.children:
-            children_html += child.to_html()
-
-        props_str = self.props_to_html()
-
-        open_tag = f"<{self.tag}{props_str}>"
-        close_tag = f"</{self.tag}>"
+    def __init__(self, tag, children, props=None):
+        self.tag = tag
+        self.value = None
+        self.children = children
+        self.props = props
 
-        return open_tag + children_html + close_tag
+    def render(self, write):
+        # Walk the subtree with an explicit stack so every piece of output is
+        # written exactly once and deep trees don't hit the recursion limit.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+
+            if isinstance(node, str):
+                write(node)
+                continue
+
+            if not isinstance(node, ParentNode):
+                node.render(write)
+                continue
+
+            if node.tag is None:
+                raise ValueError("ParentNode must have a tag")
+
+            if node.children is None or len(node.children) == 0:
+                raise ValueError("ParentNode must have children")
+
+            if node.props:
+                write(f"<{node.tag}")
+                node.render_props(write)
+                write(">")
+            else:
+                write(f"<{node.tag}>")
+            stack.append(f"</{node.tag}>")
+            stack.extend(reversed(node.children))
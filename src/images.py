@@ -0,0 +1,109 @@
+import os
+import struct
+import zlib
+
+from manifest import write_derived
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+chunk_header = struct.Struct(">I4s")
+ihdr_size = struct.Struct(">II")
+
+# Ancillary chunks that still change how the image looks (transparency and
+# colour space) survive optimisation; text, timestamps, EXIF and the like
+# are dropped.
+KEEP_CHUNKS = {b"IHDR", b"PLTE", b"IDAT", b"IEND", b"tRNS", b"sRGB", b"gAMA", b"cHRM", b"iCCP"}
+
+
+def png_size(path):
+    # Width and height from the IHDR chunk, which must come first.
+    with open(path, "rb") as f:
+        head = f.read(24)
+    if len(head) < 24 or not head.startswith(PNG_SIGNATURE) or head[12:16] != b"IHDR":
+        return None
+    return ihdr_size.unpack_from(head, 16)
+
+
+def _chunks(data):
+    pos = len(PNG_SIGNATURE)
+    while pos < len(data):
+        length, kind = chunk_header.unpack_from(data, pos)
+        body = data[pos + 8 : pos + 8 + length]
+        if len(body) != length:
+            raise ValueError("truncated PNG chunk")
+        yield kind, body
+        pos += 12 + length
+
+
+def _chunk(kind, body):
+    crc = zlib.crc32(kind + body)
+    return chunk_header.pack(len(body), kind) + body + struct.pack(">I", crc)
+
+
+def optimize_png(data):
+    # Re-deflate the image data at the highest zlib level into a single IDAT
+    # chunk and drop ancillary chunks. Pixels are untouched. Returns `data`
+    # itself when the file isn't a plain PNG or nothing would be saved.
+    if not data.startswith(PNG_SIGNATURE):
+        return data
+
+    out = [PNG_SIGNATURE]
+    idat = []
+    try:
+        for kind, body in _chunks(data):
+            if kind == b"acTL":
+                # Animated PNG: frame chunks reference each other by sequence.
+                return data
+            if kind == b"IDAT":
+                if not idat:
+                    out.append(None)
+                idat.append(body)
+            elif kind in KEEP_CHUNKS:
+                out.append(_chunk(kind, body))
+            elif not kind[0] & 0x20:
+                # An unknown critical chunk: we can't know it's safe to drop.
+                return data
+        raw = zlib.decompress(b"".join(idat))
+    except (ValueError, struct.error, zlib.error):
+        return data
+
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 15, 9)
+    deflated = compressor.compress(raw) + compressor.flush()
+    out[out.index(None)] = _chunk(b"IDAT", deflated)
+
+    optimized = b"".join(out)
+    return optimized if len(optimized) < len(data) else data
+
+
+class ImageProcessor:
+    # Reads PNG dimensions and, with `optimize`, writes a losslessly
+    # re-deflated copy to `cache_dir`. Both results are keyed by the source
+    # file's hash in `table` (the manifest's images table), so an unchanged
+    # image is never read twice.
+    def __init__(self, cache_dir, table, optimize=False):
+        self.cache_dir = cache_dir
+        self.table = table
+        self.optimize = optimize
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, digest + ".png")
+
+    def process(self, src_path, digest):
+        # Returns (path to copy into the output, its hash, (width, height)).
+        entry = self.table.get(digest)
+        if entry is None:
+            size = png_size(src_path)
+            entry = {"size": list(size) if size else None, "optimized": None}
+            self.table[digest] = entry
+        size = tuple(entry["size"]) if entry["size"] else None
+
+        if not self.optimize:
+            return src_path, digest, size
+
+        cache_path = self._cache_path(digest)
+        if entry["optimized"] is None or not os.path.exists(cache_path):
+            with open(src_path, "rb") as f:
+                data = f.read()
+            entry["optimized"] = write_derived(cache_path, optimize_png(data), src_path)
+
+        return cache_path, entry["optimized"], size
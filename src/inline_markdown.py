@@ -1,4 +1,6 @@
 import re
+import threading
+from collections import OrderedDict
 from textnode import TextNode, TextType
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
@@ -30,18 +32,24 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
 
     return new_nodes
 
+image_pattern = re.compile(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)")
+link_pattern = re.compile(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+inline_token_pattern = re.compile(r"\*\*|[_`!\[]")
+
+emphasis_types = {
+    "**": TextType.BOLD,
+    "_": TextType.ITALIC,
+}
+emphasis_markers = {text_type: marker for marker, text_type in emphasis_types.items()}
+
 def extract_markdown_images(text: str):
-    pattern = r"!\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
-    return matches
+    return image_pattern.findall(text)
 
 def extract_markdown_links(text: str):
-    pattern = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
-    matches = re.findall(pattern, text)
-    return matches
+    return link_pattern.findall(text)
 
 
-def split_nodes_image(old_nodes):
+def split_nodes_pattern(old_nodes, pattern, text_type):
     new_nodes = []
 
     for node in old_nodes:
@@ -49,67 +57,188 @@ def split_nodes_image(old_nodes):
             new_nodes.append(node)
             continue
 
-        images = extract_markdown_images(node.text)
-
-        if len(images) == 0:
-            new_nodes.append(node)
-            continue
-
-        remaining_text = node.text
-        for image in images:
-            sections = remaining_text.split(f"![{image[0]}]({image[1]})", 1)
-
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
+        text = node.text
+        pos = 0
+        for match in pattern.finditer(text):
+            if match.start() > pos:
+                new_nodes.append(TextNode(text[pos : match.start()], TextType.TEXT))
 
-            new_nodes.append(TextNode(image[0], TextType.IMAGE, image[1]))
+            new_nodes.append(TextNode(match.group(1), text_type, match.group(2)))
 
-            remaining_text = sections[1]
+            pos = match.end()
 
-        if remaining_text != "":
-            new_nodes.append(TextNode(remaining_text, TextType.TEXT))
+        if pos == 0:
+            new_nodes.append(node)
+        elif pos < len(text):
+            new_nodes.append(TextNode(text[pos:], TextType.TEXT))
 
     return new_nodes
 
-def split_nodes_link(old_nodes):
-    new_nodes = []
-
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
-            new_nodes.append(node)
-            continue
+def split_nodes_image(old_nodes):
+    return split_nodes_pattern(old_nodes, image_pattern, TextType.IMAGE)
 
-        links = extract_markdown_links(node.text)
+def split_nodes_link(old_nodes):
+    return split_nodes_pattern(old_nodes, link_pattern, TextType.LINK)
 
-        if len(links) == 0:
-            new_nodes.append(node)
+def _text_nodes(pieces):
+    # A frame holds literal strings and finished nodes; each run of strings
+    # is joined once here, so text is never copied per marker.
+    nodes = []
+    run = []
+    for piece in pieces:
+        if isinstance(piece, str):
+            run.append(piece)
             continue
+        if run:
+            nodes.append(TextNode("".join(run), TextType.TEXT))
+            run = []
+        nodes.append(piece)
+    if run:
+        nodes.append(TextNode("".join(run), TextType.TEXT))
+    return nodes
 
-        remaining_text = node.text
-        for link in links:
-            sections = remaining_text.split(f"[{link[0]}]({link[1]})", 1)
-
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.TEXT))
-
-            new_nodes.append(TextNode(link[0], TextType.LINK, link[1]))
-
-            remaining_text = sections[1]
-
-        if remaining_text != "":
-            new_nodes.append(TextNode(remaining_text, TextType.TEXT))
-
-    return new_nodes
+def _unwind_emphasis(stack):
+    # The innermost frame can't close: its marker is literal text again and
+    # its pieces move to the enclosing frame.
+    text_type, pieces = stack.pop()
+    parent = stack[-1][1]
+    parent.append(emphasis_markers[text_type])
+    parent.extend(pieces)
+
+def _close_emphasis(text_type, pieces):
+    nodes = _text_nodes(pieces)
+    text = "".join(node.text for node in nodes)
+    if all(node.text_type == TextType.TEXT for node in nodes):
+        return TextNode(text, text_type)
+    return TextNode(text, text_type, children=nodes)
 
 def text_to_textnodes(text):
-    nodes = []
-    initial_node = TextNode(text, TextType.TEXT)
-    nodes.append(initial_node)
-
-    nodes = split_nodes_delimiter(nodes,"**", TextType.BOLD)
-    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
-    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
-    nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes)
-    return nodes
+    # Single left-to-right scan. Code spans, images and links are matched in
+    # place and their contents taken literally; ** and _ open and close
+    # emphasis frames on a stack, which is what lets them nest. A marker
+    # that closes an outer frame, or an empty span, leaves the frames it
+    # cuts across as literal text (`**MAX_SIZE**` is bold "MAX_SIZE"), as
+    # does a backtick with no closing partner.
+    if text == "":
+        return [TextNode(text, TextType.TEXT)]
+
+    # Only ** and _ push frames and neither can be open twice, so the stack
+    # is at most three deep and unwinding stays linear.
+    stack = [(None, [])]
+    pos = 0
+
+    while True:
+        match = inline_token_pattern.search(text, pos)
+        if match is None:
+            if pos < len(text):
+                stack[-1][1].append(text[pos:])
+            break
+
+        start = match.start()
+        if start > pos:
+            stack[-1][1].append(text[pos:start])
+        token = match.group()
+
+        if token == "`":
+            end = text.find("`", start + 1)
+            if end == -1:
+                stack[-1][1].append(token)
+                pos = start + 1
+                continue
+            if end > start + 1:
+                stack[-1][1].append(TextNode(text[start + 1 : end], TextType.CODE))
+            pos = end + 1
+
+        elif token == "!" or token == "[":
+            if token == "!":
+                found = image_pattern.match(text, start)
+                text_type = TextType.IMAGE
+            else:
+                found = link_pattern.match(text, start)
+                text_type = TextType.LINK
+
+            if found is None:
+                stack[-1][1].append(token)
+                pos = start + 1
+                continue
 
+            stack[-1][1].append(TextNode(found.group(1), text_type, found.group(2)))
+            pos = found.end()
+
+        else:
+            text_type = emphasis_types[token]
+            if any(frame_type == text_type for frame_type, _ in stack):
+                while stack[-1][0] != text_type:
+                    _unwind_emphasis(stack)
+                if stack[-1][1]:
+                    node = _close_emphasis(*stack.pop())
+                    stack[-1][1].append(node)
+                else:
+                    _unwind_emphasis(stack)
+                    stack[-1][1].append(token)
+            else:
+                stack.append((text_type, []))
+            pos = match.end()
+
+    if len(stack) > 1:
+        raise Exception("Invalid markdown, unmatched delimiter")
+
+    return _text_nodes(stack[0][1])
+
+class InlineCache:
+    # Bounded LRU of (SiteUrls key, inline source text) -> rendered HTML fragment
+    # (and, in the markdown_blocks cache, its plain text, link targets and the
+    # states of the assets they use).
+    # Repeated fragments (disclaimers, nav lines, list items) skip tokenizing
+    # and node allocation entirely. Texts longer than max_text_length are not cached,
+    # which keeps the memory bound meaningful.
+    def __init__(self, maxsize=4096, max_text_length=1024):
+        self.maxsize = maxsize
+        self.max_text_length = max_text_length
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cacheable(self, text):
+        return self.maxsize > 0 and len(text) <= self.max_text_length
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while len(self._entries) > max(maxsize, 0):
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def __len__(self):
+        return len(self._entries)
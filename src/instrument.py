@@ -0,0 +1,140 @@
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+PAGE_STAGES = ("read", "parse", "to_html", "template", "write")
+
+
+class NullTimer:
+    enabled = False
+
+    def stage(self, name):
+        return nullcontext()
+
+
+class StageTimer:
+    # Records wall time, CPU time and peak traced allocation per named stage.
+    # Allocation tracing slows everything down, so a timer that turned it on
+    # turns it off again in close(), also called on leaving a `with` block.
+    enabled = True
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self._started_tracing = False
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def close(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            stats = {
+                "wall": time.perf_counter() - wall,
+                "cpu": time.process_time() - cpu,
+                "peak": 0,
+            }
+            if self.trace_memory:
+                stats["peak"] = max(0, tracemalloc.get_traced_memory()[1] - base)
+            self.stages[name] = stats
+
+
+class Progress:
+    # A single status line redrawn at most every `interval` seconds, instead
+    # of one print per page.
+    def __init__(self, total, interval=0.5, stream=None):
+        self.total = total
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.done = 0
+        self.failed = 0
+        self.last = None
+
+    def update(self, failed=False):
+        self.done += 1
+        if failed:
+            self.failed += 1
+        now = time.monotonic()
+        if self.last is None or now - self.last >= self.interval or self.done == self.total:
+            self.last = now
+            self.stream.write(f"\r{self.done}/{self.total} pages, {self.failed} failed")
+            self.stream.flush()
+
+    def finish(self):
+        if self.done:
+            self.stream.write("\n")
+            self.stream.flush()
+
+
+class BuildReport:
+    def __init__(self, top=20, trace_memory=True):
+        self.top = top
+        self.timer = StageTimer(trace_memory)
+        self.pages = []
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return self.timer.stage(name)
+
+    def add_page(self, from_path, stages):
+        if stages:
+            self.pages.append((from_path, stages))
+
+    def summary(self):
+        per_stage = {}
+        for _, stages in self.pages:
+            for name, stats in stages.items():
+                total = per_stage.setdefault(name, {"count": 0, "wall": 0.0, "cpu": 0.0, "peak_max": 0})
+                total["count"] += 1
+                total["wall"] += stats["wall"]
+                total["cpu"] += stats["cpu"]
+                total["peak_max"] = max(total["peak_max"], stats["peak"])
+
+        slowest = sorted(
+            self.pages,
+            key=lambda page: sum(stats["wall"] for stats in page[1].values()),
+            reverse=True,
+        )[: self.top]
+
+        return {
+            "wall": time.perf_counter() - self.started,
+            "pages": len(self.pages),
+            "build_stages": self.timer.stages,
+            "page_stages": per_stage,
+            "slowest_pages": [
+                {
+                    "source": from_path,
+                    "wall": sum(stats["wall"] for stats in stages.values()),
+                    "stages": stages,
+                }
+                for from_path, stages in slowest
+            ],
+        }
+
+    def write(self, path):
+        # The report is complete once written: stop tracing allocations.
+        self.timer.close()
+        summary = self.summary()
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+        return summary
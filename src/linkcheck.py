@@ -0,0 +1,132 @@
+import os
+import posixpath
+import re
+from urllib.parse import unquote
+
+from urls import scheme_pattern
+
+# Anything that needs unquoting, stripping or normalising before lookup.
+unclean_pattern = re.compile(r"[%?#]|//|/\.")
+
+
+class PageLinks:
+    # Collects a page's link and image targets as markdown_to_html_node
+    # renders it, as [line, kind, url] with kind "link" or "image".
+    def __init__(self):
+        self.links = []
+
+    def add(self, targets, lines, line_number):
+        # Targets come from a whole block; attribute each to the first of the
+        # block's source lines that mentions it.
+        for kind, url in targets:
+            offset = 0
+            for i, line in enumerate(lines):
+                if url in line:
+                    offset = i
+                    break
+            self.links.append([line_number + offset, kind, url])
+
+
+def local_path(url, page_dir):
+    # The output path, relative to the output root and in "/" form, that a
+    # link from a page in `page_dir` points to; None for external links and
+    # same-page anchors.
+    if url.startswith("//") or scheme_pattern.match(url):
+        return None
+    if url.startswith("/") and not unclean_pattern.search(url):
+        # The common case, "/blog/post/" or "/images/a.png", needs no parsing.
+        return url[1:] + "index.html" if url.endswith("/") else url[1:]
+
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    if not url:
+        return None
+
+    path = unquote(url)
+    if not path.startswith("/"):
+        path = posixpath.join("/", page_dir, path)
+    is_dir = path.endswith("/")
+    path = posixpath.normpath(path)
+    if is_dir or path == "/":
+        path = posixpath.join(path, "index.html")
+    return path.lstrip("/")
+
+
+def _relative_to(root):
+    # os.path.relpath is slow for this many paths; every path checked here
+    # lives under `root`, so stripping the prefix is enough.
+    prefix = os.path.join(os.path.abspath(root), "")
+
+    def rel(path):
+        path = os.path.abspath(path) if not path.startswith(prefix) else path
+        return path[len(prefix) :].replace(os.sep, "/")
+
+    return rel
+
+
+def site_paths(manifest, dir_path_public):
+    # Everything a link may point to, under the name it is served at:
+    # generated pages, every other output and the copied static files.
+    public = _relative_to(dir_path_public)
+    paths = {public(dest_path) for dest_path in manifest.outputs}
+    paths.update(public(dest_path) for dest_path in manifest.pages)
+    paths.update(public(dest_path) for dest_path in manifest.assets)
+    return paths
+
+
+def check_links(manifest, dir_path_public, assets=None):
+    # Resolve every page's recorded link targets against the site's paths.
+    # `assets` is the AssetMap the pages were rendered with: content links
+    # to "/index.css" (or "../index.css") and the page gets the fingerprinted
+    # name, so that is the one that must exist. Returns the broken ones as
+    # (source path, line, kind, url), sorted.
+    paths = site_paths(manifest, dir_path_public)
+    public = _relative_to(dir_path_public)
+    renamed = assets.urls if assets is not None else {}
+
+    def exists(url, page_dir):
+        path = local_path(url, page_dir)
+        if path is None:
+            return True
+        served = renamed.get("/" + path)
+        if served is not None:
+            path = served[1:]
+        return path in paths or path + "/index.html" in paths
+
+    # Most targets repeat across pages (navigation, shared images), so each
+    # distinct one is only resolved once: by URL when it doesn't depend on
+    # the page (absolute, external, anchors), else by URL and directory.
+    by_url = {}
+    by_dir = {}
+    known = by_url.get
+    broken = []
+    for dest_path, links in manifest.links.items():
+        page = manifest.pages.get(dest_path)
+        if page is None:
+            continue
+        page_dir = None
+        for link in links:
+            url = link[2]
+            ok = known(url)
+            if ok is None:
+                if url.startswith(("/", "#")) or scheme_pattern.match(url):
+                    ok = by_url[url] = exists(url, "")
+                else:
+                    if page_dir is None:
+                        page_dir = posixpath.dirname(public(dest_path))
+                    key = (page_dir, url)
+                    ok = by_dir.get(key)
+                    if ok is None:
+                        ok = by_dir[key] = exists(url, page_dir)
+            if not ok:
+                broken.append((page["source"], link[0], link[1], url))
+    broken.sort()
+    return broken
+
+
+def report_broken_links(manifest, dir_path_public, assets=None):
+    broken = check_links(manifest, dir_path_public, assets)
+    for source, line, kind, url in broken:
+        print(f"{os.path.relpath(source)}:{line}: broken {kind} {url}")
+    checked = sum(len(links) for links in manifest.links.values())
+    print(f"{checked} links checked, {len(broken)} broken")
+    return broken
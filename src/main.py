@@ -1,37 +1,334 @@
+import argparse
 import os
-import shutil
 import sys
+from contextlib import nullcontext
 
-from copystatic import copy_files_recursive
-from gencontent import generate_pages_recursive
+from compress import compress_outputs, remove_sidecars
+from copystatic import sync_files
+from css import CssMinifier
+from gencontent import PageOptions, generate_pages_recursive
+from markdown_blocks import configure_inline_cache
+from images import ImageProcessor
+from instrument import BuildReport
+from linkcheck import report_broken_links
+from manifest import BuildManifest
+from memory import format_peak_rss, page_workers
+from parsecache import DEFAULT_MAX_BYTES, ParseCache
+from search import SearchIndex
+from siteindex import DEFAULT_IGNORE, SiteIndex
+from urls import AssetMap
+from watch import SiteWatcher
 
 root = os.path.dirname(os.path.dirname(__file__))
 
 dir_path_static = os.path.join(root, "static")
 dir_path_public = os.path.join(root, "docs")
 dir_path_content = os.path.join(root, "content")
+dir_path_build = os.path.join(root, ".build")
 template_path = os.path.join(root, "template.html")
+manifest_path = os.path.join(dir_path_build, "manifest.json")
+dir_path_parse_cache = os.path.join(dir_path_build, "parse-cache")
+deploy_path = os.path.join(dir_path_build, "deploy.json")
+asset_map_path = os.path.join(dir_path_build, "asset-map.json")
+dir_path_image_cache = os.path.join(dir_path_build, "images")
+dir_path_css_cache = os.path.join(dir_path_build, "css")
+search_store_path = os.path.join(dir_path_build, "search.json")
 
-if len(sys.argv) > 1:
-    basepath = sys.argv[1]
-else:
-    basepath = "/" 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site into docs/.")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes for page generation (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        default=0,
+        metavar="N",
+        help="read sources ahead and write pages behind, N at a time, while pages render (for slow or network filesystems)",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        metavar="MB",
+        help="stream pages block by block and run only as many page workers as fit in MB; reports peak RSS",
+    )
+    parser.add_argument(
+        "--hash-static",
+        action="store_true",
+        help="compare static files by content hash instead of size and mtime",
+    )
+    parser.add_argument(
+        "--link-static",
+        action="store_true",
+        help="hardlink static files into the output instead of copying them",
+    )
+    parser.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        metavar="PATTERN",
+        help="skip content and static files and directories whose name matches PATTERN (repeatable)",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="copy CSS, JS, images and fonts under content-hashed names and rewrite references to them",
+    )
+    parser.add_argument(
+        "--image-sizes",
+        action="store_true",
+        help="add width and height to images whose PNG files are in static/",
+    )
+    parser.add_argument(
+        "--optimize-png",
+        action="store_true",
+        help="losslessly recompress PNGs and drop their metadata chunks",
+    )
+    parser.add_argument(
+        "--minify-css",
+        action="store_true",
+        help="minify stylesheets copied from static/",
+    )
+    parser.add_argument(
+        "--inline-css",
+        type=int,
+        default=0,
+        metavar="BYTES",
+        help="minify stylesheets and inline those of at most BYTES into templates' <link> tags",
+    )
+    parser.add_argument(
+        "--minify-html",
+        action="store_true",
+        help="collapse insignificant whitespace and drop comments in generated pages",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help="write a prefix-sharded full-text search index to search-index/ in the output",
+    )
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="fail the build if a Markdown link or image points to a missing page or static file",
+    )
+    parser.add_argument(
+        "--inline-cache",
+        type=int,
+        default=4096,
+        metavar="N",
+        help="number of rendered inline fragments to memoize per process (0 disables)",
+    )
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help="always re-parse Markdown instead of reusing cached page bodies",
+    )
+    parser.add_argument(
+        "--parse-cache-size",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        metavar="MB",
+        help="evict the oldest parse cache entries beyond this size",
+    )
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="delete the parse cache and exit",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="write a max-level .gz sidecar next to each changed HTML/CSS/SVG/JSON output",
+    )
+    parser.add_argument(
+        "--deploy-manifest",
+        default=deploy_path,
+        metavar="PATH",
+        help="where to write the outputs added, changed and removed by this build",
+    )
+    parser.add_argument(
+        "--report",
+        metavar="PATH",
+        help="time every stage of every page and write a JSON report to PATH",
+    )
+    parser.add_argument(
+        "--report-top",
+        type=int,
+        default=20,
+        metavar="N",
+        help="number of slowest pages listed in the report",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="after building, rebuild affected pages and assets whenever sources change",
+    )
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_inline_cache(args.inline_cache)
+
+    parse_cache = None
+    if not args.no_parse_cache or args.clear_cache:
+        parse_cache = ParseCache(dir_path_parse_cache, args.parse_cache_size * 1024 * 1024)
+
+    if args.clear_cache:
+        print("Clearing parse cache...")
+        parse_cache.clear()
+        return
+
+    assets = None
+    if args.fingerprint or args.image_sizes or args.inline_css:
+        assets = AssetMap(fingerprint=args.fingerprint)
+    options = PageOptions(
+        parse_cache=parse_cache,
+        assets=assets,
+        minify_html=args.minify_html,
+        search=args.search_index,
+        check_links=args.check_links,
+        stream=args.max_memory is not None,
+        site_dir=dir_path_public,
+    )
+    manifest = BuildManifest.load(manifest_path)
+    search = None
+    if args.search_index:
+        search = SearchIndex.load(search_store_path, dir_path_public, args.basepath)
 
-def main():
-    print("Deleting public directory...")
-    if os.path.exists(dir_path_public):
-        shutil.rmtree(dir_path_public)
+    images = None
+    if args.image_sizes or args.optimize_png:
+        images = ImageProcessor(dir_path_image_cache, manifest.images, args.optimize_png)
+    css = None
+    if args.minify_css or args.inline_css:
+        css = CssMinifier(dir_path_css_cache, manifest.css, args.inline_css)
+    report = BuildReport(args.report_top) if args.report else None
+    ignore = DEFAULT_IGNORE + tuple(args.ignore)
+
+    # One walk of content/ and static/ serves every stage below.
+    index = SiteIndex.scan(dir_path_content, dir_path_public, dir_path_static, ignore)
+
+    jobs = args.jobs
+    pipeline = args.pipeline
+    max_bytes = None
+    if args.max_memory is not None:
+        # Memory then follows the largest page (its largest block, once
+        # streamed) times the pages in flight, not the size of the site.
+        max_bytes = args.max_memory * 1024 * 1024
+        largest = max((f.size for f in index.content if f.kind == "page"), default=0)
+        jobs = page_workers(args.jobs, max_bytes, largest)
+        print(f"Memory ceiling {args.max_memory} MB: {jobs} page(s) in flight")
+        if pipeline:
+            print("--pipeline is ignored with --max-memory: it holds whole pages in memory")
+            pipeline = 0
 
     print("Copying static files to public directory...")
-    copy_files_recursive(dir_path_static, dir_path_public)
+    with report.stage("static") if report else nullcontext():
+        sync_files(
+            dir_path_static,
+            dir_path_public,
+            manifest,
+            use_hash=args.hash_static,
+            link=args.link_static,
+            assets=assets,
+            images=images,
+            css=css,
+            files=index.static,
+        )
+    if assets is not None:
+        assets.save(asset_map_path)
+
+    print("Generating pages...")
+    failures = generate_pages_recursive(
+        dir_path_content,
+        template_path,
+        dir_path_public,
+        args.basepath,
+        manifest,
+        jobs,
+        report,
+        options,
+        search,
+        index,
+        pipeline,
+    )
+
+    if search is not None:
+        shards = search.write(manifest)
+        search.save()
+        print(f"Search index: {len(search.pages)} pages, {shards} shards updated")
+    elif os.path.exists(search_store_path):
+        # Without --search-index the index would go stale; drop it.
+        SearchIndex.load(search_store_path, dir_path_public, args.basepath).clear(manifest)
+        print("Search index removed")
+
+    broken = []
+    if args.check_links:
+        broken = report_broken_links(manifest, dir_path_public, assets)
+
+    compress_failures = []
+    if args.gzip:
+        print("Compressing outputs...")
+        with report.stage("compress") if report else nullcontext():
+            compress_failures = compress_outputs(manifest, jobs)
+    elif manifest.sidecars:
+        # Sidecars are only refreshed with --gzip; without it they would go
+        # stale, and the edge server would keep sending the old bytes.
+        removed = remove_sidecars(manifest, list(manifest.sidecars))
+        print(f"{removed} gzip sidecars removed")
+
+    manifest.save()
+    delta = manifest.write_delta(args.deploy_manifest, dir_path_public)
+    print(
+        f"{len(delta['added'])} outputs added, {len(delta['changed'])} changed, "
+        f"{len(delta['removed'])} removed (see {args.deploy_manifest})"
+    )
+    if parse_cache is not None:
+        parse_cache.evict()
+
+    if report is not None:
+        summary = report.write(args.report)
+        print(f"Build report for {summary['pages']} pages written to {args.report}")
+    if max_bytes is not None:
+        print(format_peak_rss(max_bytes, jobs))
+
+    if args.watch:
+        watch(args, manifest, options, images, css, search)
+        return
+
+    if failures:
+        print(f"{len(failures)} page(s) failed to generate")
+    if compress_failures:
+        print(f"{len(compress_failures)} output(s) failed to compress")
+    if broken:
+        print(f"{len(broken)} broken link(s)")
+    if failures or compress_failures or broken:
+        sys.exit(1)
 
-    print("Generating page...")
-    generate_pages_recursive(
+def watch(args, manifest, options, images=None, css=None, search=None):
+    watcher = SiteWatcher(
         dir_path_content,
         template_path,
         dir_path_public,
-        basepath,
+        dir_path_static,
+        args.basepath,
+        manifest,
+        use_hash=args.hash_static,
+        link=args.link_static,
+        options=options,
+        deploy_path=args.deploy_manifest,
+        gzip=args.gzip,
+        asset_map_path=asset_map_path,
+        images=images,
+        css=css,
+        search=search,
+        ignore=DEFAULT_IGNORE + tuple(args.ignore),
     )
+    watcher.watch()
 
 if __name__ == "__main__":
     main()
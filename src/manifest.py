@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+
+MANIFEST_VERSION = 2
+
+src_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def generator_hash():
+    # Any change to the generator's own code invalidates every page.
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(src_dir)):
+        if name.endswith(".py") and not name.startswith("test_"):
+            digest.update(name.encode())
+            digest.update(hash_file(os.path.join(src_dir, name)).encode())
+    return digest.hexdigest()
+
+
+def remove_output(dest_path, dest_dir_path):
+    if os.path.exists(dest_path):
+        os.remove(dest_path)
+
+    # Prune directories left empty, but never the output root itself.
+    root = os.path.abspath(dest_dir_path)
+    parent = os.path.dirname(os.path.abspath(dest_path))
+    while parent != root and parent.startswith(root) and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
+
+
+def replace_if_changed(tmp_path, dest_path):
+    # Move a freshly written temp file over dest_path, unless dest_path already
+    # holds the same bytes: unchanged outputs keep their mtime, so deploy
+    # tools don't re-upload them. Returns the output's content hash.
+    digest = hash_file(tmp_path)
+    try:
+        same = os.path.getsize(dest_path) == os.path.getsize(tmp_path) and hash_file(dest_path) == digest
+    except FileNotFoundError:
+        same = False
+
+    if same:
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, dest_path)
+    return digest
+
+
+def write_derived(path, data, src_path):
+    # Store a file derived from src_path (an optimised image, minified CSS)
+    # in a build cache. It takes the source's mtime so the static copy step
+    # can compare size and mtime against it just as against a source file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    st = os.stat(src_path)
+    os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_path, path)
+    return hash_bytes(data)
+
+
+class BuildManifest:
+    def __init__(self, path=None):
+        self.path = path
+        self.files = {}
+        self.pages = {}
+        self.assets = {}
+        # Output path -> content hash. `baseline` is the state as loaded, so
+        # delta() reports what this build changed.
+        self.outputs = {}
+        self.baseline = {}
+        # Output path -> the output hash its .gz sidecar was last made from.
+        self.sidecars = {}
+        # Image source hash -> its dimensions and optimised copy's hash.
+        self.images = {}
+        # Stylesheet source hash -> its minified copy's hash.
+        self.css = {}
+        # Page path -> its [line, kind, url] link targets, for the checker.
+        self.links = {}
+        # Page path -> {asset path: AssetMap.state} for the static assets
+        # its body and template use, when built with an asset map.
+        self.page_assets = {}
+
+    @classmethod
+    def load(cls, path):
+        manifest = cls(path)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return manifest
+
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+
+        manifest.files = data.get("files", {})
+        manifest.pages = data.get("pages", {})
+        manifest.assets = data.get("assets", {})
+        manifest.outputs = data.get("outputs", {})
+        manifest.baseline = dict(manifest.outputs)
+        manifest.sidecars = data.get("sidecars", {})
+        manifest.images = data.get("images", {})
+        manifest.css = data.get("css", {})
+        manifest.links = data.get("links", {})
+        manifest.page_assets = data.get("page_assets", {})
+        return manifest
+
+    def save(self):
+        if self.path is None:
+            return
+
+        dest_dir = os.path.dirname(self.path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+
+        data = {
+            "version": MANIFEST_VERSION,
+            "files": self.files,
+            "pages": self.pages,
+            "assets": self.assets,
+            "outputs": self.outputs,
+            "sidecars": self.sidecars,
+            "images": self.images,
+            "css": self.css,
+            "links": self.links,
+            "page_assets": self.page_assets,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def file_hash(self, path, st=None):
+        # Only re-hash a file when its size or mtime moved since the last build.
+        # `st` may be a stat the caller already has, e.g. from a SiteIndex.
+        path = str(path)
+        if st is None:
+            st = os.stat(path)
+        entry = self.files.get(path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+
+        digest = hash_file(path)
+        self.files[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def page_is_current(self, dest_path, inputs):
+        entry = self.pages.get(str(dest_path))
+        if entry is None or entry["inputs"] != inputs:
+            return False
+        return os.path.exists(dest_path)
+
+    def record_page(self, dest_path, from_path, inputs):
+        self.pages[str(dest_path)] = {
+            "source": str(from_path),
+            "inputs": inputs,
+        }
+
+    def forget_page(self, dest_path):
+        self.pages.pop(str(dest_path), None)
+        self.links.pop(str(dest_path), None)
+        self.page_assets.pop(str(dest_path), None)
+
+    def record_links(self, dest_path, links):
+        self.links[str(dest_path)] = links
+
+    def has_links(self, dest_path):
+        return str(dest_path) in self.links
+
+    def record_page_assets(self, dest_path, states):
+        self.page_assets[str(dest_path)] = states
+
+    def page_assets_current(self, dest_path, urls):
+        # Whether every asset the page used still renders as it did, by the
+        # asset map in `urls` (a SiteUrls). Editing one stylesheet only
+        # redoes the pages that link to or inline it.
+        states = self.page_assets.get(str(dest_path))
+        return states is not None and urls.assets_match(states)
+
+    def dependents(self, path):
+        path = str(path)
+        return sorted(dest for dest, entry in self.pages.items() if path in entry["inputs"]["files"])
+
+    def stale_pages(self, current_dest_paths):
+        current = {str(p) for p in current_dest_paths}
+        return sorted(dest for dest in self.pages if dest not in current)
+
+    def record_asset(self, dest_path, src_path):
+        self.assets[str(dest_path)] = str(src_path)
+
+    def forget_asset(self, dest_path):
+        self.assets.pop(str(dest_path), None)
+
+    def stale_assets(self, current_dest_paths):
+        current = {str(p) for p in current_dest_paths}
+        return sorted(dest for dest in self.assets if dest not in current)
+
+    def record_output(self, dest_path, digest):
+        self.outputs[str(dest_path)] = digest
+
+    def forget_output(self, dest_path):
+        self.outputs.pop(str(dest_path), None)
+
+    def delta(self, root=None):
+        # Outputs added, changed and removed since the manifest was loaded,
+        # with their content hashes; paths are relative to `root` if given.
+        def rel(path):
+            return os.path.relpath(path, root) if root is not None else path
+
+        added = {}
+        changed = {}
+        for path, digest in self.outputs.items():
+            old = self.baseline.get(path)
+            if old is None:
+                added[rel(path)] = digest
+            elif old != digest:
+                changed[rel(path)] = digest
+        removed = sorted(rel(path) for path in self.baseline if path not in self.outputs)
+        return {"added": added, "changed": changed, "removed": removed}
+
+    def write_delta(self, path, root=None):
+        delta = self.delta(root)
+        dest_dir = os.path.dirname(path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(delta, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+        return delta
@@ -1,8 +1,10 @@
+import mmap
 from enum import Enum
 
-from htmlnode import ParentNode
+from htmlnode import LeafNode, ParentNode
 from textnode import text_node_to_html_node, TextNode, TextType
-from inline_markdown import text_to_textnodes
+from inline_markdown import InlineCache, text_to_textnodes
+from urls import is_relative_url, site_path
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -12,17 +14,103 @@ class BlockType(Enum):
     ULIST = "unordered_list"
     OLIST = "ordered_list"
 
-def markdown_to_blocks(markdown):
-    blocks = []
-    split_markdown = markdown.split("\n\n")
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+class Block:
+    __slots__ = ("block_type", "lines", "line_number")
+
+    def __init__(self, block_type, lines, line_number):
+        self.block_type = block_type
+        self.lines = lines
+        self.line_number = line_number
+
+    def __eq__(self, other):
+        if not isinstance(other, Block):
+            return False
+        return (
+            self.block_type == other.block_type
+            and self.lines == other.lines
+            and self.line_number == other.line_number
+        )
+
+    def __repr__(self):
+        return f"Block({self.block_type.value}, {self.lines}, line={self.line_number})"
+
+def read_lines(source):
+    if isinstance(source, str):
+        yield from source.split("\n")
+        return
+
+    if isinstance(source, mmap.mmap):
+        for line in iter(source.readline, b""):
+            yield line.decode("utf-8").removesuffix("\n")
+        return
+
+    for line in source:
+        yield line.removesuffix("\n")
+
+def _make_block(lines, line_number):
+    # Same trimming as block.strip(" \n") on the joined block, done per line.
+    start = 0
+    while lines[start].strip(" ") == "":
+        start += 1
+    end = len(lines)
+    while lines[end - 1].strip(" ") == "":
+        end -= 1
+
+    lines = lines[start:end]
+    lines[0] = lines[0].lstrip(" ")
+    lines[-1] = lines[-1].rstrip(" ")
+    return Block(block_type_of_lines(lines), lines, line_number + start)
 
-    for block in split_markdown:
-        block = block.strip(" \n")
-        if block != "":
-            blocks.append(block)
-    return blocks
+def scan_blocks(source):
+    # Blocks are separated by empty lines, except inside a ``` fence, which
+    # runs until its closing line so code containing blank lines stays whole.
+    return _scan_lines(enumerate(read_lines(source), start=1))
+
+def _scan_lines(numbered_lines, fences=True):
+    lines = []
+    first_line = 0
+    has_content = False
+    in_fence = False
+
+    for number, line in numbered_lines:
+        if in_fence:
+            lines.append(line)
+            if line.rstrip(" ").endswith("```"):
+                in_fence = False
+            continue
+
+        if line == "":
+            if has_content:
+                yield _make_block(lines, first_line)
+            lines = []
+            has_content = False
+            continue
+
+        if not lines:
+            first_line = number
+        if not has_content and line.strip(" ") != "":
+            has_content = True
+            in_fence = fences and line.lstrip(" ") == "```"
+        lines.append(line)
+
+    if in_fence:
+        # The fence never closed: split what it took in at empty lines, as
+        # if it had been plain text.
+        yield from _scan_lines(enumerate(lines, start=first_line), fences=False)
+    elif has_content:
+        yield _make_block(lines, first_line)
+
+def markdown_to_blocks(markdown):
+    return ["\n".join(block.lines) for block in scan_blocks(markdown)]
 
 def block_to_block_type(block):
+    return block_type_of_lines(block.split("\n"))
+
+def block_type_of_lines(lines):
+    block = lines[0]
+
     if (
         block.startswith("# ") or block.startswith("## ") or
         block.startswith("### ") or block.startswith("#### ") or
@@ -30,11 +118,10 @@ def block_to_block_type(block):
     ):
         return BlockType.HEADING
 
-    if block.startswith("```\n") and block.endswith("```"):
+    if block == "```" and len(lines) > 1 and lines[-1].endswith("```"):
         return BlockType.CODE
 
     if block.startswith('>'):
-        lines = block.split('\n')
         is_quote = True
 
         for line in lines:
@@ -46,7 +133,6 @@ def block_to_block_type(block):
             return BlockType.QUOTE
 
     if block.startswith("- "):
-        lines = block.split('\n')
         is_unordered_list = True
 
         for line in lines:
@@ -58,7 +144,6 @@ def block_to_block_type(block):
             return BlockType.ULIST
 
     if block.startswith("1. "):
-        lines = block.split('\n')
         i = 1
         for line in lines:
             expected_prefix = f"{i}. "
@@ -72,71 +157,158 @@ def block_to_block_type(block):
 
     return BlockType.PARAGRAPH
 
-def text_to_children(text):
+inline_cache = InlineCache()
+
+def configure_inline_cache(maxsize):
+    inline_cache.resize(maxsize)
+
+def _link_targets(textnodes, targets):
+    # Every link and image URL, including those nested in emphasis.
+    for tn in textnodes:
+        if tn.text_type == TextType.LINK or tn.text_type == TextType.IMAGE:
+            targets.append((tn.text_type.value, tn.url))
+        elif tn.children:
+            _link_targets(tn.children, targets)
+    return targets
+
+def text_to_children(text, urls=None, collect=None, links=None):
+    # `collect`, if given, is called with the fragment's plain text (what a
+    # reader sees, without markup), e.g. to feed the search index; `links`
+    # with its (kind, url) link and image targets.
+    cacheable = inline_cache.cacheable(text)
+    if cacheable:
+        # Link targets depend on the basepath, so it is part of the key; an
+        # entry is only reused while the assets its links use are unchanged.
+        # Pages that resolve relative targets (see SiteUrls.page_dir) keep
+        # apart from the rest and never cache fragments that have them.
+        key = ("" if urls is None else urls.key, urls is not None and urls.page_dir is not None, text)
+        entry = inline_cache.get(key)
+        if entry is not None and (urls is None or urls.reuse(entry[3])):
+            html, plain, targets, _ = entry
+            if collect is not None:
+                collect(plain)
+            if links is not None and targets:
+                links(targets)
+            return [LeafNode(None, html)]
+
     textnodes = text_to_textnodes(text)
 
     htmlnodes = []
 
     for tn in textnodes:
-        htmlnodes.append(text_node_to_html_node(tn))
-
-    return htmlnodes
-
-def markdown_to_html_node(markdown):
-    blocks = markdown_to_blocks(markdown)
-
-    children = []
-
-    for block in blocks:
-        btype = block_to_block_type(block)
-
-        if btype == BlockType.PARAGRAPH:
-            lines = block.split("\n")
-            text = " ".join(lines)
-            p_children = text_to_children(text)
-            children.append(ParentNode("p", children=p_children))
-
-        elif btype == BlockType.HEADING:
-            i = 0
-            while i < len(block) and block[i] == "#" and i < 6:
-                i += 1
-            level = i
-            text = block[level + 1 :]
-            text = text.strip()
-            tag = f"h{level}"
-            h_children = text_to_children(text)
-            children.append(ParentNode(tag, children=h_children))
-
-        elif btype == BlockType.CODE:
-            lines = block.split("\n")
-            inner_lines = lines[1:-1]
-            inner = "\n".join(inner_lines) + "\n"
-            code_html = text_node_to_html_node(TextNode(inner, TextType.TEXT))
-            pre_node = ParentNode("pre", children=[ParentNode("code", children=[code_html])])
-            children.append(pre_node)
-
-        elif btype == BlockType.QUOTE:
-            lines = block.split("\n")
-            stripped_lines = [line.lstrip(">").lstrip(" ") for line in lines]
-            text = " ".join(stripped_lines)
-            q_children = text_to_children(text)
-            children.append(ParentNode("blockquote", children=q_children))
-
-        elif btype == BlockType.ULIST:
-            li_nodes = []
-            for line in block.split("\n"):
-                item_text = line[2:]
-                li_children = text_to_children(item_text)
-                li_nodes.append(ParentNode("li", children=li_children))
-            children.append(ParentNode("ul", children=li_nodes))
-
-        elif btype == BlockType.OLIST:
-            li_nodes = []
-            for line in block.split("\n"):
-                dot_index = line.find(". ")
-                item_text = line[dot_index + 2 :]
-                li_children = text_to_children(item_text)
-                li_nodes.append(ParentNode("li", children=li_children))
-            children.append(ParentNode("ol", children=li_nodes))
+        htmlnodes.append(text_node_to_html_node(tn, urls))
+
+    if not cacheable:
+        if collect is not None:
+            collect("".join(tn.text for tn in textnodes))
+        if links is not None:
+            targets = _link_targets(textnodes, [])
+            if targets:
+                links(targets)
+        return htmlnodes
+
+    # Serialize once here; the page serializer then just copies the string.
+    html = "".join(node.to_html() for node in htmlnodes)
+    plain = "".join(tn.text for tn in textnodes)
+    targets = tuple(_link_targets(textnodes, []))
+    if urls is not None and urls.page_dir is not None and any(is_relative_url(url) for _, url in targets):
+        if collect is not None:
+            collect(plain)
+        if links is not None:
+            links(targets)
+        return [LeafNode(None, html)]
+    states = {} if urls is None else urls.asset_states(site_path(url) for _, url in targets)
+    inline_cache.put(key, (html, plain, targets, states))
+    if collect is not None:
+        collect(plain)
+    if links is not None and targets:
+        links(targets)
+    return [LeafNode(None, html)]
+
+def block_to_html_node(block, urls=None, page_text=None, page_links=None):
+    # `page_text` is an optional search.PageText that collects the block's
+    # words, `page_links` a linkcheck.PageLinks that collects its links.
+    add = add_heading = None
+    if page_text is not None:
+        add, add_heading = page_text.add, page_text.add_heading
+
+    def links_in(lines, line_number):
+        if page_links is None:
+            return None
+        return lambda targets: page_links.add(targets, lines, line_number)
+
+    btype = block.block_type
+    lines = block.lines
 
+    if btype == BlockType.PARAGRAPH:
+        text = " ".join(lines)
+        p_children = text_to_children(text, urls, add, links_in(lines, block.line_number))
+        return ParentNode("p", children=p_children)
+
+    elif btype == BlockType.HEADING:
+        first = lines[0]
+        i = 0
+        while i < len(first) and first[i] == "#" and i < 6:
+            i += 1
+        level = i
+        text = "\n".join(lines)[level + 1 :]
+        text = text.strip()
+        tag = HEADING_TAGS[level - 1]
+        h_children = text_to_children(text, urls, add_heading, links_in(lines, block.line_number))
+        return ParentNode(tag, children=h_children)
+
+    elif btype == BlockType.CODE:
+        inner_lines = lines[1:-1]
+        inner = "\n".join(inner_lines) + "\n"
+        if add is not None:
+            add(inner)
+        code_html = text_node_to_html_node(TextNode(inner, TextType.TEXT))
+        return ParentNode("pre", children=[ParentNode("code", children=[code_html])])
+
+    elif btype == BlockType.QUOTE:
+        stripped_lines = [line.lstrip(">").lstrip(" ") for line in lines]
+        text = " ".join(stripped_lines)
+        q_children = text_to_children(text, urls, add, links_in(lines, block.line_number))
+        return ParentNode("blockquote", children=q_children)
+
+    elif btype == BlockType.ULIST:
+        li_nodes = []
+        for number, line in enumerate(lines, start=block.line_number):
+            item_text = line[2:]
+            li_children = text_to_children(item_text, urls, add, links_in([line], number))
+            li_nodes.append(ParentNode("li", children=li_children))
+        return ParentNode("ul", children=li_nodes)
+
+    elif btype == BlockType.OLIST:
+        li_nodes = []
+        for number, line in enumerate(lines, start=block.line_number):
+            dot_index = line.find(". ")
+            item_text = line[dot_index + 2 :]
+            li_children = text_to_children(item_text, urls, add, links_in([line], number))
+            li_nodes.append(ParentNode("li", children=li_children))
+        return ParentNode("ol", children=li_nodes)
+
+    raise ValueError(f"Unknown block type {btype}")
+
+def markdown_to_html_node(markdown, urls=None, page_text=None, page_links=None):
+    # `markdown` may be a string, a text file object or an mmap; blocks are
+    # scanned lazily so the source is never split into one big list. Site-
+    # relative link and image URLs are resolved through `urls` (a SiteUrls)
+    # as they are rendered. The page's words go to `page_text` and its link
+    # targets to `page_links`, if given.
+    children = [block_to_html_node(block, urls, page_text, page_links) for block in scan_blocks(markdown)]
     return ParentNode("div", children=children)
+
+def write_markdown_html(markdown, out, urls=None, page_text=None, page_links=None):
+    # Writes what markdown_to_html_node(...).write_html(out) would, one block
+    # at a time: each block's nodes are written and dropped before the next
+    # block is scanned, so memory follows the largest block, not the page.
+    written = False
+    for block in scan_blocks(markdown):
+        if not written:
+            out.write("<div>")
+            written = True
+        block_to_html_node(block, urls, page_text, page_links).write_html(out)
+    if not written:
+        raise ValueError("ParentNode must have children")
+    out.write("</div>")
@@ -0,0 +1,58 @@
+import os
+import sys
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows; peak RSS is then not reported.
+    resource = None
+
+# Resident size of a forked page worker before it renders anything, and how
+# many bytes a streamed page may need per byte of its source. A page's
+# largest block is at most the whole source; the worst case measured, one
+# 6 MB paragraph, peaked at about 35 times its size in nodes and fragments.
+WORKER_BYTES = 24 * 1024 * 1024
+SOURCE_FACTOR = 40
+
+
+def peak_rss():
+    # (this process, largest finished child process) peak resident set
+    # size in bytes, or None where the platform can't tell.
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    unit = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return own, children
+
+
+def page_workers(jobs, max_bytes, largest_source):
+    # How many pages may render at once within max_bytes: the number of
+    # worker processes (jobs, 0 = one per CPU) that fit next to this
+    # process, each sized for the largest page source. Always at least one;
+    # 1 renders in this process without a pool.
+    workers = jobs or os.cpu_count() or 1
+    if workers == 1:
+        return 1
+    rss = peak_rss()
+    available = max_bytes - (rss[0] if rss is not None else 0)
+    per_worker = WORKER_BYTES + SOURCE_FACTOR * largest_source
+    return max(1, min(workers, available // per_worker))
+
+
+def format_peak_rss(max_bytes=None, workers=1):
+    # With a ceiling, flags a build whose process plus `workers` copies of
+    # its largest worker could have exceeded it.
+    rss = peak_rss()
+    if rss is None:
+        return "Peak RSS: not available on this platform"
+    own, children = rss
+    line = f"Peak RSS: {own / 2**20:.1f} MB build process"
+    if children:
+        line += f", {children / 2**20:.1f} MB largest child process"
+    if max_bytes is not None:
+        line += f" (ceiling {max_bytes / 2**20:.0f} MB)"
+        if own + workers * children > max_bytes:
+            line += ", over the ceiling"
+    return line
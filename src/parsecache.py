@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+from manifest import hash_file, src_dir
+
+# Modules whose code decides what a Markdown document renders to: the
+# parser, the node types, link and image URL rendering, and the search terms
+# and link targets kept with each entry. Editing any of them changes the
+# parser version and so every cache key.
+PARSER_MODULES = (
+    "markdown_blocks.py",
+    "inline_markdown.py",
+    "textnode.py",
+    "htmlnode.py",
+    "urls.py",
+    "search.py",
+    "linkcheck.py",
+)
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+
+def parser_version():
+    digest = hashlib.sha256()
+    for name in PARSER_MODULES:
+        digest.update(hash_file(os.path.join(src_dir, name)).encode())
+    return digest.hexdigest()
+
+
+class TeeWriter:
+    def __init__(self, *outs):
+        self.outs = outs
+
+    def write(self, text):
+        for out in self.outs:
+            out.write(text)
+
+
+class ParseCache:
+    # On-disk cache of each document's rendered body, keyed by the source
+    # contents, the SiteUrls its links were resolved with (basepath and asset
+    # map) and the parser version. Entry format: the title on the first
+    # line, then the body HTML. Data collected while parsing (search terms,
+    # link targets) is kept as JSON next to the entry, one file per name.
+
+    def __init__(self, dir_path, max_bytes=DEFAULT_MAX_BYTES, version=None):
+        self.dir_path = dir_path
+        self.max_bytes = max_bytes
+        self.version = version if version is not None else parser_version()
+
+    def key(self, markdown, urls=None):
+        # `markdown` may be a text file object, hashed in chunks from where
+        # it is positioned; the key is the one its whole contents would get.
+        digest = hashlib.sha256(self.version.encode())
+        digest.update(("" if urls is None else urls.key).encode() + b"\0")
+        if urls is not None and urls.page_dir is not None:
+            # Relative references render differently in another directory.
+            digest.update(urls.page_dir.encode() + b"\0")
+        if isinstance(markdown, str):
+            digest.update(markdown.encode("utf-8"))
+        else:
+            for chunk in iter(lambda: markdown.read(CHUNK_SIZE), ""):
+                digest.update(chunk.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.dir_path, key[:2], key[2:] + ".html")
+
+    def _meta_path(self, key, name):
+        return os.path.join(self.dir_path, key[:2], f"{key[2:]}.{name}")
+
+    def get(self, key):
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            title = f.readline().removesuffix("\n")
+            return title, f.read()
+
+    def open(self, key):
+        # The entry as an open text file (title line first), for callers
+        # that copy the body out in chunks; None if there is no entry.
+        path = self._path(key)
+        try:
+            f = open(path, "r")
+        except FileNotFoundError:
+            return None
+
+        # Touch the entry so eviction drops the least recently used first.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return f
+
+    @contextmanager
+    def writer(self, key, title):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                f.write(title + "\n")
+                yield f
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put(self, key, title, html):
+        with self.writer(key, title) as f:
+            f.write(html)
+
+    def get_meta(self, key, name):
+        try:
+            with open(self._meta_path(key, name), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_meta(self, key, name, data):
+        path = self._meta_path(key, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def _entries(self):
+        # [(body mtime, total size, paths)] per key: the body and the side
+        # files kept with it go together, and only the body is touched on a
+        # hit. Side files left without a body sort first.
+        groups = {}
+        if not os.path.isdir(self.dir_path):
+            return []
+        with os.scandir(self.dir_path) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as files:
+                    for entry in files:
+                        if entry.is_file():
+                            st = entry.stat()
+                            name, _, suffix = entry.name.partition(".")
+                            group = groups.setdefault((shard.name, name), [-1, 0, []])
+                            if suffix == "html":
+                                group[0] = st.st_mtime_ns
+                            group[1] += st.st_size
+                            group[2].append(entry.path)
+        return [tuple(group) for group in groups.values()]
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        # Drops whole entries, least recently used first, until the cache
+        # fits in max_bytes; returns how many went.
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, paths in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        if os.path.isdir(self.dir_path):
+            shutil.rmtree(self.dir_path)
@@ -0,0 +1,74 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_DEPTH = 32
+
+
+async def _run(items, read, render, write, render_executor, renderers, io_executor, depth):
+    loop = asyncio.get_running_loop()
+    results = [None] * len(items)
+    # Bounded queues between the stages: readers stall once `depth` items
+    # wait for a renderer, and renderers once `depth` wait to be written.
+    rendering = asyncio.Queue(depth)
+    writing = asyncio.Queue(depth)
+    pending = iter(range(len(items)))
+
+    async def reader():
+        for i in pending:
+            try:
+                data = await loop.run_in_executor(io_executor, read, items[i])
+            except Exception as e:
+                results[i] = e
+                continue
+            await rendering.put((i, data))
+
+    async def renderer():
+        while True:
+            job = await rendering.get()
+            if job is None:
+                return
+            i, data = job
+            try:
+                out = await loop.run_in_executor(render_executor, render, items[i], data)
+            except Exception as e:
+                results[i] = e
+                continue
+            await writing.put((i, out))
+
+    async def writer():
+        while True:
+            job = await writing.get()
+            if job is None:
+                return
+            i, out = job
+            try:
+                results[i] = await loop.run_in_executor(io_executor, write, items[i], out)
+            except Exception as e:
+                results[i] = e
+
+    readers = [asyncio.create_task(reader()) for _ in range(depth)]
+    render_tasks = [asyncio.create_task(renderer()) for _ in range(renderers)]
+    writers = [asyncio.create_task(writer()) for _ in range(depth)]
+
+    await asyncio.gather(*readers)
+    for _ in render_tasks:
+        await rendering.put(None)
+    await asyncio.gather(*render_tasks)
+    for _ in writers:
+        await writing.put(None)
+    await asyncio.gather(*writers)
+    return results
+
+
+def run_pipeline(items, read, render, write, render_executor, renderers=1, depth=DEFAULT_DEPTH):
+    # Push every item through read -> render -> write, overlapping the
+    # stages: up to `depth` reads and writes are in flight on a thread pool
+    # (blocking file I/O releases the GIL) while `renderers` items are
+    # rendered on `render_executor`. render and write get the item and the
+    # previous stage's result; render must be picklable for a process pool.
+    # Returns the write results in item order, with the exception instead
+    # for items that failed in any stage.
+    with ThreadPoolExecutor(max_workers=2 * depth) as io_executor:
+        return asyncio.run(
+            _run(items, read, render, write, render_executor, renderers, io_executor, depth)
+        )
@@ -0,0 +1,238 @@
+import json
+import os
+import re
+
+from manifest import remove_output, replace_if_changed
+from urls import normalize_basepath
+
+# Terms are sharded by their first PREFIX_LENGTH characters, so a client
+# looking up a word fetches one small file. Layout under the output root:
+#
+#   search-index/pages.json  {"prefix": 2, "pages": {"<id>": [url, title]}}
+#   search-index/<xy>.json   {"<term>": [id, weight, id, weight, ...]}
+#
+# A term's weight on a page is how often it occurs there, with words in
+# headings (the title included) counting HEADING_WEIGHT times.
+INDEX_DIR = "search-index"
+PAGES_NAME = "pages.json"
+PREFIX_LENGTH = 2
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 40
+HEADING_WEIGHT = 3
+STORE_VERSION = 1
+
+word_pattern = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return [
+        word
+        for word in word_pattern.findall(text.lower())
+        if MIN_TERM_LENGTH <= len(word) <= MAX_TERM_LENGTH
+    ]
+
+
+class PageText:
+    # Collects a page's plain text as markdown_to_html_node renders it.
+    def __init__(self):
+        self.parts = []
+        self.headings = []
+
+    def add(self, text):
+        self.parts.append(text)
+
+    def add_heading(self, text):
+        self.headings.append(text)
+
+    def terms(self):
+        weights = {}
+        for part in self.parts:
+            for term in tokenize(part):
+                weights[term] = weights.get(term, 0) + 1
+        for heading in self.headings:
+            for term in tokenize(heading):
+                weights[term] = weights.get(term, 0) + HEADING_WEIGHT
+        return weights
+
+
+def _shard(term):
+    return term[:PREFIX_LENGTH]
+
+
+def _dump(data):
+    return json.dumps(data, separators=(",", ":"), sort_keys=True, ensure_ascii=False)
+
+
+class SearchIndex:
+    # Inverted index over the generated pages, kept up to date one page at a
+    # time. The per-page terms are stored in `path` between builds; update()
+    # and remove() only note which shards those pages touch, and write()
+    # rewrites just those.
+
+    def __init__(self, path, dir_path_public, basepath="/"):
+        self.path = path
+        self.dir_path = os.path.join(dir_path_public, INDEX_DIR)
+        self.basepath = normalize_basepath(basepath)
+        self.root = dir_path_public
+        self.pages = {}
+        self.next_id = 0
+        self._changes = []
+        self._pages_dirty = False
+
+    @classmethod
+    def load(cls, path, dir_path_public, basepath="/"):
+        index = cls(path, dir_path_public, basepath)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return index
+
+        if data.get("version") != STORE_VERSION or data.get("prefix") != PREFIX_LENGTH:
+            return index
+        index.pages = data.get("pages", {})
+        index.next_id = data.get("next_id", 0)
+        return index
+
+    def save(self):
+        dest_dir = os.path.dirname(self.path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        data = {
+            "version": STORE_VERSION,
+            "prefix": PREFIX_LENGTH,
+            "next_id": self.next_id,
+            "pages": self.pages,
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def has(self, dest_path):
+        return str(dest_path) in self.pages
+
+    def url(self, dest_path):
+        rel = os.path.relpath(dest_path, self.root).replace(os.sep, "/")
+        if rel == "index.html" or rel.endswith("/index.html"):
+            rel = rel[: -len("index.html")]
+        return f"{self.basepath}/{rel}"
+
+    def update(self, dest_path, title, terms):
+        dest_path = str(dest_path)
+        old = self.pages.get(dest_path)
+        url = self.url(dest_path)
+        if old is None:
+            page_id = self.next_id
+            self.next_id += 1
+            old_terms = {}
+        else:
+            page_id = old["id"]
+            old_terms = old["terms"]
+        if old is None or old["url"] != url or old["title"] != title:
+            self._pages_dirty = True
+        # Only terms whose weight moved touch their shard.
+        changed = {term for term in old_terms.keys() | terms.keys() if old_terms.get(term) != terms.get(term)}
+        if changed:
+            self._changes.append(
+                (
+                    page_id,
+                    {term: old_terms[term] for term in changed if term in old_terms},
+                    {term: terms[term] for term in changed if term in terms},
+                )
+            )
+        self.pages[dest_path] = {"id": page_id, "url": url, "title": title, "terms": terms}
+
+    def remove(self, dest_path):
+        old = self.pages.pop(str(dest_path), None)
+        if old is None:
+            return
+        self._changes.append((old["id"], old["terms"], {}))
+        self._pages_dirty = True
+
+    def _shard_path(self, shard):
+        return os.path.join(self.dir_path, shard + ".json")
+
+    def _load_shard(self, shard):
+        # term -> {page id: weight}. A missing or unreadable shard is rebuilt
+        # from the stored terms; the pending changes then apply as no-ops.
+        try:
+            with open(self._shard_path(shard), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {
+                term: dict(zip(postings[::2], postings[1::2]))
+                for term, postings in data.items()
+            }
+        except (OSError, ValueError):
+            pass
+
+        postings = {}
+        for page in self.pages.values():
+            for term, weight in page["terms"].items():
+                if _shard(term) == shard:
+                    postings.setdefault(term, {})[page["id"]] = weight
+        return postings
+
+    def _write_file(self, path, text, manifest):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        digest = replace_if_changed(tmp_path, path)
+        if manifest is not None:
+            manifest.record_output(path, digest)
+
+    def _remove_file(self, path, manifest):
+        remove_output(path, self.root)
+        if manifest is not None:
+            manifest.forget_output(path)
+
+    def write(self, manifest=None):
+        # Rewrite the shards touched since the last write, and the page list
+        # if it changed. Returns the number of shards rewritten.
+        shards = {}
+        for change in self._changes:
+            _, old_terms, new_terms = change
+            for shard in {_shard(term) for term in old_terms.keys() | new_terms.keys()}:
+                shards.setdefault(shard, []).append(change)
+
+        for shard, changes in sorted(shards.items()):
+            postings = self._load_shard(shard)
+            for page_id, old_terms, new_terms in changes:
+                for term in old_terms:
+                    if _shard(term) == shard and term in postings:
+                        postings[term].pop(page_id, None)
+                for term, weight in new_terms.items():
+                    if _shard(term) == shard:
+                        postings.setdefault(term, {})[page_id] = weight
+
+            data = {}
+            for term, pages in postings.items():
+                if pages:
+                    data[term] = [value for page_id in sorted(pages) for value in (page_id, pages[page_id])]
+            path = self._shard_path(shard)
+            if data:
+                self._write_file(path, _dump(data), manifest)
+            else:
+                self._remove_file(path, manifest)
+
+        pages_path = os.path.join(self.dir_path, PAGES_NAME)
+        if self._pages_dirty or (self.pages and not os.path.exists(pages_path)):
+            pages = {str(page["id"]): [page["url"], page["title"]] for page in self.pages.values()}
+            self._write_file(pages_path, _dump({"prefix": PREFIX_LENGTH, "pages": pages}), manifest)
+
+        self._changes = []
+        self._pages_dirty = False
+        return len(shards)
+
+    def clear(self, manifest=None):
+        # Remove the index and its store, e.g. when a build runs without it.
+        if os.path.isdir(self.dir_path):
+            for name in os.listdir(self.dir_path):
+                if name.endswith(".json"):
+                    self._remove_file(os.path.join(self.dir_path, name), manifest)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pages = {}
+        self._changes = []
+        self._pages_dirty = False
@@ -0,0 +1,141 @@
+import fnmatch
+import os
+import posixpath
+import re
+
+from template import LAYOUT_NAME
+
+# Editor swap, backup and lock files, and Finder metadata. Names matching
+# these are skipped, directories included.
+DEFAULT_IGNORE = (".*.swp", ".*.swx", "*~", "#*#", ".#*", ".DS_Store")
+
+
+def ignore_matcher(patterns):
+    # One regex for all patterns; returns a name -> bool function.
+    if not patterns:
+        return lambda name: False
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns)).match
+
+
+class SourceFile:
+    # One file found by a scan: its path, its path relative to the scanned
+    # root in "/" form, the output it becomes (None for content that isn't
+    # a page), its kind ("page", "layout", "file" or "static") and the stat
+    # taken while scanning, which later stages reuse instead of their own.
+    __slots__ = ("path", "rel", "output", "kind", "stat")
+
+    def __init__(self, path, rel, output, kind, stat):
+        self.path = path
+        self.rel = rel
+        self.output = output
+        self.kind = kind
+        self.stat = stat
+
+    @property
+    def size(self):
+        return self.stat.st_size
+
+    @property
+    def mtime_ns(self):
+        return self.stat.st_mtime_ns
+
+    def __repr__(self):
+        return f"SourceFile({self.rel}, {self.kind}, output={self.output})"
+
+
+def walk_files(root, ignore=DEFAULT_IGNORE):
+    # Yield (DirEntry, rel) for every file under `root`, depth first and in
+    # name order: the order a sorted recursive listdir gives, but with one
+    # scandir per directory, no extra stat per entry and no recursion.
+    ignored = ignore_matcher(ignore)
+
+    def listing(directory, prefix):
+        with os.scandir(directory) as entries:
+            kept = sorted((e for e in entries if not ignored(e.name)), key=lambda e: e.name)
+        return iter(kept), prefix
+
+    stack = [listing(root, "")]
+    while stack:
+        entries, prefix = stack[-1]
+        entry = next(entries, None)
+        if entry is None:
+            stack.pop()
+        elif entry.is_dir():
+            stack.append(listing(entry.path, f"{prefix}{entry.name}/"))
+        elif entry.is_file():
+            yield entry, prefix + entry.name
+
+
+def scan_content(dir_path_content, dest_dir_path, ignore=DEFAULT_IGNORE):
+    files = []
+    for entry, rel in walk_files(dir_path_content, ignore):
+        output = None
+        if entry.name.endswith(".md"):
+            kind = "page"
+            output = os.path.splitext(os.path.join(dest_dir_path, rel))[0] + ".html"
+        elif entry.name == LAYOUT_NAME:
+            kind = "layout"
+        else:
+            kind = "file"
+        files.append(SourceFile(entry.path, rel, output, kind, entry.stat()))
+    return files
+
+
+def scan_static(dir_path_static, dest_dir_path, ignore=DEFAULT_IGNORE):
+    return [
+        SourceFile(entry.path, rel, os.path.join(dest_dir_path, rel), "static", entry.stat())
+        for entry, rel in walk_files(dir_path_static, ignore)
+    ]
+
+
+class SiteIndex:
+    # Every source file of the site, from one walk of content/ and static/.
+    # Build stages take their page list, static file list and file stats
+    # from here instead of walking or stat-ing the trees themselves.
+
+    def __init__(self, dir_path_content, content=(), static=()):
+        self.dir_path_content = dir_path_content
+        self.content = list(content)
+        self.static = list(static)
+        self._stats = {f.path: f.stat for f in self.content}
+        self._stats.update((f.path, f.stat) for f in self.static)
+
+    @classmethod
+    def scan(cls, dir_path_content, dir_path_public, dir_path_static=None, ignore=DEFAULT_IGNORE):
+        content = scan_content(dir_path_content, dir_path_public, ignore)
+        static = []
+        if dir_path_static is not None:
+            static = scan_static(dir_path_static, dir_path_public, ignore)
+        return cls(dir_path_content, content, static)
+
+    def stat(self, path):
+        # The scan's stat for files it found; anything else (the root
+        # template, included partials) is stat-ed once and remembered.
+        st = self._stats.get(path)
+        if st is None:
+            st = self._stats[path] = os.stat(path)
+        return st
+
+    def pages(self, template_path):
+        # (from, template, dest) for every page, in walk order. A
+        # layout.html in a content directory replaces the template for
+        # every page in that directory and below it.
+        templates = {"": template_path}
+        for f in self.content:
+            if f.kind == "layout":
+                templates[posixpath.dirname(f.rel)] = f.path
+
+        def template_for(rel_dir):
+            chain = []
+            while rel_dir not in templates:
+                chain.append(rel_dir)
+                rel_dir = posixpath.dirname(rel_dir)
+            for d in chain:
+                templates[d] = templates[rel_dir]
+            return templates[rel_dir]
+
+        return [
+            (f.path, template_for(posixpath.dirname(f.rel)), f.output)
+            for f in self.content
+            if f.kind == "page"
+        ]
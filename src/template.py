@@ -0,0 +1,121 @@
+import os
+import re
+
+from htmlminify import minify_chunks
+from urls import SiteUrls
+
+LAYOUT_NAME = "layout.html"
+
+tag_pattern = re.compile(r'\{\{\s*(\w+)\s*\}\}|\{%\s*include\s+"([^"]+)"\s*%\}')
+
+_cache = {}
+
+
+class Template:
+    def __init__(self, path, chunks, slots, dependencies, mtimes=None, asset_states=None):
+        self.path = path
+        self.chunks = chunks
+        self.slots = slots
+        self.dependencies = dependencies
+        self.mtimes = mtimes
+        # SiteUrls.asset_states of the assets its static markup references
+        # or inlines.
+        self.asset_states = asset_states or {}
+
+    def is_current(self):
+        try:
+            return [os.stat(dep).st_mtime_ns for dep in self.dependencies] == self.mtimes
+        except OSError:
+            return False
+
+    def render(self, **context):
+        parts = list(self.chunks)
+        for index, name, literal in self.slots:
+            parts[index] = context.get(name, literal)
+        return "".join(parts)
+
+    def write(self, out, **context):
+        # Slot values may be strings or callables that write themselves to
+        # `out`, e.g. a node's write_html, so content never has to be
+        # materialised as one string.
+        pos = 0
+        for index, name, literal in self.slots:
+            for chunk in self.chunks[pos:index]:
+                out.write(chunk)
+            value = context.get(name, literal)
+            if callable(value):
+                value(out)
+            else:
+                out.write(value)
+            pos = index + 1
+        for chunk in self.chunks[pos:]:
+            out.write(chunk)
+
+    def __repr__(self):
+        return f"Template({self.path}, slots={[name for _, name, _ in self.slots]})"
+
+
+def _expand(path, stack, dependencies, mtimes):
+    # Inline every {% include %} so the compiled template is a flat token list.
+    path = os.path.abspath(path)
+    if path in stack:
+        raise ValueError(f"Template include cycle: {' -> '.join(stack + [path])}")
+    with open(path, "r") as f:
+        if path not in dependencies:
+            dependencies.append(path)
+            mtimes.append(os.fstat(f.fileno()).st_mtime_ns)
+        source = f.read()
+
+    tokens = []
+    pos = 0
+    for match in tag_pattern.finditer(source):
+        tokens.append(source[pos : match.start()])
+        if match.group(1) is not None:
+            tokens.append((match.group(1), match.group(0)))
+        else:
+            include_path = os.path.join(os.path.dirname(path), match.group(2))
+            tokens.extend(_expand(include_path, stack + [path], dependencies, mtimes))
+        pos = match.end()
+    tokens.append(source[pos:])
+    return tokens
+
+
+def compile_template(path, urls=None, minify=False):
+    if urls is None:
+        urls = SiteUrls()
+    urls = urls.recorder()
+    dependencies = []
+    mtimes = []
+    tokens = _expand(path, [], dependencies, mtimes)
+
+    chunks = []
+    slots = []
+    static = []
+    for token in tokens:
+        if isinstance(token, str):
+            static.append(token)
+            continue
+        if static:
+            chunks.append(urls.rewrite("".join(static)))
+            static = []
+        slots.append((len(chunks), token[0], token[1]))
+        chunks.append(None)
+    if static:
+        chunks.append(urls.rewrite("".join(static)))
+    if minify:
+        chunks = minify_chunks(chunks)
+
+    return Template(path, chunks, slots, dependencies, mtimes, urls.asset_states(urls.used))
+
+
+def load_template(path, urls=None, minify=False):
+    # Compiled templates are reused until one of their files changes on disk
+    # or an asset they reference renders differently.
+    if urls is None:
+        urls = SiteUrls()
+    key = (os.path.abspath(path), urls.key, minify)
+    template = _cache.get(key)
+    if template is None or not template.is_current() or not urls.assets_match(template.asset_states):
+        template = compile_template(path, urls, minify)
+        _cache[key] = template
+    return template
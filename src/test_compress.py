@@ -0,0 +1,82 @@
+import gzip
+import os
+import unittest
+
+from compress import compress_outputs, gzip_output, is_compressible, remove_sidecars
+from manifest import BuildManifest, hash_file
+from test_support import TempDirMixin
+
+
+class TestCompress(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manifest = BuildManifest()
+
+    def output(self, name, data):
+        path = self.write(name, data)
+        self.manifest.record_output(path, hash_file(path))
+        return path
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible("docs/index.html"))
+        self.assertTrue(is_compressible("docs/logo.svg"))
+        self.assertFalse(is_compressible("docs/logo.png"))
+        self.assertFalse(is_compressible("docs/index.html.gz"))
+
+    def test_sidecar_round_trips(self):
+        path = self.output("index.html", b"<p>hello</p>" * 100)
+        digest = gzip_output(path)
+        with open(path + ".gz", "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"<p>hello</p>" * 100)
+        self.assertEqual(digest, hash_file(path + ".gz"))
+
+    def test_incompressible_output_is_skipped(self):
+        path = self.output("data.json", os.urandom(512))
+        self.write(path + ".gz", b"stale")
+        self.assertIsNone(gzip_output(path))
+        self.assertFalse(os.path.exists(path + ".gz"))
+
+    def test_only_changed_outputs_are_recompressed(self):
+        index = self.output("index.html", b"<p>index</p>" * 50)
+        about = self.output("about.html", b"<p>about</p>" * 50)
+        compress_outputs(self.manifest)
+        os.utime(index + ".gz", ns=(0, 0))
+        os.utime(about + ".gz", ns=(0, 0))
+
+        self.output("about.html", b"<p>edited</p>" * 50)
+        compress_outputs(self.manifest)
+
+        self.assertEqual(os.stat(index + ".gz").st_mtime_ns, 0)
+        with open(about + ".gz", "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"<p>edited</p>" * 50)
+        self.assertIn(about + ".gz", self.manifest.outputs)
+
+    def test_removed_output_loses_its_sidecar(self):
+        path = self.output("index.html", b"<p>index</p>" * 50)
+        compress_outputs(self.manifest)
+
+        os.remove(path)
+        self.manifest.forget_output(path)
+        compress_outputs(self.manifest)
+
+        self.assertFalse(os.path.exists(path + ".gz"))
+        self.assertEqual(self.manifest.outputs, {})
+        self.assertEqual(self.manifest.sidecars, {})
+
+    def test_remove_sidecars(self):
+        path = self.output("index.html", b"<p>index</p>" * 50)
+        compress_outputs(self.manifest)
+
+        self.assertEqual(remove_sidecars(self.manifest, list(self.manifest.sidecars)), 1)
+        self.assertFalse(os.path.exists(path + ".gz"))
+        self.assertEqual(list(self.manifest.outputs), [path])
+
+    def test_parallel_matches_serial(self):
+        paths = [self.output(f"p{i}.html", f"<p>{i}</p>".encode() * 50) for i in range(4)]
+        self.assertEqual(compress_outputs(self.manifest, jobs=2), [])
+        for path in paths:
+            self.assertEqual(self.manifest.outputs[path + ".gz"], hash_file(path + ".gz"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import os
+import unittest
+
+from copystatic import copy_files_recursive, sync_files
+from manifest import BuildManifest, hash_bytes
+from test_support import TempDirMixin
+from urls import AssetMap, fingerprint_name
+
+
+class TestSyncFiles(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.src = os.path.join(self.root, "static")
+        self.dst = os.path.join(self.root, "docs")
+        self.write(os.path.join(self.src, "index.css"), "body {}")
+        self.write(os.path.join(self.src, "images", "a.png"), "png")
+
+    def test_copies_tree(self):
+        sync_files(self.src, self.dst)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body {}")
+        self.assertEqual(self.read(os.path.join(self.dst, "images", "a.png")), "png")
+
+    def test_preserves_mtime(self):
+        sync_files(self.src, self.dst)
+        src_st = os.stat(os.path.join(self.src, "index.css"))
+        dst_st = os.stat(os.path.join(self.dst, "index.css"))
+        self.assertEqual(src_st.st_mtime_ns, dst_st.st_mtime_ns)
+
+    def test_unchanged_files_are_not_copied(self):
+        sync_files(self.src, self.dst)
+        dst_css = os.path.join(self.dst, "index.css")
+        inode = os.stat(dst_css).st_ino
+
+        sync_files(self.src, self.dst)
+        self.assertEqual(os.stat(dst_css).st_ino, inode)
+
+    def test_changed_files_are_copied(self):
+        sync_files(self.src, self.dst)
+        self.write(os.path.join(self.src, "index.css"), "body { color: red }")
+        sync_files(self.src, self.dst)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body { color: red }")
+
+    def test_hash_mode_detects_same_size_edits(self):
+        sync_files(self.src, self.dst, use_hash=True)
+        src_css = os.path.join(self.src, "index.css")
+        st = os.stat(src_css)
+        self.write(src_css, "body []")
+        os.utime(src_css, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+        sync_files(self.src, self.dst, use_hash=True)
+        self.assertEqual(self.read(os.path.join(self.dst, "index.css")), "body []")
+
+    def test_removes_only_deleted_sources(self):
+        manifest = BuildManifest()
+        page = os.path.join(self.dst, "index.html")
+        self.write(page, "<p>generated</p>")
+        sync_files(self.src, self.dst, manifest)
+
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        sync_files(self.src, self.dst, manifest)
+
+        self.assertFalse(os.path.exists(os.path.join(self.dst, "images")))
+        self.assertTrue(os.path.exists(page))
+        self.assertEqual(list(manifest.assets), [os.path.join(self.dst, "index.css")])
+
+    def test_assets_appear_in_the_deploy_delta(self):
+        manifest = BuildManifest()
+        sync_files(self.src, self.dst, manifest)
+        self.assertEqual(sorted(manifest.delta(self.dst)["added"]), ["images/a.png", "index.css"])
+
+        manifest.baseline = dict(manifest.outputs)
+        os.remove(os.path.join(self.src, "images", "a.png"))
+        sync_files(self.src, self.dst, manifest)
+        self.assertEqual(manifest.delta(self.dst)["removed"], ["images/a.png"])
+
+    def test_fingerprinted_copies(self):
+        self.write(os.path.join(self.src, "robots.txt"), "User-agent: *")
+        manifest = BuildManifest()
+        assets = AssetMap()
+        sync_files(self.src, self.dst, manifest, assets=assets)
+
+        css = fingerprint_name("index.css", hash_bytes(b"body {}"))
+        png = fingerprint_name("a.png", hash_bytes(b"png"))
+        self.assertEqual(assets.urls, {"/index.css": f"/{css}", "/images/a.png": f"/images/{png}"})
+        self.assertEqual(sorted(os.listdir(self.dst)), sorted(["images", css, "robots.txt"]))
+
+        # An edited file gets a new name; the old copy goes away.
+        self.write(os.path.join(self.src, "index.css"), "body { color: red }")
+        assets = AssetMap()
+        sync_files(self.src, self.dst, manifest, assets=assets)
+        self.assertNotIn(css, os.listdir(self.dst))
+        self.assertEqual(self.read(os.path.join(self.dst, assets.urls["/index.css"][1:])), "body { color: red }")
+        self.assertEqual(assets.urls["/images/a.png"], f"/images/{png}")
+
+    def test_link_mode_hardlinks(self):
+        sync_files(self.src, self.dst, link=True)
+        src_st = os.stat(os.path.join(self.src, "index.css"))
+        dst_st = os.stat(os.path.join(self.dst, "index.css"))
+        self.assertEqual(src_st.st_ino, dst_st.st_ino)
+
+    def test_copy_files_recursive(self):
+        copy_files_recursive(self.src, self.dst)
+        self.assertEqual(self.read(os.path.join(self.dst, "images", "a.png")), "png")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import unittest
+
+from copystatic import sync_files
+from css import CssMinifier, can_inline, minify_css
+from manifest import BuildManifest
+from template import compile_template
+from test_support import TempDirMixin
+from urls import AssetMap, SiteUrls
+
+
+class TestMinifyCss(unittest.TestCase):
+    def test_removes_comments_and_whitespace(self):
+        css = "/* header */\nh1 ,\nh2 {\n  color : red ;\n  margin: 0;\n}\n"
+        self.assertEqual(minify_css(css), "h1,h2{color :red;margin:0}")
+
+    def test_keeps_significant_spaces(self):
+        css = "a :hover { width: calc(1px + 2px) }\n@media screen and (max-width: 10px) { a { b: c } }"
+        self.assertEqual(
+            minify_css(css),
+            "a :hover{width:calc(1px + 2px)}@media screen and (max-width:10px){a{b:c}}",
+        )
+
+    def test_strings_are_untouched(self):
+        css = 'a::after { content: "x  ;  /* y */ }" }'
+        self.assertEqual(minify_css(css), 'a::after{content:"x  ;  /* y */ }"}')
+
+    def test_can_inline(self):
+        self.assertTrue(can_inline("a{color:red}"))
+        self.assertFalse(can_inline("a{background:url(bg.png)}"))
+        self.assertFalse(can_inline('@import "other.css";'))
+
+
+class TestCssStage(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.public = os.path.join(self.root, "docs")
+        self.cache = os.path.join(self.root, "cache")
+        self.write(os.path.join(self.static, "index.css"), "body {\n  margin: 0;\n}\n")
+        self.write(os.path.join(self.static, "big.css"), "a { color: red; }\n" * 50)
+
+    def sync(self, manifest, assets=None, inline_limit=0):
+        css = CssMinifier(self.cache, manifest.css, inline_limit)
+        sync_files(self.static, self.public, manifest, assets=assets, css=css)
+
+    def test_copies_minified_css_once_per_change(self):
+        manifest = BuildManifest()
+        self.sync(manifest)
+        self.assertEqual(self.read(os.path.join(self.public, "index.css")), "body{margin:0}")
+        self.assertEqual(len(manifest.css), 2)
+
+        cached = os.path.join(self.cache, os.listdir(self.cache)[0])
+        os.utime(cached, ns=(0, 0))
+        self.sync(manifest)
+        self.assertEqual(os.stat(cached).st_mtime_ns, 0)
+
+        self.write(os.path.join(self.static, "index.css"), "body { padding: 0 }")
+        self.sync(manifest)
+        self.assertEqual(self.read(os.path.join(self.public, "index.css")), "body{padding:0}")
+
+    def test_small_stylesheets_are_inlined_into_templates(self):
+        assets = AssetMap(fingerprint=False)
+        self.sync(BuildManifest(), assets, inline_limit=100)
+        self.assertEqual(list(assets.styles), ["/index.css"])
+
+        template_path = os.path.join(self.root, "template.html")
+        self.write(
+            template_path,
+            '<link href="/index.css" rel="stylesheet" /><link rel="stylesheet" href="/big.css">'
+            '<link rel="icon" href="/index.css">{{ Content }}',
+        )
+        html = compile_template(template_path, SiteUrls("/site", assets)).render(Content="")
+        self.assertEqual(
+            html,
+            '<style>body{margin:0}</style><link rel="stylesheet" href="/site/big.css">'
+            '<link rel="icon" href="/site/index.css">',
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,10 @@
-from gencontent import extract_title
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+from gencontent import extract_title, generate_pages_recursive
+from test_support import TempDirMixin
 
 def test_extract_title_basic():
     md = "# Hello"
@@ -17,3 +23,51 @@ def test_extract_title_no_h1_raises():
         raised = True
 
     assert raised
+
+class TestParallelPages(TempDirMixin, unittest.TestCase):
+    def make_site(self, pages):
+        for rel, text in pages.items():
+            self.write(os.path.join("content", rel), text)
+        template = self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        return os.path.join(self.root, "content"), template, os.path.join(self.root, "docs")
+
+    def read_tree(self, root):
+        out = {}
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                out[os.path.relpath(path, root)] = self.read(path)
+        return out
+
+    def test_parallel_matches_serial(self):
+        pages = {f"p{i}/index.md": f"# Page {i}\n\nbody **{i}**" for i in range(12)}
+        content, template, _ = self.make_site(pages)
+
+        serial = os.path.join(self.root, "serial")
+        parallel = os.path.join(self.root, "parallel")
+        self.assertEqual(generate_pages_recursive(content, template, serial, "/"), [])
+        self.assertEqual(generate_pages_recursive(content, template, parallel, "/", jobs=4), [])
+
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+        self.assertEqual(len(self.read_tree(parallel)), 12)
+
+    def test_failures_reported_per_page(self):
+        pages = {"a/index.md": "no title here", "b/index.md": "# B", "c/index.md": "# C"}
+        content, template, public = self.make_site(pages)
+
+        stdout = io.StringIO()
+        with redirect_stdout(stdout):
+            failures = generate_pages_recursive(content, template, public, "/", jobs=2)
+
+        self.assertEqual([f[0].split("content")[-1] for f in failures], ["/a/index.md"])
+        self.assertIn("no h1 header found", failures[0][2])
+        self.assertEqual(sorted(self.read_tree(public)), ["b/index.html", "c/index.html"])
+
+        out = stdout.getvalue().splitlines()
+        logged = [line.split()[3] for line in out if line.startswith("Generating page")]
+        self.assertEqual(logged, [os.path.join(content, p) for p in ("a/index.md", "b/index.md", "c/index.md")])
+        self.assertTrue(out[1].startswith("Error generating page"))
+
+
+if __name__ == "__main__":
+    unittest.main()
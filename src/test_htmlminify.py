@@ -0,0 +1,80 @@
+import io
+import os
+import unittest
+
+from gencontent import PageOptions, write_page
+from htmlminify import HtmlMinifier, minify_chunks, minify_html
+from parsecache import ParseCache
+from template import compile_template
+from test_support import TempDirMixin
+
+
+class TestMinifyHtml(unittest.TestCase):
+    def test_collapses_whitespace(self):
+        html = "<div>\n  <p>a   b\n c</p>\n  <b>x</b>  <i>y</i>\n</div>\n"
+        self.assertEqual(minify_html(html), "<div><p>a b c</p><b>x</b> <i>y</i></div>")
+
+    def test_code_blocks_are_untouched(self):
+        html = "<div> <pre><code>def f():\n    return  1\n</code></pre>  <p> <code>a  b</code> </p></div>"
+        self.assertEqual(
+            minify_html(html),
+            "<div><pre><code>def f():\n    return  1\n</code></pre><p><code>a  b</code></p></div>",
+        )
+
+    def test_bare_less_than_is_not_a_tag(self):
+        html = "<pre><code>if a<b:\n    pass\n</code></pre>\n<p>x    y < z</p>"
+        expected = "<pre><code>if a<b:\n    pass\n</code></pre><p>x y < z</p>"
+        self.assertEqual(minify_html(html), expected)
+        for split in range(1, len(html)):
+            out = io.StringIO()
+            minifier = HtmlMinifier(out)
+            minifier.write(html[:split])
+            minifier.write(html[split:])
+            minifier.flush()
+            self.assertEqual(out.getvalue(), expected, split)
+
+    def test_drops_comments_but_not_conditionals(self):
+        html = "<p>a <!-- note --> b</p><!--[if IE]><p>old</p><![endif]-->"
+        self.assertEqual(minify_html(html), "<p>a b</p><!--[if IE]><p>old</p><![endif]-->")
+
+    def test_streaming_matches_one_shot(self):
+        html = "<div>\n <p>a  <!-- c -->  b</p>\n<pre>x\n  y</pre> <b>z</b>\n</div>"
+        expected = minify_html(html)
+        for split in range(1, len(html)):
+            out = io.StringIO()
+            minifier = HtmlMinifier(out)
+            minifier.write(html[:split])
+            minifier.write(html[split:])
+            minifier.flush()
+            self.assertEqual(out.getvalue(), expected, split)
+
+    def test_template_chunks_keep_spaces_next_to_slots(self):
+        chunks = ["<html>\n  <body>\n    <p>By ", None, " and\n  ", None, "</p>\n  </body>\n</html>\n"]
+        self.assertEqual(minify_chunks(chunks), ["<html><body><p>By ", None, " and ", None, "</p></body></html>"])
+
+
+class TestMinifiedPages(TempDirMixin, unittest.TestCase):
+    def test_template_is_minified_when_compiled(self):
+        path = self.write("t.html", "<head>\n  <title>{{ Title }}</title>\n</head>\n")
+        self.assertEqual(compile_template(path, minify=True).chunks, ["<head><title>", None, "</title></head>"])
+
+    def test_write_page_minifies_content_but_caches_it_raw(self):
+        source = self.write("page.md", "# Title\n\n```\nkeep   this\n```")
+        template = self.write("t.html", "<body>\n  {{ Content }}\n</body>\n")
+        cache = ParseCache(os.path.join(self.root, "cache"), version="v1")
+        options = PageOptions(parse_cache=cache, minify_html=True)
+
+        for name in ("a.html", "b.html"):
+            write_page(source, template, os.path.join(self.root, name), "/", options=options)
+            with open(os.path.join(self.root, name)) as f:
+                self.assertEqual(
+                    f.read(),
+                    "<body><div><h1>Title</h1><pre><code>keep   this\n</code></pre></div></body>",
+                )
+
+        _, cached = cache.get(cache.key("# Title\n\n```\nkeep   this\n```"))
+        self.assertEqual(cached, "<div><h1>Title</h1><pre><code>keep   this\n</code></pre></div>")
+
+
+if __name__ == "__main__":
+    unittest.main()
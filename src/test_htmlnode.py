@@ -1,3 +1,4 @@
+import io
 import unittest
 from src.htmlnode import HTMLNode, LeafNode, ParentNode
 
@@ -103,5 +104,39 @@ class TestHTMLNode(unittest.TestCase):
         node = ParentNode("p", [child], {"class": "cls"})
         self.assertIn('<p class="cls">text</p>', node.to_html())
 
+    def test_write_html_streams_to_file_object(self):
+        node = ParentNode("p", [LeafNode(None, "a"), LeafNode("b", "bold", {"class": "x"})])
+        out = io.StringIO()
+        node.write_html(out)
+        self.assertEqual(out.getvalue(), '<p>a<b class="x">bold</b></p>')
+
+    def test_render_calls_write_per_piece(self):
+        node = ParentNode("ul", [ParentNode("li", [LeafNode(None, "one")])])
+        pieces = []
+        node.render(pieces.append)
+        self.assertEqual(pieces, ["<ul>", "<li>", "one", "</li>", "</ul>"])
+
+    def test_to_html_very_deep_nesting(self):
+        node = LeafNode(None, "x")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span>" * 5000 + "x</span>"))
+        self.assertEqual(len(html), 5000 * len("<span></span>") + 1)
+
+    def test_base_node_to_html_raises(self):
+        with self.assertRaises(NotImplementedError):
+            HTMLNode("p", "x").to_html()
+
+    def test_nodes_have_no_instance_dict(self):
+        for node in (HTMLNode("p"), LeafNode("b", "x"), ParentNode("p", [LeafNode(None, "x")])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_leaf_and_parent_attributes(self):
+        leaf = LeafNode("a", "x", {"href": "/"})
+        self.assertEqual((leaf.tag, leaf.value, leaf.children, leaf.props), ("a", "x", None, {"href": "/"}))
+        parent = ParentNode("p", [leaf])
+        self.assertEqual((parent.tag, parent.value, parent.children, parent.props), ("p", None, [leaf], None))
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,83 @@
+import os
+import struct
+import unittest
+import zlib
+
+from copystatic import sync_files
+from images import PNG_SIGNATURE, ImageProcessor, _chunk, _chunks, optimize_png, png_size
+from manifest import BuildManifest
+from test_support import TempDirMixin
+from textnode import TextNode, TextType, text_node_to_html_node
+from urls import AssetMap, SiteUrls
+
+
+def make_png(width, height, extra=(), level=1, idat_parts=2):
+    raw = b"".join(b"\0" + bytes(range(width % 256)) * 3 for _ in range(height))
+    data = zlib.compress(raw, level)
+    step = len(data) // idat_parts + 1
+    chunks = [_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))]
+    chunks.extend(_chunk(kind, body) for kind, body in extra)
+    chunks.extend(_chunk(b"IDAT", data[i : i + step]) for i in range(0, len(data), step))
+    chunks.append(_chunk(b"IEND", b""))
+    return PNG_SIGNATURE + b"".join(chunks)
+
+
+def pixels(png):
+    return zlib.decompress(b"".join(body for kind, body in _chunks(png) if kind == b"IDAT"))
+
+
+class TestPng(TempDirMixin, unittest.TestCase):
+    def test_png_size(self):
+        self.assertEqual(png_size(self.write("a.png", make_png(40, 30))), (40, 30))
+        self.assertIsNone(png_size(self.write("b.png", b"GIF89a not a png")))
+
+    def test_optimize_is_lossless_and_drops_metadata(self):
+        original = make_png(200, 100, extra=[(b"tEXt", b"Comment\0hi"), (b"tRNS", b"\0\0\0\0\0\0")])
+        optimized = optimize_png(original)
+
+        self.assertLess(len(optimized), len(original))
+        self.assertEqual(pixels(optimized), pixels(original))
+        kinds = [kind for kind, _ in _chunks(optimized)]
+        self.assertEqual(kinds, [b"IHDR", b"tRNS", b"IDAT", b"IEND"])
+
+    def test_optimize_leaves_unsafe_files_alone(self):
+        animated = make_png(20, 20, extra=[(b"acTL", b"\0\0\0\1\0\0\0\0")])
+        self.assertIs(optimize_png(animated), animated)
+        self.assertEqual(optimize_png(b"not a png"), b"not a png")
+        truncated = make_png(20, 20)[:-20]
+        self.assertIs(optimize_png(truncated), truncated)
+
+    def test_processor_caches_by_hash(self):
+        path = self.write("static/images/a.png", make_png(200, 100))
+        table = {}
+        processor = ImageProcessor(os.path.join(self.root, "cache"), table, optimize=True)
+
+        copy_path, digest, size = processor.process(path, "abc")
+        self.assertEqual(size, (200, 100))
+        self.assertNotEqual(copy_path, path)
+        self.assertEqual(table["abc"]["size"], [200, 100])
+
+        # A cached entry is trusted without reading the source again.
+        os.remove(path)
+        self.assertEqual(processor.process(path, "abc"), (copy_path, digest, size))
+
+    def test_sizes_reach_image_nodes(self):
+        static = os.path.join(self.root, "static")
+        self.write("static/images/a.png", make_png(40, 30))
+        manifest = BuildManifest()
+        assets = AssetMap(fingerprint=False)
+        processor = ImageProcessor(os.path.join(self.root, "cache"), manifest.images, optimize=True)
+        sync_files(static, os.path.join(self.root, "docs"), manifest, assets=assets, images=processor)
+
+        self.assertTrue(os.path.exists(os.path.join(self.root, "docs", "images", "a.png")))
+        node = TextNode("a", TextType.IMAGE, "/images/a.png")
+        self.assertEqual(
+            text_node_to_html_node(node, SiteUrls("/site", assets)).to_html(),
+            '<img src="/site/images/a.png" alt="a" width="40" height="30"></img>',
+        )
+        remote = TextNode("b", TextType.IMAGE, "https://example.com/b.png")
+        self.assertNotIn("width", text_node_to_html_node(remote, SiteUrls("/", assets)).props)
+
+
+if __name__ == "__main__":
+    unittest.main()
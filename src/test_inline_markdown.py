@@ -1,6 +1,7 @@
 import unittest
 from textnode import TextNode, TextType
 from inline_markdown import (
+    InlineCache,
     split_nodes_delimiter,
     split_nodes_image,
     split_nodes_link,
@@ -152,5 +153,154 @@ class TestTextToTextNodes(unittest.TestCase):
         result_nodes = text_to_textnodes(input_text)
         self.assertListEqual(result_nodes, expected_nodes)
 
+    def test_nested_emphasis(self):
+        result = text_to_textnodes("a **bold _and italic_ text** b")
+        self.assertListEqual(
+            result,
+            [
+                TextNode("a ", TextType.TEXT),
+                TextNode(
+                    "bold and italic text",
+                    TextType.BOLD,
+                    children=[
+                        TextNode("bold ", TextType.TEXT),
+                        TextNode("and italic", TextType.ITALIC),
+                        TextNode(" text", TextType.TEXT),
+                    ],
+                ),
+                TextNode(" b", TextType.TEXT),
+            ],
+        )
+
+    def test_code_span_is_literal(self):
+        self.assertListEqual(
+            text_to_textnodes("use `a_b **c**` here"),
+            [
+                TextNode("use ", TextType.TEXT),
+                TextNode("a_b **c**", TextType.CODE),
+                TextNode(" here", TextType.TEXT),
+            ],
+        )
+
+    def test_link_url_is_literal(self):
+        self.assertListEqual(
+            text_to_textnodes("see [docs](https://x.dev/a_b_c) now"),
+            [
+                TextNode("see ", TextType.TEXT),
+                TextNode("docs", TextType.LINK, "https://x.dev/a_b_c"),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+
+    def test_unmatched_brackets_are_text(self):
+        self.assertListEqual(
+            text_to_textnodes("wow! [not a link] ok"),
+            [TextNode("wow! [not a link] ok", TextType.TEXT)],
+        )
+
+    def test_unmatched_delimiter_raises(self):
+        with self.assertRaises(Exception):
+            text_to_textnodes("this is **broken")
+        with self.assertRaises(Exception):
+            text_to_textnodes("**crossed _spans** here_")
+
+    def test_intraword_underscore_in_bold_is_literal(self):
+        self.assertListEqual(
+            text_to_textnodes("Set **MAX_SIZE** to 10"),
+            [
+                TextNode("Set ", TextType.TEXT),
+                TextNode("MAX_SIZE", TextType.BOLD),
+                TextNode(" to 10", TextType.TEXT),
+            ],
+        )
+
+    def test_empty_span_markers_are_literal(self):
+        self.assertListEqual(
+            text_to_textnodes("the **__init__** method"),
+            [
+                TextNode("the ", TextType.TEXT),
+                TextNode("__init__", TextType.BOLD),
+                TextNode(" method", TextType.TEXT),
+            ],
+        )
+        self.assertListEqual(text_to_textnodes("**__x__**"), [TextNode("__x__", TextType.BOLD)])
+
+    def test_unmatched_backtick_is_literal(self):
+        self.assertListEqual(
+            text_to_textnodes("Press the **`** key"),
+            [
+                TextNode("Press the ", TextType.TEXT),
+                TextNode("`", TextType.BOLD),
+                TextNode(" key", TextType.TEXT),
+            ],
+        )
+        self.assertListEqual(
+            text_to_textnodes("type _a`b_ now"),
+            [
+                TextNode("type ", TextType.TEXT),
+                TextNode("a`b", TextType.ITALIC),
+                TextNode(" now", TextType.TEXT),
+            ],
+        )
+        self.assertListEqual(
+            text_to_textnodes("the **`cmd** flag"),
+            [
+                TextNode("the ", TextType.TEXT),
+                TextNode("`cmd", TextType.BOLD),
+                TextNode(" flag", TextType.TEXT),
+            ],
+        )
+
+    def test_many_literal_markers(self):
+        # Each marker put back as text must not copy the text before it.
+        for text in ("call obj__init and " * 20000, "x **** " * 50000):
+            self.assertListEqual(text_to_textnodes(text), [TextNode(text, TextType.TEXT)])
+
+    def test_link_dense_text(self):
+        text = " ".join(f"[l{i}](/p/{i})" for i in range(2000))
+        nodes = text_to_textnodes(text)
+        self.assertEqual(len(nodes), 3999)
+        self.assertEqual(nodes[-1], TextNode("l1999", TextType.LINK, "/p/1999"))
+
+    def test_matches_split_pipeline(self):
+        text = "x **b** y _i_ z `c` ![img](/a.png) and [link](/b) end"
+        nodes = [TextNode(text, TextType.TEXT)]
+        nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+        nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+        nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+        nodes = split_nodes_image(nodes)
+        nodes = split_nodes_link(nodes)
+        self.assertListEqual(text_to_textnodes(text), nodes)
+
+class TestInlineCache(unittest.TestCase):
+    def test_hits_and_misses(self):
+        cache = InlineCache(maxsize=2)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "<b>a</b>")
+        self.assertEqual(cache.get("a"), "<b>a</b>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = InlineCache(maxsize=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("a")
+        cache.put("c", "C")
+        self.assertEqual(cache.get("b"), None)
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(len(cache), 2)
+
+    def test_long_texts_and_disabled_cache_are_not_cacheable(self):
+        self.assertFalse(InlineCache(max_text_length=3).cacheable("abcd"))
+        self.assertFalse(InlineCache(maxsize=0).cacheable("a"))
+
+    def test_resize_shrinks(self):
+        cache = InlineCache(maxsize=3)
+        for key in "abc":
+            cache.put(key, key)
+        cache.resize(1)
+        self.assertEqual(cache.stats()["size"], 1)
+        self.assertEqual(cache.get("c"), "c")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,76 @@
+import io
+import os
+import tracemalloc
+import unittest
+
+from gencontent import generate_pages_recursive
+from instrument import PAGE_STAGES, BuildReport, NullTimer, Progress, StageTimer
+from test_support import TempDirMixin
+
+
+class TestStageTimer(unittest.TestCase):
+    def tearDown(self):
+        # Tracing left on would slow every test that runs after these.
+        tracemalloc.stop()
+
+    def test_records_wall_cpu_and_peak(self):
+        timer = StageTimer()
+        with timer.stage("alloc"):
+            data = [0] * 100000
+        del data
+        stats = timer.stages["alloc"]
+        self.assertGreaterEqual(stats["wall"], 0)
+        self.assertGreaterEqual(stats["cpu"], 0)
+        self.assertGreater(stats["peak"], 100000)
+
+    def test_stops_only_tracing_it_started(self):
+        with StageTimer():
+            self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(tracemalloc.is_tracing())
+
+        tracemalloc.start()
+        StageTimer().close()
+        self.assertTrue(tracemalloc.is_tracing())
+
+    def test_null_timer(self):
+        timer = NullTimer()
+        self.assertFalse(timer.enabled)
+        with timer.stage("anything"):
+            pass
+
+
+class TestProgress(unittest.TestCase):
+    def test_rate_limited(self):
+        out = io.StringIO()
+        progress = Progress(1000, interval=3600, stream=out)
+        for _ in range(1000):
+            progress.update()
+        progress.finish()
+        # The first update and the final one are drawn, nothing in between.
+        self.assertEqual(out.getvalue(), "\r1/1000 pages, 0 failed\r1000/1000 pages, 0 failed\n")
+
+
+class TestBuildReport(TempDirMixin, unittest.TestCase):
+    def tearDown(self):
+        tracemalloc.stop()
+        super().tearDown()
+
+    def test_report_covers_every_page_and_stage(self):
+        content = os.path.join(self.root, "content")
+        for name, body in (("a", "# A\n\nshort"), ("b", "# B\n\n" + "long text " * 5000)):
+            self.write(os.path.join(content, name, "index.md"), body)
+        template = self.write("template.html", "{{ Title }}{{ Content }}")
+
+        report = BuildReport(top=1)
+        generate_pages_recursive(content, template, os.path.join(self.root, "docs"), "/", report=report)
+        summary = report.write(os.path.join(self.root, "report.json"))
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertEqual(summary["pages"], 2)
+        self.assertEqual(sorted(summary["page_stages"]), sorted(PAGE_STAGES))
+        self.assertEqual(len(summary["slowest_pages"]), 1)
+        self.assertTrue(summary["slowest_pages"][0]["source"].endswith(os.path.join("b", "index.md")))
+
+
+if __name__ == "__main__":
+    unittest.main()
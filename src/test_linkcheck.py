@@ -0,0 +1,126 @@
+import os
+import unittest
+
+from gencontent import PageOptions, generate_pages_recursive, write_page
+from linkcheck import PageLinks, check_links, local_path
+from manifest import BuildManifest
+from markdown_blocks import inline_cache, markdown_to_html_node
+from parsecache import ParseCache
+from test_support import TempDirMixin
+from urls import AssetMap
+
+
+class TestPageLinks(unittest.TestCase):
+    def setUp(self):
+        inline_cache.clear()
+
+    def collect(self, markdown):
+        links = PageLinks()
+        markdown_to_html_node(markdown, page_links=links)
+        return links.links
+
+    def test_collects_links_and_images_with_lines(self):
+        markdown = "# Title\n\nfirst line\nsee [docs](/docs/)\n\n- a\n- ![logo](/logo.png)"
+        self.assertEqual(
+            self.collect(markdown),
+            [[4, "link", "/docs/"], [7, "image", "/logo.png"]],
+        )
+
+    def test_links_nested_in_emphasis(self):
+        self.assertEqual(self.collect("**bold [x](/x)**"), [[1, "link", "/x"]])
+
+    def test_cached_fragments_still_collect_links(self):
+        self.collect("- [home](/)")
+        self.assertEqual(self.collect("\n\n- [home](/)"), [[3, "link", "/"]])
+
+
+class TestLocalPath(unittest.TestCase):
+    def test_absolute(self):
+        self.assertEqual(local_path("/", "blog"), "index.html")
+        self.assertEqual(local_path("/blog/tom/", ""), "blog/tom/index.html")
+        self.assertEqual(local_path("/images/a.png?v=1#top", ""), "images/a.png")
+        self.assertEqual(local_path("/a%20b.html", ""), "a b.html")
+
+    def test_relative(self):
+        self.assertEqual(local_path("a.html", "blog/tom"), "blog/tom/a.html")
+        self.assertEqual(local_path("../majesty/", "blog/tom"), "blog/majesty/index.html")
+
+    def test_external_and_anchors_are_skipped(self):
+        for url in ("https://example.com/", "//cdn.example.com/a.js", "mailto:me@example.com", "#top"):
+            self.assertIsNone(local_path(url, ""))
+
+
+class TestCheckLinks(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        self.static = os.path.join(self.root, "static")
+        os.makedirs(os.path.join(self.content, "blog"))
+        os.makedirs(self.static)
+        self.template = self.write("template.html", "{{ Content }}")
+        self.write("static/logo.png", "png")
+        self.assets = AssetMap({"/logo.png": "/logo.123.png"})
+
+    def build(self, manifest, options=None):
+        manifest.record_asset(os.path.join(self.public, "logo.123.png"), os.path.join(self.static, "logo.png"))
+        generate_pages_recursive(
+            self.content,
+            self.template,
+            self.public,
+            "/",
+            manifest,
+            options=options or PageOptions(assets=self.assets, check_links=True, site_dir=self.public),
+        )
+        return check_links(manifest, self.public, self.assets)
+
+    def test_reports_unresolved_targets(self):
+        self.write("content/index.md", "# Home\n\n[post](/blog/post/) ![logo](/logo.png)\n\n[gone](/gone.html)")
+        post = self.write("content/blog/post.md", "# Post\n\n[home](../../index.html) [out](https://example.com)\n\n![x](x.png)")
+        os.makedirs(os.path.join(self.content, "blog", "post"))
+        os.rename(post, os.path.join(self.content, "blog", "post", "index.md"))
+
+        broken = self.build(BuildManifest())
+        self.assertEqual(
+            broken,
+            [
+                (os.path.join(self.content, "blog", "post", "index.md"), 5, "image", "x.png"),
+                (os.path.join(self.content, "index.md"), 5, "link", "/gone.html"),
+            ],
+        )
+
+    def test_static_files_are_checked_under_their_served_names(self):
+        self.write("content/blog/post.md", "# Post\n\n![a](../logo.png) ![b](/logo.png)")
+        manifest = BuildManifest()
+        self.assertEqual(self.build(manifest), [])
+        # Only the fingerprinted copy is served, so without the rename the
+        # links point at nothing.
+        broken = check_links(manifest, self.public)
+        self.assertEqual([url for _, _, _, url in broken], ["../logo.png", "/logo.png"])
+
+    def test_links_are_collected_for_current_pages(self):
+        self.write("content/index.md", "# Home\n\n[gone](/gone.html)")
+        manifest = BuildManifest()
+        self.build(manifest, PageOptions())
+        self.assertEqual(manifest.links, {})
+        # Enabling the check re-renders pages whose links are unknown.
+        self.assertEqual(len(self.build(manifest)), 1)
+
+    def test_removing_a_page_breaks_links_to_it(self):
+        self.write("content/index.md", "# Home\n\n[post](/blog/post.html)")
+        self.write("content/blog/post.md", "# Post")
+        manifest = BuildManifest()
+        self.assertEqual(self.build(manifest), [])
+
+        os.remove(os.path.join(self.content, "blog", "post.md"))
+        self.assertEqual(len(self.build(manifest)), 1)
+
+    def test_parse_cache_keeps_links(self):
+        cache = ParseCache(os.path.join(self.root, "cache"), version="v1")
+        source = self.write("content/index.md", "# Home\n\n[a](/a.html)")
+        dest = os.path.join(self.root, "index.html")
+        options = PageOptions(parse_cache=cache, check_links=True)
+        _, info = write_page(source, self.template, dest, "/", options=options)
+        _, cached = write_page(source, self.template, dest, "/", options=options)
+        self.assertEqual(info, {"links": [[3, "link", "/a.html"]]})
+        self.assertEqual(cached, info)
@@ -0,0 +1,178 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+from manifest import BuildManifest, hash_bytes, replace_if_changed
+from gencontent import PageOptions, generate_pages_recursive
+from urls import AssetMap
+from test_support import TempDirMixin
+
+
+class TestBuildManifest(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+        self.manifest_path = os.path.join(self.root, ".build", "manifest.json")
+
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nhello")
+        self.write(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nbody")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+
+    def build(self, options=None):
+        manifest = BuildManifest.load(self.manifest_path)
+        generate_pages_recursive(self.content, self.template, self.public, "/", manifest, options=options)
+        manifest.save()
+        return manifest
+
+    def test_file_hash_matches_contents(self):
+        manifest = BuildManifest()
+        path = os.path.join(self.content, "index.md")
+        self.assertEqual(manifest.file_hash(path), hash_bytes(b"# Home\n\nhello"))
+
+    def test_load_missing_manifest_is_empty(self):
+        manifest = BuildManifest.load(os.path.join(self.root, "missing.json"))
+        self.assertEqual(manifest.pages, {})
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        index = os.path.join(self.public, "index.html")
+        os.utime(index, ns=(0, 0))
+
+        self.build()
+        self.assertEqual(os.stat(index).st_mtime_ns, 0)
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        post = os.path.join(self.public, "blog", "post", "index.html")
+        os.utime(post, ns=(0, 0))
+
+        self.write(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nedited")
+        self.build()
+        with open(post) as f:
+            self.assertIn("edited", f.read())
+
+    def test_template_change_rebuilds_all(self):
+        self.build()
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.build()
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertTrue(f.read().startswith("<h1>Home</h1>"))
+
+    def test_deleted_source_removes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        manifest = self.build()
+
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog")))
+        self.assertEqual(list(manifest.pages), [os.path.join(self.public, "index.html")])
+
+    def test_partial_change_rebuilds_only_dependent_pages(self):
+        self.write(os.path.join(self.content, "blog", "layout.html"), '{% include "sidebar.html" %}{{ Content }}')
+        self.write(os.path.join(self.content, "blog", "sidebar.html"), "<aside>v1</aside>")
+        manifest = self.build()
+
+        sidebar = os.path.join(self.content, "blog", "sidebar.html")
+        post = os.path.join(self.public, "blog", "post", "index.html")
+        self.assertEqual(manifest.dependents(os.path.abspath(sidebar)), [post])
+
+        index = os.path.join(self.public, "index.html")
+        os.utime(index, ns=(0, 0))
+        self.write(sidebar, "<aside>second</aside>")
+        self.build()
+
+        self.assertEqual(os.stat(index).st_mtime_ns, 0)
+        with open(post) as f:
+            self.assertTrue(f.read().startswith("<aside>second</aside>"))
+
+    def test_asset_map_change_rebuilds_pages(self):
+        self.write(self.template, '<link href="/index.css">{{ Content }}')
+        self.build(PageOptions(assets=AssetMap({"/index.css": "/index.aaaaaaaaaa.css"})))
+        self.build(PageOptions(assets=AssetMap({"/index.css": "/index.bbbbbbbbbb.css"})))
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertTrue(f.read().startswith('<link href="/index.bbbbbbbbbb.css">'))
+
+    def test_asset_change_rebuilds_only_pages_using_it(self):
+        self.write(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\n![logo](/logo.png)")
+        self.write(self.template, '<link rel="stylesheet" href="/index.css">{{ Content }}')
+        assets = {"/logo.png": "/logo.aaaaaaaaaa.png"}
+        styles = {"/index.css": "p{color:red}"}
+        self.build(PageOptions(assets=AssetMap(assets, styles=styles)))
+        index = os.path.join(self.public, "index.html")
+        post = os.path.join(self.public, "blog", "post", "index.html")
+        os.utime(index, ns=(0, 0))
+        os.utime(post, ns=(0, 0))
+
+        assets["/logo.png"] = "/logo.bbbbbbbbbb.png"
+        assets["/unused.css"] = "/unused.aaaaaaaaaa.css"
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.build(PageOptions(assets=AssetMap(assets, styles=styles)))
+        self.assertIn("1 pages generated, 1 up to date", out.getvalue())
+        self.assertEqual(os.stat(index).st_mtime_ns, 0)
+        with open(post) as f:
+            self.assertIn('src="/logo.bbbbbbbbbb.png"', f.read())
+
+        # An inlined stylesheet is an asset of every page whose template has it.
+        styles["/index.css"] = "p{color:blue}"
+        self.build(PageOptions(assets=AssetMap(assets, styles=styles)))
+        with open(index) as f:
+            self.assertTrue(f.read().startswith("<style>p{color:blue}</style>"))
+
+    def test_identical_output_is_not_rewritten(self):
+        self.build()
+        index = os.path.join(self.public, "index.html")
+        os.utime(index, ns=(0, 0))
+
+        # Dirty by hash, but renders to the same bytes.
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nhello\n")
+        self.build()
+        self.assertEqual(os.stat(index).st_mtime_ns, 0)
+        self.assertFalse(os.path.exists(index + ".tmp"))
+
+    def test_replace_if_changed(self):
+        dest = os.path.join(self.root, "out.html")
+        self.write(dest + ".tmp", "one")
+        self.assertEqual(replace_if_changed(dest + ".tmp", dest), hash_bytes(b"one"))
+        os.utime(dest, ns=(0, 0))
+
+        self.write(dest + ".tmp", "one")
+        replace_if_changed(dest + ".tmp", dest)
+        self.assertEqual(os.stat(dest).st_mtime_ns, 0)
+
+        self.write(dest + ".tmp", "two")
+        replace_if_changed(dest + ".tmp", dest)
+        self.assertFalse(os.path.exists(dest + ".tmp"))
+        with open(dest) as f:
+            self.assertEqual(f.read(), "two")
+
+    def test_delta_lists_added_changed_and_removed_outputs(self):
+        manifest = self.build()
+        self.assertEqual(
+            sorted(manifest.delta(self.public)["added"]),
+            ["blog/post/index.html", "index.html"],
+        )
+
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nedited")
+        self.write(os.path.join(self.content, "about.md"), "# About")
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        manifest = self.build()
+
+        delta = manifest.delta(self.public)
+        with open(os.path.join(self.public, "index.html"), "rb") as f:
+            self.assertEqual(delta["changed"], {"index.html": hash_bytes(f.read())})
+        self.assertEqual(list(delta["added"]), ["about.html"])
+        self.assertEqual(delta["removed"], ["blog/post/index.html"])
+
+    def test_unchanged_build_has_empty_delta(self):
+        self.build()
+        path = os.path.join(self.root, ".build", "deploy.json")
+        delta = self.build().write_delta(path)
+        self.assertEqual(delta, {"added": {}, "changed": {}, "removed": []})
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
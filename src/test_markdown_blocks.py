@@ -1,5 +1,20 @@
+import io
+import mmap
+import tempfile
 import unittest
-from markdown_blocks import markdown_to_blocks, block_to_block_type, BlockType, markdown_to_html_node
+from markdown_blocks import (
+    Block,
+    markdown_to_blocks,
+    block_to_block_type,
+    BlockType,
+    markdown_to_html_node,
+    scan_blocks,
+    write_markdown_html,
+    configure_inline_cache,
+    inline_cache,
+    text_to_children,
+)
+from urls import SiteUrls
 
 class TestMarkdownToHTML(unittest.TestCase):
     def test_markdown_to_blocks(self):
@@ -221,6 +236,110 @@ More text
             "</div>",
         )
 
+class TestScanBlocks(unittest.TestCase):
+    def test_blocks_have_types_and_line_numbers(self):
+        md = "# Title\n\nsome text\nmore\n\n\n- a\n- b\n"
+        self.assertEqual(
+            list(scan_blocks(md)),
+            [
+                Block(BlockType.HEADING, ["# Title"], 1),
+                Block(BlockType.PARAGRAPH, ["some text", "more"], 3),
+                Block(BlockType.ULIST, ["- a", "- b"], 7),
+            ],
+        )
+
+    def test_whitespace_only_lines_are_trimmed(self):
+        md = "   \n  para  \n   \n\nnext"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(blocks[0], Block(BlockType.PARAGRAPH, ["para"], 2))
+        self.assertEqual(blocks[1].line_number, 5)
+
+    def test_code_fence_keeps_blank_lines(self):
+        md = "intro\n\n```\nfirst\n\nsecond\n```\n\nafter"
+        node = markdown_to_html_node(md)
+        self.assertEqual(
+            node.to_html(),
+            "<div><p>intro</p><pre><code>first\n\nsecond\n</code></pre><p>after</p></div>",
+        )
+
+    def test_unclosed_fence_splits_like_text(self):
+        md = "intro\n\n```\ncode\n\n# Heading\n\n- a\n- b"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(
+            [(block.line_number, block.lines) for block in blocks],
+            [(1, ["intro"]), (3, ["```", "code"]), (6, ["# Heading"]), (8, ["- a", "- b"])],
+        )
+        self.assertEqual(blocks[2].block_type, BlockType.HEADING)
+
+    def test_reads_file_objects(self):
+        md = "# Title\n\n> quote\n"
+        self.assertEqual(
+            markdown_to_html_node(io.StringIO(md)).to_html(),
+            markdown_to_html_node(md).to_html(),
+        )
+
+    def test_reads_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write("# Tïtle\n\n1. one\n2. two\n".encode("utf-8"))
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                html = markdown_to_html_node(mm).to_html()
+        self.assertEqual(html, "<div><h1>Tïtle</h1><ol><li>one</li><li>two</li></ol></div>")
+
+    def test_write_markdown_html_matches_node_tree(self):
+        md = "# Title\n\nsome *text* and [a link](/x)\n\n```\ncode\n\nmore\n```\n\n- a\n- b\n"
+        out = io.StringIO()
+        write_markdown_html(io.StringIO(md), out, SiteUrls("/site"))
+        self.assertEqual(out.getvalue(), markdown_to_html_node(md, SiteUrls("/site")).to_html())
+        with self.assertRaises(ValueError):
+            write_markdown_html("\n\n", io.StringIO())
+
+
+class TestInlineRenderCache(unittest.TestCase):
+    def setUp(self):
+        inline_cache.clear()
+
+    def tearDown(self):
+        configure_inline_cache(4096)
+        inline_cache.clear()
+
+    def test_repeated_fragment_hits_cache(self):
+        md = "- **same** item\n- **same** item\n- other"
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(
+            html,
+            "<div><ul><li><b>same</b> item</li><li><b>same</b> item</li><li>other</li></ul></div>",
+        )
+        self.assertEqual(inline_cache.hits, 1)
+
+    def test_basepath_skips_code_samples(self):
+        md = '[home](/)\n\n`<a href="/x">`\n\n```\n<img src="/y.png">\n```'
+        html = markdown_to_html_node(md, SiteUrls("/site/")).to_html()
+        self.assertIn('<a href="/site/">home</a>', html)
+        self.assertIn('<code><a href="/x"></code>', html)
+        self.assertIn('<img src="/y.png">', html)
+
+    def test_cached_fragment_is_a_single_raw_leaf(self):
+        text_to_children("a [link](/x)")
+        children = text_to_children("a [link](/x)")
+        self.assertEqual(len(children), 1)
+        self.assertEqual(children[0].to_html(), 'a <a href="/x">link</a>')
+
+    def test_cache_is_keyed_by_basepath(self):
+        self.assertEqual(
+            text_to_children("[a](/x)")[0].to_html(), '<a href="/x">a</a>'
+        )
+        self.assertEqual(
+            text_to_children("[a](/x)", SiteUrls("/site"))[0].to_html(), '<a href="/site/x">a</a>'
+        )
+
+    def test_disabled_cache_returns_inline_nodes(self):
+        configure_inline_cache(0)
+        children = text_to_children("a **b**")
+        self.assertEqual([child.tag for child in children], [None, "b"])
+        self.assertEqual(len(inline_cache), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from gencontent import PageOptions, generate_pages_recursive, write_page
+from memory import SOURCE_FACTOR, WORKER_BYTES, format_peak_rss, page_workers, peak_rss
+from parsecache import ParseCache
+from test_support import TempDirMixin
+
+MB = 1024 * 1024
+
+
+class TestPageWorkers(unittest.TestCase):
+    def test_serial_stays_serial(self):
+        self.assertEqual(page_workers(1, 10_000 * MB, 0), 1)
+
+    def test_workers_fit_the_ceiling(self):
+        rss = peak_rss()
+        own = rss[0] if rss is not None else 0
+        per_worker = WORKER_BYTES + SOURCE_FACTOR * MB
+        # Half a worker of slack for this process growing meanwhile.
+        ceiling = own + 3 * per_worker + per_worker // 2
+        self.assertEqual(page_workers(8, ceiling, MB), 3)
+        self.assertEqual(page_workers(2, ceiling, MB), 2)
+
+    def test_at_least_one(self):
+        self.assertEqual(page_workers(8, 1, 100 * MB), 1)
+
+    def test_report(self):
+        line = format_peak_rss(64 * MB)
+        if peak_rss() is not None:
+            self.assertTrue(line.startswith("Peak RSS: "))
+            self.assertIn("(ceiling 64 MB)", line)
+            self.assertIn("over the ceiling", format_peak_rss(1))
+
+
+class TestStreamedPages(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.write(
+            "index.md",
+            "Intro **text**\n\n# Streamed\n\n[a](/a.html) and ![b](/b.png)\n\n```\ncode\n\nblock\n```\n\n- one\n- two",
+        )
+        self.template = self.write("template.html", "<title>{{ Title }}</title>\n<main>\n  {{ Content }}\n</main>\n")
+
+    def render(self, name, template=None, **kwargs):
+        dest = os.path.join(self.root, "out", name)
+        _, info = write_page(self.source, template or self.template, dest, "/site", options=PageOptions(**kwargs))
+        with open(dest) as f:
+            return f.read(), info
+
+    def test_matches_default_pages(self):
+        for kwargs in ({}, {"minify_html": True}, {"search": True, "check_links": True}):
+            self.assertEqual(self.render("stream.html", stream=True, **kwargs), self.render("default.html", **kwargs))
+
+    def test_parse_cache_miss_and_hit(self):
+        cache = ParseCache(os.path.join(self.root, "cache"), version="v1")
+        kwargs = {"parse_cache": cache, "search": True, "check_links": True}
+        expected = self.render("default.html", search=True, check_links=True)
+        self.assertEqual(self.render("miss.html", stream=True, **kwargs), expected)
+        self.assertEqual(self.render("hit.html", stream=True, **kwargs), expected)
+        # Entries and their data are shared with non-streamed builds.
+        self.assertEqual(self.render("default-hit.html", **kwargs), expected)
+        self.assertEqual(len(os.listdir(os.path.join(cache.dir_path, os.listdir(cache.dir_path)[0]))), 3)
+
+    def test_content_slot_twice_or_not_at_all(self):
+        twice = self.write("twice.html", "{{ Content }}|{{ Content }}")
+        untitled = self.write("untitled.html", "{{ Title }}")
+        for template in (twice, untitled):
+            self.assertEqual(
+                self.render("stream.html", template, stream=True, search=True),
+                self.render("default.html", template, search=True),
+            )
+
+    def test_missing_title_leaves_no_output(self):
+        self.write("content/broken.md", "no title")
+        self.write("content/ok.md", "# Ok")
+        dest = os.path.join(self.root, "public")
+        failures = generate_pages_recursive(
+            os.path.join(self.root, "content"), self.template, dest, "/", options=PageOptions(stream=True)
+        )
+        self.assertEqual([error for _, _, error in failures], ["Exception: no h1 header found"])
+        self.assertEqual(os.listdir(dest), ["ok.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
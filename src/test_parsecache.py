@@ -0,0 +1,159 @@
+import os
+import shutil
+import unittest
+from unittest import mock
+
+from gencontent import PageOptions, write_page
+from instrument import StageTimer
+from manifest import src_dir
+from parsecache import PARSER_MODULES, ParseCache, parser_version
+from test_support import TempDirMixin
+from urls import AssetMap, SiteUrls
+
+
+class TestParseCache(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache = ParseCache(os.path.join(self.root, "cache"), version="v1")
+
+    def test_round_trip(self):
+        key = self.cache.key("# T")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, "T", "<div><h1>T</h1></div>")
+        self.assertEqual(self.cache.get(key), ("T", "<div><h1>T</h1></div>"))
+
+    def test_key_depends_on_source_and_version(self):
+        other = ParseCache(self.cache.dir_path, version="v2")
+        self.assertNotEqual(self.cache.key("a"), self.cache.key("b"))
+        self.assertNotEqual(self.cache.key("a"), other.key("a"))
+
+    def test_key_depends_on_urls(self):
+        assets = AssetMap({"/a.css": "/a.0123456789.css"})
+        self.assertEqual(self.cache.key("a"), self.cache.key("a", SiteUrls("/")))
+        self.assertEqual(self.cache.key("a", SiteUrls("/site")), self.cache.key("a", SiteUrls("site/")))
+        self.assertNotEqual(self.cache.key("a"), self.cache.key("a", SiteUrls("/site")))
+        self.assertNotEqual(self.cache.key("a"), self.cache.key("a", SiteUrls("/", assets)))
+
+    def test_parser_version_is_stable(self):
+        self.assertEqual(parser_version(), parser_version())
+
+    def test_parser_version_covers_url_and_collector_modules(self):
+        src = os.path.join(self.root, "src")
+        os.makedirs(src)
+        for name in PARSER_MODULES:
+            shutil.copy(os.path.join(src_dir, name), src)
+        with mock.patch("parsecache.src_dir", src):
+            before = parser_version()
+            for name in ("urls.py", "search.py", "linkcheck.py"):
+                with open(os.path.join(src, name), "a") as f:
+                    f.write("\n")
+                after = parser_version()
+                self.assertNotEqual(after, before, name)
+                before = after
+
+    def test_evicts_oldest_beyond_max_bytes(self):
+        cache = ParseCache(self.cache.dir_path, max_bytes=150, version="v1")
+        keys = [cache.key(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, "t", "x" * 60)
+            path = cache._path(key)
+            os.utime(path, ns=(i, i))
+
+        self.assertEqual(cache.evict(), 1)
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertIsNotNone(cache.get(keys[2]))
+
+    def test_evicts_entries_with_their_side_files(self):
+        cache = ParseCache(self.cache.dir_path, max_bytes=150, version="v1")
+        keys = [cache.key(str(i)) for i in range(3)]
+        for i, key in enumerate(keys):
+            cache.put(key, "t", "x" * 60)
+            cache.put_meta(key, "terms", {"x": 1})
+            for path in (cache._path(key), cache._meta_path(key, "terms")):
+                os.utime(path, ns=(i, i))
+        # A hit on the oldest entry keeps its side files with it.
+        cache.get(keys[0])
+        orphan = cache._meta_path(cache.key("gone"), "links")
+        os.makedirs(os.path.dirname(orphan), exist_ok=True)
+        with open(orphan, "w") as f:
+            f.write("[]")
+
+        self.assertEqual(cache.evict(), 2)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertIsNone(cache.get(keys[1]))
+        self.assertIsNone(cache.get_meta(keys[1], "terms"))
+        for key in (keys[0], keys[2]):
+            self.assertEqual(cache.get_meta(key, "terms"), {"x": 1})
+
+    def test_clear(self):
+        self.cache.put(self.cache.key("a"), "t", "x")
+        self.cache.clear()
+        self.assertEqual(self.cache.size(), 0)
+
+    def test_write_page_fills_and_reuses_cache(self):
+        source = self.write("page.md", "# Title\n\n[home](/)")
+        template = self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        options = PageOptions(parse_cache=self.cache)
+
+        write_page(source, template, os.path.join(self.root, "a.html"), "/site", options=options)
+        key = self.cache.key("# Title\n\n[home](/)", SiteUrls("/site"))
+        self.assertEqual(
+            self.cache.get(key), ("Title", '<div><h1>Title</h1><p><a href="/site/">home</a></p></div>')
+        )
+
+        # Poison the entry: a second render must come from the cache.
+        self.cache.put(key, "Cached", "<p>cached</p>")
+        write_page(source, template, os.path.join(self.root, "b.html"), "/site", options=options)
+        self.assertEqual(self.read("b.html"), "<title>Cached</title><p>cached</p>")
+
+    def test_entries_follow_only_the_assets_they_use(self):
+        source = self.write("page.md", "# Title\n\n![logo](/logo.png)")
+        template = self.write("template.html", "{{ Content }}")
+        for stream in (False, True):
+            self.cache.clear()
+            assets = {"/logo.png": "/logo.aaaaaaaaaa.png"}
+
+            def render(name):
+                options = PageOptions(parse_cache=self.cache, assets=AssetMap(assets), stream=stream)
+                write_page(source, template, os.path.join(self.root, name), "/", options=options)
+                return self.read(name)
+
+            render("a.html")
+            key = self.cache.key("# Title\n\n![logo](/logo.png)", SiteUrls("/", AssetMap()))
+            self.cache.put(key, "Title", "<p>cached</p>")
+            assets["/other.css"] = "/other.aaaaaaaaaa.css"
+            self.assertEqual(render("b.html"), "<p>cached</p>")
+
+            assets["/logo.png"] = "/logo.bbbbbbbbbb.png"
+            self.assertIn('src="/logo.bbbbbbbbbb.png"', render("c.html"))
+
+    def test_relative_asset_references_follow_the_page(self):
+        source = self.write("page.md", "# Title\n\n![pic](../images/a.png)")
+        template = self.write("template.html", "{{ Content }}")
+        site = os.path.join(self.root, "site")
+        assets = AssetMap({"/images/a.png": "/images/a.0123456789.png"})
+        for stream in (False, True):
+            self.cache.clear()
+            options = PageOptions(parse_cache=self.cache, assets=assets, stream=stream, site_dir=site)
+            # Same source and cache, different directories: only the first
+            # reference reaches the renamed file.
+            for name, src in (("blog/a.html", "/images/a.0123456789.png"), ("blog/deep/a.html", "../images/a.png")):
+                for _ in range(2):
+                    write_page(source, template, os.path.join(site, name), "/", options=options)
+                    self.assertIn(f'src="{src}"', self.read(os.path.join("site", name)))
+
+    def test_instrumented_write_page_uses_cache(self):
+        source = self.write("page.md", "# Title")
+        template = self.write("template.html", "{{ Content }}")
+        options = PageOptions(parse_cache=self.cache)
+
+        write_page(source, template, os.path.join(self.root, "a.html"), "/", StageTimer(False), options)
+        timer = StageTimer(False)
+        write_page(source, template, os.path.join(self.root, "b.html"), "/", timer, options)
+
+        self.assertNotIn("parse", timer.stages)
+        self.assertEqual(self.read("a.html"), self.read("b.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
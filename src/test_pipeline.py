@@ -0,0 +1,86 @@
+import os
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from gencontent import PageOptions, generate_pages_recursive
+from pipeline import run_pipeline
+from test_support import TempDirMixin
+
+
+def _render(item, data):
+    if data == "bad":
+        raise ValueError(f"cannot render {item}")
+    return data.upper()
+
+
+class TestRunPipeline(unittest.TestCase):
+    def test_results_in_item_order(self):
+        items = [f"item{i}" for i in range(50)]
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = run_pipeline(items, lambda item: item, _render, lambda item, out: out + "!", executor, 2, 4)
+        self.assertEqual(results, [f"ITEM{i}!" for i in range(50)])
+
+    def test_failures_are_returned_per_item(self):
+        def read(item):
+            if item == "missing":
+                raise FileNotFoundError(item)
+            return item
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            results = run_pipeline(["a", "missing", "bad", "b"], read, _render, lambda item, out: out, executor)
+        self.assertEqual(results[0], "A")
+        self.assertIsInstance(results[1], FileNotFoundError)
+        self.assertIsInstance(results[2], ValueError)
+        self.assertEqual(results[3], "B")
+
+    def test_backpressure_bounds_items_in_flight(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def read(item):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight[1], in_flight[0])
+            return item
+
+        def write(item, out):
+            with lock:
+                in_flight[0] -= 1
+            return out
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            run_pipeline(list(range(200)), read, lambda item, data: data, write, executor, 1, 3)
+        # Per stage: the readers, a full queue, the renderer, a full queue
+        # and the writers.
+        self.assertLessEqual(in_flight[1], 3 + 3 + 1 + 3 + 3)
+
+
+class TestPipelineBuild(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        for i in range(20):
+            self.write(f"content/p{i}/index.md", f"# Page {i}\n\nSome **text** with a [link](/p{i + 1}/).\n\n- a\n- b")
+        self.write("content/broken.md", "no title")
+        self.template = self.write("template.html", "<title>{{ Title }}</title>\n<main>{{ Content }}</main>\n")
+
+    def build(self, name, **kwargs):
+        dest = os.path.join(self.root, name)
+        failures = generate_pages_recursive(
+            self.content, self.template, dest, "/site", options=PageOptions(minify_html=True), **kwargs
+        )
+        outputs = {}
+        for dirpath, _, names in os.walk(dest):
+            for file_name in names:
+                path = os.path.join(dirpath, file_name)
+                with open(path, "rb") as f:
+                    outputs[os.path.relpath(path, dest)] = f.read()
+        return [(os.path.basename(src), error) for src, _, error in failures], outputs
+
+    def test_matches_serial_build(self):
+        serial = self.build("serial")
+        self.assertEqual(len(serial[1]), 20)
+        self.assertEqual(serial[0], [("broken.md", "Exception: no h1 header found")])
+        self.assertEqual(self.build("pipelined", pipeline=4), serial)
+        self.assertEqual(self.build("parallel", jobs=2, pipeline=4), serial)
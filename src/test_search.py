@@ -0,0 +1,139 @@
+import json
+import os
+import unittest
+
+from gencontent import PageOptions, generate_pages_recursive, write_page
+from manifest import BuildManifest
+from markdown_blocks import inline_cache, markdown_to_html_node
+from parsecache import ParseCache
+from search import HEADING_WEIGHT, PageText, SearchIndex, tokenize
+from test_support import TempDirMixin
+
+
+class TestPageText(unittest.TestCase):
+    def setUp(self):
+        inline_cache.clear()
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Hello, World! a 42"), ["hello", "world", "42"])
+
+    def test_collects_plain_text_without_markup(self):
+        text = PageText()
+        markdown_to_html_node(
+            "# The **Title**\n\nSee [the docs](/docs) and `code`.\n\n- one _item_",
+            page_text=text,
+        )
+        self.assertEqual(text.headings, ["The Title"])
+        self.assertEqual(text.parts, ["See the docs and code.", "one item"])
+
+    def test_cached_fragments_still_collect_text(self):
+        markdown_to_html_node("Shared **line**")
+        text = PageText()
+        markdown_to_html_node("Shared **line**", page_text=text)
+        self.assertEqual(text.parts, ["Shared line"])
+
+    def test_headings_weigh_more(self):
+        text = PageText()
+        markdown_to_html_node("# Elves\n\nelves and men", page_text=text)
+        self.assertEqual(text.terms(), {"elves": HEADING_WEIGHT + 1, "and": 1, "men": 1})
+
+
+class TestSearchIndex(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.public = os.path.join(self.root, "public")
+        self.store = os.path.join(self.root, "build", "search.json")
+
+    def index(self):
+        return SearchIndex.load(self.store, self.public, "/site/")
+
+    def shard(self, name):
+        with open(os.path.join(self.public, "search-index", name + ".json")) as f:
+            return json.load(f)
+
+    def test_writes_sharded_postings_and_pages(self):
+        index = self.index()
+        index.update(os.path.join(self.public, "index.html"), "Home", {"elves": 2, "men": 1})
+        index.update(os.path.join(self.public, "blog", "a.html"), "A", {"elves": 1})
+        index.write()
+
+        self.assertEqual(self.shard("el"), {"elves": [0, 2, 1, 1]})
+        self.assertEqual(self.shard("me"), {"men": [0, 1]})
+        self.assertEqual(
+            self.shard("pages"),
+            {"prefix": 2, "pages": {"0": ["/site/", "Home"], "1": ["/site/blog/a.html", "A"]}},
+        )
+
+    def test_only_touched_shards_are_rewritten(self):
+        index = self.index()
+        page = os.path.join(self.public, "index.html")
+        index.update(page, "Home", {"elves": 1, "men": 1})
+        index.write()
+        index.save()
+
+        index = self.index()
+        index.update(page, "Home", {"elves": 1, "dwarves": 1})
+        manifest = BuildManifest()
+        self.assertEqual(index.write(manifest), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search-index", "me.json")))
+        self.assertEqual(self.shard("dw"), {"dwarves": [0, 1]})
+        self.assertEqual(
+            sorted(os.path.basename(path) for path in manifest.outputs), ["dw.json"]
+        )
+
+    def test_missing_shard_is_rebuilt_from_store(self):
+        index = self.index()
+        index.update(os.path.join(self.public, "a.html"), "A", {"elves": 1})
+        index.update(os.path.join(self.public, "b.html"), "B", {"elves": 2})
+        index.write()
+        os.remove(os.path.join(self.public, "search-index", "el.json"))
+
+        index.update(os.path.join(self.public, "b.html"), "B", {"elves": 3})
+        index.write()
+        self.assertEqual(self.shard("el"), {"elves": [0, 1, 1, 3]})
+
+    def test_remove_and_clear(self):
+        index = self.index()
+        index.update(os.path.join(self.public, "a.html"), "A", {"elves": 1})
+        index.write()
+        index.save()
+        index.remove(os.path.join(self.public, "a.html"))
+        index.write()
+        self.assertEqual(self.shard("pages")["pages"], {})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search-index", "el.json")))
+
+        index.clear()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "search-index")))
+        self.assertFalse(os.path.exists(self.store))
+
+    def test_build_indexes_new_and_changed_pages(self):
+        content = os.path.join(self.root, "content")
+        template = self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.write("content/index.md", "# Home\n\nwelcome elves")
+
+        manifest = BuildManifest()
+        options = PageOptions(search=True)
+        index = self.index()
+        generate_pages_recursive(content, template, self.public, "/", manifest, options=options, search=index)
+        index.write(manifest)
+        self.assertEqual(self.shard("el"), {"elves": [0, 1]})
+
+        # A page the index has not seen is rebuilt even if it is current.
+        index = SearchIndex(self.store, self.public, "/")
+        generate_pages_recursive(content, template, self.public, "/", manifest, options=options, search=index)
+        self.assertTrue(index.has(os.path.join(self.public, "index.html")))
+
+    def test_parse_cache_keeps_terms(self):
+        cache = ParseCache(os.path.join(self.root, "cache"), version="v1")
+        source = self.write("a.md", "# Title\n\nelves")
+        template = self.write("template.html", "{{ Content }}")
+
+        options = PageOptions(parse_cache=cache)
+        write_page(source, template, os.path.join(self.root, "a.html"), "/", options=options)
+        # Cached without terms: a search build parses again and stores them.
+        options = PageOptions(parse_cache=cache, search=True)
+        _, info = write_page(source, template, os.path.join(self.root, "a.html"), "/", options=options)
+        self.assertEqual(info, {"title": "Title", "terms": {"title": HEADING_WEIGHT, "elves": 1}})
+        with open(source) as f:
+            key = cache.key(f.read())
+        self.assertEqual(cache.get_meta(key, "terms"), info["terms"])
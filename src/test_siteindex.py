@@ -0,0 +1,92 @@
+import os
+import unittest
+
+from copystatic import sync_files
+from manifest import BuildManifest
+from siteindex import SiteIndex, ignore_matcher, walk_files
+from test_support import TempDirMixin
+
+
+class TestSiteIndex(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.public = os.path.join(self.root, "public")
+        for name in (
+            "content/index.md",
+            "content/notes.txt",
+            "content/blog/layout.html",
+            "content/blog/a.md",
+            "content/blog/deep/b.md",
+            "content/blog/.a.md.swp",
+            "content/z.md",
+            "static/index.css",
+            "static/images/logo.png",
+            "static/images/logo.png~",
+        ):
+            self.write(name, name)
+
+    def test_walk_is_depth_first_in_name_order(self):
+        rels = [rel for _, rel in walk_files(self.content, ignore=())]
+        self.assertEqual(
+            rels,
+            [
+                "blog/.a.md.swp",
+                "blog/a.md",
+                "blog/deep/b.md",
+                "blog/layout.html",
+                "index.md",
+                "notes.txt",
+                "z.md",
+            ],
+        )
+
+    def test_ignore_patterns(self):
+        ignored = ignore_matcher(("*~", "drafts"))
+        self.assertTrue(ignored("logo.png~"))
+        self.assertTrue(ignored("drafts"))
+        self.assertFalse(ignored("index.md"))
+
+        os.makedirs(os.path.join(self.content, "drafts"))
+        self.write("content/drafts/c.md", "# C")
+        index = SiteIndex.scan(self.content, self.public, self.static, ignore=("*~", "*.swp", "drafts"))
+        self.assertEqual([f.rel for f in index.static], ["images/logo.png", "index.css"])
+        self.assertNotIn("drafts/c.md", [f.rel for f in index.content])
+
+    def test_entries(self):
+        index = SiteIndex.scan(self.content, self.public, self.static)
+        kinds = {f.rel: (f.kind, f.output) for f in index.content}
+        self.assertEqual(kinds["index.md"], ("page", os.path.join(self.public, "index.html")))
+        self.assertEqual(kinds["blog/layout.html"], ("layout", None))
+        self.assertEqual(kinds["notes.txt"], ("file", None))
+        logo = index.static[0]
+        self.assertEqual(logo.output, os.path.join(self.public, "images", "logo.png"))
+        self.assertEqual(logo.size, len("static/images/logo.png"))
+        self.assertEqual(logo.mtime_ns, os.stat(logo.path).st_mtime_ns)
+
+    def test_pages_use_nearest_layout(self):
+        template = os.path.join(self.root, "template.html")
+        layout = os.path.join(self.content, "blog", "layout.html")
+        pages = SiteIndex.scan(self.content, self.public).pages(template)
+        self.assertEqual(
+            [(os.path.relpath(src, self.content), tpl) for src, tpl, _ in pages],
+            [
+                ("blog/a.md", layout),
+                ("blog/deep/b.md", layout),
+                ("index.md", template),
+                ("z.md", template),
+            ],
+        )
+
+    def test_stats_are_reused(self):
+        index = SiteIndex.scan(self.content, self.public, self.static)
+        manifest = BuildManifest()
+        sync_files(self.static, self.public, manifest, files=index.static)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.public, "images"))), ["logo.png"])
+
+        path = os.path.join(self.static, "index.css")
+        self.assertIs(index.stat(path), index.static[1].stat)
+        template = self.write("template.html", "")
+        self.assertIs(index.stat(template), index.stat(template))
+        self.assertEqual(manifest.files[path][:2], [index.stat(path).st_size, index.stat(path).st_mtime_ns])
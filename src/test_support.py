@@ -0,0 +1,28 @@
+import os
+import tempfile
+
+
+class TempDirMixin:
+    # setUp gives each test a fresh directory at self.root, removed again
+    # in tearDown. write() and read() take names relative to it (an
+    # absolute path is used as is); write() creates parent directories and
+    # writes bytes or text.
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+        super().tearDown()
+
+    def write(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.root, name)) as f:
+            return f.read()
@@ -0,0 +1,92 @@
+import io
+import os
+import unittest
+
+from template import Template, compile_template, load_template
+from test_support import TempDirMixin
+from urls import AssetMap, SiteUrls
+
+
+class TestTemplate(TempDirMixin, unittest.TestCase):
+    def test_render_fills_slots(self):
+        path = self.write("t.html", "<title>{{ Title }}</title><main>{{ Content }}</main>")
+        template = compile_template(path)
+        self.assertEqual(
+            template.render(Title="Hi", Content="<p>x</p>"),
+            "<title>Hi</title><main><p>x</p></main>",
+        )
+
+    def test_compiled_form_is_chunks_and_slots(self):
+        path = self.write("t.html", "a{{ Title }}b{{Content}}c")
+        template = compile_template(path)
+        self.assertEqual(template.chunks, ["a", None, "b", None, "c"])
+        self.assertEqual([name for _, name, _ in template.slots], ["Title", "Content"])
+
+    def test_unknown_slot_is_left_verbatim(self):
+        path = self.write("t.html", "{{ Title }} {{ Author }}")
+        self.assertEqual(compile_template(path).render(Title="T"), "T {{ Author }}")
+
+    def test_basepath_applied_to_static_chunks(self):
+        path = self.write("t.html", '<link href="/index.css"><img src="/a.png">{{ Content }}')
+        template = compile_template(path, SiteUrls("/site/"))
+        self.assertEqual(
+            template.render(Content='<a href="/x">'),
+            '<link href="/site/index.css"><img src="/site/a.png"><a href="/x">',
+        )
+
+    def test_include_partials(self):
+        self.write("partials/nav.html", "<nav>{% include \"links.html\" %}</nav>")
+        self.write("partials/links.html", "<a>{{ Title }}</a>")
+        path = self.write("t.html", "{% include \"partials/nav.html\" %}{{ Content }}")
+
+        template = compile_template(path)
+        self.assertEqual(template.render(Title="T", Content="C"), "<nav><a>T</a></nav>C")
+        self.assertEqual(
+            [os.path.relpath(dep, self.root) for dep in template.dependencies],
+            ["t.html", os.path.join("partials", "nav.html"), os.path.join("partials", "links.html")],
+        )
+
+    def test_include_cycle_raises(self):
+        self.write("a.html", '{% include "b.html" %}')
+        self.write("b.html", '{% include "a.html" %}')
+        with self.assertRaises(ValueError):
+            compile_template(os.path.join(self.root, "a.html"))
+
+    def test_load_template_recompiles_on_change(self):
+        path = self.write("t.html", "one {{ Title }}")
+        first = load_template(path)
+        self.assertIs(load_template(path), first)
+
+        self.write("t.html", "two {{ Title }}")
+        os.utime(path, ns=(1, 1))
+        self.assertEqual(load_template(path).render(Title="T"), "two T")
+
+    def test_write_streams_strings_and_callables(self):
+        path = self.write("t.html", "<title>{{ Title }}</title>{{ Content }}<footer>")
+        out = io.StringIO()
+        compile_template(path).write(out, Title="T", Content=lambda o: o.write("<p>body</p>"))
+        self.assertEqual(out.getvalue(), "<title>T</title><p>body</p><footer>")
+
+    def test_basepath_prefixes_static_markup_at_compile_time(self):
+        path = self.write("t.html", '<img src="/a.png"><a href="//cdn/x">{{ Content }}')
+        template = compile_template(path, SiteUrls("/site/"))
+        self.assertEqual(
+            template.render(Content='<a href="/raw">'),
+            '<img src="/site/a.png"><a href="//cdn/x"><a href="/raw">',
+        )
+
+    def test_fingerprinted_assets_in_static_markup(self):
+        path = self.write("t.html", '<link href="/index.css">{{ Content }}')
+        assets = AssetMap({"/index.css": "/index.0123456789.css"})
+        self.assertEqual(
+            load_template(path, SiteUrls("/", assets)).render(Content=""),
+            '<link href="/index.0123456789.css">',
+        )
+        self.assertEqual(load_template(path).render(Content=""), '<link href="/index.css">')
+
+    def test_repr_runs(self):
+        repr(Template("t.html", [None], [(0, "Title", "{{ Title }}")], []))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
 
 from textnode import TextNode, TextType, text_node_to_html_node
+from urls import AssetMap, SiteUrls
 
 
 class TestTextNode(unittest.TestCase):
@@ -70,5 +71,37 @@ class TestTextNode(unittest.TestCase):
             {"src": "https://example.com/image.png", "alt": "alt text here"},
         )
 
+    def test_basepath_prefixes_site_relative_urls(self):
+        link = TextNode("home", TextType.LINK, "/blog/")
+        image = TextNode("logo", TextType.IMAGE, "/images/logo.png")
+        self.assertEqual(
+            text_node_to_html_node(link, SiteUrls("/site")).to_html(), '<a href="/site/blog/">home</a>'
+        )
+        self.assertEqual(
+            text_node_to_html_node(image, SiteUrls("/site")).to_html(),
+            '<img src="/site/images/logo.png" alt="logo"></img>',
+        )
+
+    def test_image_uses_fingerprinted_name(self):
+        urls = SiteUrls("/", AssetMap({"/images/logo.png": "/images/logo.0123456789.png"}))
+        image = TextNode("logo", TextType.IMAGE, "/images/logo.png")
+        self.assertEqual(text_node_to_html_node(image, urls).props["src"], "/images/logo.0123456789.png")
+
+    def test_nested_bold_converts_to_parent(self):
+        node = TextNode(
+            "bold italic",
+            TextType.BOLD,
+            children=[TextNode("bold ", TextType.TEXT), TextNode("italic", TextType.ITALIC)],
+        )
+        self.assertEqual(text_node_to_html_node(node).to_html(), "<b>bold <i>italic</i></b>")
+
+    def test_not_equal_different_children(self):
+        node = TextNode("ab", TextType.BOLD, children=[TextNode("ab", TextType.TEXT)])
+        node2 = TextNode("ab", TextType.BOLD)
+        self.assertNotEqual(node, node2)
+
+    def test_has_no_instance_dict(self):
+        self.assertFalse(hasattr(TextNode("x", TextType.TEXT), "__dict__"))
+
 if __name__ == "__main__":
     unittest.main()
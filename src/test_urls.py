@@ -0,0 +1,86 @@
+import os
+import unittest
+
+from test_support import TempDirMixin
+from urls import AssetMap, SiteUrls, fingerprint_name, normalize_basepath
+
+
+class TestSiteUrls(unittest.TestCase):
+    def test_normalize_basepath(self):
+        self.assertEqual(normalize_basepath("/"), "")
+        self.assertEqual(normalize_basepath("site/"), "/site")
+
+    def test_resolve_prefixes_basepath(self):
+        urls = SiteUrls("/site/")
+        self.assertEqual(urls.resolve("/blog/"), "/site/blog/")
+        for url in ("https://boot.dev", "//cdn.example.com/a.js", "page.html", "#top"):
+            self.assertEqual(urls.resolve(url), url)
+
+    def test_resolve_fingerprinted_asset_keeps_query_and_fragment(self):
+        urls = SiteUrls("/site", AssetMap({"/a.svg": "/a.0123456789.svg"}))
+        self.assertEqual(urls.resolve("/a.svg#icon"), "/site/a.0123456789.svg#icon")
+        self.assertEqual(urls.resolve("/a.svg?v=1"), "/site/a.0123456789.svg?v=1")
+        self.assertEqual(urls.resolve("/b.svg"), "/site/b.svg")
+
+    def test_resolve_relative_asset_against_page_dir(self):
+        assets = AssetMap({"/images/a.png": "/images/a.0123456789.png"}, sizes={"/images/a.png": [4, 2]})
+        urls = SiteUrls("/site", assets, page_dir="/blog/")
+        self.assertEqual(urls.resolve("../images/a.png#x"), "/site/images/a.0123456789.png#x")
+        self.assertEqual(urls.image_size("../images/a.png"), [4, 2])
+        # Relative links to anything not renamed are left as written.
+        for url in ("post.html", "../images/b.png", "#top", "mailto:me@example.com"):
+            self.assertEqual(urls.resolve(url), url)
+        self.assertEqual(urls.used, {"/images/a.png", "/blog/post.html", "/images/b.png"})
+        # Without the page's directory relative URLs can't be resolved.
+        self.assertEqual(SiteUrls("/site", assets).resolve("../images/a.png"), "../images/a.png")
+
+    def test_rewrite_root_is_noop(self):
+        html = '<a href="/x">'
+        self.assertIs(SiteUrls("/").rewrite(html), html)
+
+    def test_rewrite_attributes(self):
+        urls = SiteUrls("/site", AssetMap({"/index.css": "/index.0123456789.css"}))
+        self.assertEqual(
+            urls.rewrite('<link href="/index.css"><script src="//cdn/x.js">'),
+            '<link href="/site/index.0123456789.css"><script src="//cdn/x.js">',
+        )
+
+    def test_key_does_not_change_with_assets(self):
+        assets = AssetMap()
+        self.assertEqual(SiteUrls("/").key, "")
+        before = SiteUrls("/", assets).key
+        assets.add("/a.css", "/a.0123456789.css")
+        self.assertEqual(SiteUrls("/", assets).key, before)
+        self.assertNotEqual(SiteUrls("/").key, before)
+
+    def test_asset_states_of_used_paths(self):
+        assets = AssetMap({"/a.css": "/a.0123456789.css"}, sizes={"/b.png": [4, 2]})
+        urls = SiteUrls("/", assets)
+        urls.resolve("/a.css?v=1")
+        urls.image_size("/b.png")
+        urls.resolve("https://example.com/c.css")
+        self.assertEqual(urls.used, {"/a.css", "/b.png"})
+        states = urls.asset_states(urls.used)
+        self.assertEqual(states, {"/a.css": ["/a.0123456789.css", None, None], "/b.png": [None, [4, 2], None]})
+
+        # Only changes to the used assets invalidate what was rendered.
+        assets.add("/other.css", "/other.0123456789.css")
+        self.assertTrue(SiteUrls("/", assets).assets_match(states))
+        assets.add_size("/b.png", [8, 4])
+        later = SiteUrls("/", assets)
+        self.assertFalse(later.reuse(states))
+        self.assertEqual(later.used, set())
+
+
+class TestAssetMap(TempDirMixin, unittest.TestCase):
+    def test_fingerprint_name(self):
+        self.assertEqual(fingerprint_name("index.css", "3f9a1c0b2e77"), "index.3f9a1c0b2e.css")
+
+    def test_save(self):
+        path = os.path.join(self.root, "build", "asset-map.json")
+        AssetMap({"/a.css": "/a.0123456789.css"}).save(path)
+        self.assertIn('"/a.css": "/a.0123456789.css"', self.read(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
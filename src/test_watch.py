@@ -0,0 +1,195 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+from manifest import BuildManifest
+from gencontent import PageOptions, generate_pages_recursive
+from urls import AssetMap
+from copystatic import sync_files
+from watch import InotifyWatcher, PollingWatcher, SiteWatcher
+from test_support import TempDirMixin
+
+
+class TestSiteWatcher(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        self.public = os.path.join(self.root, "docs")
+        self.template = os.path.join(self.root, "template.html")
+
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(self.template, "{{ Title }}|{{ Content }}")
+
+        self.manifest = BuildManifest()
+        sync_files(self.static, self.public, self.manifest)
+        generate_pages_recursive(self.content, self.template, self.public, "/", self.manifest)
+        self.watcher = SiteWatcher(
+            self.content, self.template, self.public, self.static, "/", self.manifest
+        )
+
+    def test_edit_rebuilds_only_that_page(self):
+        home = os.path.join(self.public, "index.html")
+        os.utime(home, ns=(0, 0))
+
+        blog_md = os.path.join(self.content, "blog", "index.md")
+        self.write(blog_md, "# Blog edited")
+        self.watcher.handle({blog_md})
+
+        self.assertEqual(self.read(os.path.join(self.public, "blog", "index.html")), "Blog edited|<div><h1>Blog edited</h1></div>")
+        self.assertEqual(os.stat(home).st_mtime_ns, 0)
+
+    def test_new_and_deleted_pages(self):
+        new_md = os.path.join(self.content, "blog", "new.md")
+        self.write(new_md, "# New")
+        self.watcher.handle({new_md})
+        self.assertTrue(os.path.exists(os.path.join(self.public, "blog", "new.html")))
+
+        os.remove(new_md)
+        self.watcher.handle({new_md})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "new.html")))
+
+    def test_template_change_rebuilds_dependents(self):
+        self.write(self.template, "[{{ Title }}]")
+        self.watcher.handle({self.template})
+        self.assertEqual(self.read(os.path.join(self.public, "index.html")), "[Home]")
+        self.assertEqual(self.read(os.path.join(self.public, "blog", "index.html")), "[Blog]")
+
+    def test_watches_includes_outside_content(self):
+        footer = os.path.join(self.root, "partials", "footer.html")
+        self.write(footer, "footer")
+        self.assertEqual(self.watcher.watched_files(), {self.template})
+
+        self.write(self.template, '{{ Title }}{% include "partials/footer.html" %}')
+        self.watcher.handle({self.template})
+        self.assertEqual(self.watcher.watched_files(), {self.template, footer})
+
+        self.write(footer, "edited")
+        self.watcher.handle({footer})
+        self.assertEqual(self.read(os.path.join(self.public, "blog", "index.html")), "Blogedited")
+
+    def test_watch_saves_when_idle_and_follows_new_includes(self):
+        footer = self.write("partials/footer.html", "footer")
+        self.write(self.template, '{{ Title }}{% include "partials/footer.html" %}')
+        watcher = ScriptedWatcher([{self.template}, set(), {footer}])
+        saves = []
+        self.watcher.save = lambda: saves.append(len(watcher.timeouts))
+
+        with redirect_stdout(io.StringIO()):
+            self.watcher.watch(watcher, max_batches=2, save_delay=0.5)
+
+        # Waits without a timeout until there is something to save, then
+        # saves once changes pause and again on exit.
+        self.assertEqual(watcher.timeouts, [None, 0.5, None])
+        self.assertEqual(saves, [2, 3])
+        self.assertEqual(watcher.added, {footer})
+
+    def test_new_layout_rescans(self):
+        layout = os.path.join(self.content, "blog", "layout.html")
+        self.write(layout, "blog layout {{ Title }}")
+        self.watcher.handle({layout})
+        self.assertEqual(self.read(os.path.join(self.public, "blog", "index.html")), "blog layout Blog")
+
+    def test_static_changes(self):
+        css = os.path.join(self.static, "index.css")
+        self.write(css, "body { margin: 0 }")
+        self.watcher.handle({css})
+        self.assertEqual(self.read(os.path.join(self.public, "index.css")), "body { margin: 0 }")
+
+        os.remove(css)
+        self.watcher.handle({css})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+
+    def test_fingerprinted_asset_change_relinks_pages(self):
+        self.write(self.template, '<link href="/index.css">{{ Content }}')
+        options = PageOptions(assets=AssetMap())
+        sync_files(self.static, self.public, self.manifest, assets=options.assets)
+        watcher = SiteWatcher(
+            self.content, self.template, self.public, self.static, "/", self.manifest, options=options
+        )
+        watcher.rebuild_all()
+
+        css = os.path.join(self.static, "index.css")
+        self.write(css, "body { margin: 0 }")
+        watcher.handle({css})
+
+        new_url = options.assets.urls["/index.css"]
+        self.assertEqual(self.read(os.path.join(self.public, new_url[1:])), "body { margin: 0 }")
+        self.assertIn(f'href="{new_url}"', self.read(os.path.join(self.public, "blog", "index.html")))
+
+
+class ScriptedWatcher:
+    # Reports the given batches of changed paths in turn.
+    def __init__(self, batches):
+        self.batches = list(batches)
+        self.timeouts = []
+        self.added = set()
+
+    def changes(self, timeout=None):
+        self.timeouts.append(timeout)
+        return self.batches.pop(0)
+
+    def add_files(self, paths):
+        self.added.update(paths)
+
+    def close(self):
+        pass
+
+
+class TestWatchers(TempDirMixin, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = os.path.join(self.root, "content")
+        self.file = os.path.join(self.root, "template.html")
+        self.write(os.path.join(self.dir, "a.md"), "a")
+        self.write(self.file, "t")
+        self.write(os.path.join(self.root, "other.txt"), "x")
+
+    def check_watcher(self, watcher):
+        try:
+            self.assertEqual(watcher.changes(timeout=0), set())
+
+            nested = os.path.join(self.dir, "sub", "b.md")
+            self.write(nested, "b")
+            self.write(self.file, "template edited")
+            self.write(os.path.join(self.root, "other.txt"), "ignored")
+
+            changed = set()
+            for _ in range(20):
+                changed |= watcher.changes(timeout=0.1)
+                if self.file in changed:
+                    break
+
+            self.assertIn(self.file, changed)
+            self.assertTrue({nested, os.path.dirname(nested)} & changed)
+            self.assertNotIn(os.path.join(self.root, "other.txt"), changed)
+
+            # Files added later are reported too.
+            other = os.path.join(self.root, "other.txt")
+            watcher.add_files([other])
+            self.write(other, "watched")
+            changed = set()
+            for _ in range(20):
+                changed |= watcher.changes(timeout=0.1)
+                if other in changed:
+                    break
+            self.assertIn(other, changed)
+        finally:
+            watcher.close()
+
+    def test_polling_watcher(self):
+        self.check_watcher(PollingWatcher([self.dir], [self.file], interval=0.01))
+
+    def test_inotify_watcher(self):
+        try:
+            watcher = InotifyWatcher([self.dir], [self.file])
+        except (OSError, AttributeError, TypeError):
+            self.skipTest("inotify is not available")
+        self.check_watcher(watcher)
+
+
+if __name__ == "__main__":
+    unittest.main()
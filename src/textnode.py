@@ -1,5 +1,5 @@
 from enum import Enum
-from htmlnode import LeafNode
+from htmlnode import LeafNode, ParentNode
 
 class TextType(Enum):
     TEXT = "text"        # plain text
@@ -11,10 +11,14 @@ class TextType(Enum):
 
 
 class TextNode:
-    def __init__(self, text, text_type, url=None):
+    __slots__ = ("text", "text_type", "url", "children")
+
+    def __init__(self, text, text_type, url=None, children=None):
         self.text = text
         self.text_type = text_type
         self.url = url
+        # Nested inline nodes, e.g. the italic span inside **bold _and_ italic**.
+        self.children = children
 
     def __eq__(self, other):
         if not isinstance(other, TextNode):
@@ -23,23 +27,39 @@ class TextNode:
             self.text == other.text
             and self.text_type == other.text_type
             and self.url == other.url
+            and self.children == other.children
         )
 
     def __repr__(self):
+        if self.children:
+            return f"TextNode({self.text}, {self.text_type.value}, {self.url}, {self.children})"
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
 
-def text_node_to_html_node(text_node):
+def text_node_to_html_node(text_node, urls=None):
     if text_node.text_type == TextType.TEXT:
         return LeafNode(None, text_node.text)
     elif text_node.text_type == TextType.BOLD:
+        if text_node.children:
+            return ParentNode("b", [text_node_to_html_node(c, urls) for c in text_node.children])
         return LeafNode("b", text_node.text)
     elif text_node.text_type == TextType.ITALIC:
+        if text_node.children:
+            return ParentNode("i", [text_node_to_html_node(c, urls) for c in text_node.children])
         return LeafNode("i", text_node.text)
     elif text_node.text_type == TextType.CODE:
         return LeafNode("code", text_node.text)
     elif text_node.text_type == TextType.LINK:
-        return LeafNode("a", text_node.text, {"href":text_node.url})
+        url = text_node.url if urls is None else urls.resolve(text_node.url)
+        return LeafNode("a", text_node.text, {"href": url})
     elif text_node.text_type == TextType.IMAGE:
-        return LeafNode("img", "", {"src":text_node.url, "alt": text_node.text})
+        if urls is None:
+            return LeafNode("img", "", {"src": text_node.url, "alt": text_node.text})
+        props = {"src": urls.resolve(text_node.url), "alt": text_node.text}
+        size = urls.image_size(text_node.url)
+        if size is not None:
+            # Intrinsic dimensions let the browser lay out before it loads.
+            props["width"] = str(size[0])
+            props["height"] = str(size[1])
+        return LeafNode("img", "", props)
     else:
         raise Exception("Invalid TextType")
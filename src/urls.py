@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+# Site-relative href/src attributes; protocol-relative "//host" URLs excluded.
+url_attribute_pattern = re.compile(r'(href|src)="(/(?!/)[^"]*)"')
+
+# "https:", "mailto:", "data:" ... anything with a scheme points off-site.
+scheme_pattern = re.compile(r"[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+link_tag_pattern = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+stylesheet_rel_pattern = re.compile(r'\brel="stylesheet"', re.IGNORECASE)
+href_pattern = re.compile(r'\bhref="([^"]*)"')
+
+# Static files that get a content hash in their name with --fingerprint.
+# Anything else (robots.txt, favicon.ico, ...) keeps the name clients ask for.
+FINGERPRINT_EXTENSIONS = (
+    ".css", ".js", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".woff", ".woff2",
+)
+
+FINGERPRINT_LENGTH = 10
+
+
+def normalize_basepath(basepath):
+    if not basepath.startswith("/"):
+        basepath = "/" + basepath
+    return basepath.rstrip("/")
+
+
+def fingerprint_name(name, digest):
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+class AssetMap:
+    # What the build knows about static files, by site URL: the URL each
+    # fingerprinted file is served at (e.g. "/index.css" ->
+    # "/index.3f9a1c0b2e.css"), each image's [width, height] and the
+    # minified text of stylesheets small enough to inline. `fingerprint`
+    # says whether sync_files should rename files at all.
+    def __init__(self, urls=None, sizes=None, styles=None, fingerprint=True):
+        self.urls = dict(urls or {})
+        self.sizes = dict(sizes or {})
+        self.styles = dict(styles or {})
+        self.fingerprint = fingerprint
+        self._digest = None
+
+    def add(self, url, fingerprinted_url):
+        self.urls[url] = fingerprinted_url
+        self._digest = None
+
+    def add_size(self, url, size):
+        self.sizes[url] = list(size)
+        self._digest = None
+
+    def add_style(self, url, css):
+        self.styles[url] = css
+        self._digest = None
+
+    def get(self, url, default=None):
+        return self.urls.get(url, default)
+
+    def state(self, url):
+        # Everything a reference to `url` renders from: the URL it is served
+        # at, its image size and (by hash) the stylesheet inlined for it.
+        # Pages and cache entries keep the states of the assets they use
+        # and are only redone when one of those changes.
+        css = self.styles.get(url)
+        if css is not None:
+            css = hashlib.sha256(css.encode()).hexdigest()[:16]
+        return [self.urls.get(url), self.sizes.get(url), css]
+
+    @property
+    def digest(self):
+        # Changes whenever anything in the map does.
+        if self._digest is None:
+            data = json.dumps([self.urls, self.sizes, self.styles], sort_keys=True).encode()
+            self._digest = hashlib.sha256(data).hexdigest()
+        return self._digest
+
+    def save(self, path):
+        dest_dir = os.path.dirname(path)
+        if dest_dir:
+            os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            data = {"urls": self.urls, "sizes": self.sizes, "inlined": sorted(self.styles)}
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.urls)
+
+
+def _is_site_url(url):
+    return url.startswith("/") and not url.startswith("//")
+
+
+def _path_end(url):
+    # Where the path ends and any query string or fragment begins.
+    end = len(url)
+    for sep in "?#":
+        pos = url.find(sep)
+        if pos != -1:
+            end = min(end, pos)
+    return end
+
+
+def site_path(url):
+    # The path part of a site-relative URL, or None for any other URL.
+    if not _is_site_url(url):
+        return None
+    return url[: _path_end(url)]
+
+
+def is_relative_url(url):
+    # "../images/a.png", "b.html#top": a path resolved against the page.
+    return _path_end(url) > 0 and not url.startswith("/") and not scheme_pattern.match(url)
+
+
+class SiteUrls:
+    # How site-relative URLs in content and templates are written out: with
+    # the basepath in front and, when fingerprinting, the hashed asset name.
+    # With an asset map, every path looked up is remembered in `used`.
+    # Cache keys only say whether there is an asset map; what was rendered
+    # from it is checked against asset_states instead. `page_dir` is the
+    # site directory of the page being rendered ("/blog/"): relative
+    # references to fingerprinted files are resolved against it.
+    def __init__(self, basepath="/", assets=None, page_dir=None):
+        self.basepath = normalize_basepath(basepath)
+        self.assets = assets
+        self.page_dir = page_dir
+        self.key = self.basepath if assets is None else f"{self.basepath}\0assets"
+        self.used = set()
+
+    def recorder(self):
+        # Same settings, with its own `used` set.
+        return SiteUrls(self.basepath, self.assets)
+
+    def local_path(self, url):
+        # The site path a URL points at: the path of a site-relative URL, or
+        # with a page_dir that of a relative one; None for anything else.
+        path = site_path(url)
+        if path is None and self.page_dir is not None and is_relative_url(url):
+            path = posixpath.normpath(posixpath.join(self.page_dir, url[: _path_end(url)]))
+        return path
+
+    def resolve(self, url):
+        # Protocol-relative URLs ("//host/...") point off-site and are left alone.
+        if _is_site_url(url):
+            if self.assets is not None:
+                end = _path_end(url)
+                path = url[:end]
+                self.used.add(path)
+                url = self.assets.get(path, path) + url[end:]
+            return self.basepath + url
+        if self.assets is None:
+            return url
+        path = self.local_path(url)
+        if path is None:
+            return url
+        # A relative reference only changes if its target was renamed; the
+        # renamed file is then linked by its site URL.
+        self.used.add(path)
+        fingerprinted = self.assets.get(path)
+        if fingerprinted is None:
+            return url
+        return self.basepath + fingerprinted + url[_path_end(url) :]
+
+    def image_size(self, url):
+        # (width, height) of a local image, if the build measured it.
+        if self.assets is None:
+            return None
+        path = self.local_path(url)
+        if path is None:
+            return None
+        self.used.add(path)
+        return self.assets.sizes.get(path)
+
+    def asset_states(self, paths):
+        # {path: AssetMap.state} for site paths; empty without an asset map.
+        if self.assets is None:
+            return {}
+        return {path: self.assets.state(path) for path in paths if path is not None}
+
+    def assets_match(self, states):
+        # Whether output rendered with these asset states is still right.
+        if self.assets is None:
+            return not states
+        return all(self.assets.state(path) == state for path, state in states.items())
+
+    def reuse(self, states):
+        # assets_match for output about to be reused, e.g. a cache entry;
+        # if it matches, its assets count as used here.
+        if not self.assets_match(states):
+            return False
+        self.used.update(states)
+        return True
+
+    def rewrite(self, html):
+        # Only for a template's static markup, once when it is compiled; page
+        # content resolves its URLs as its nodes are rendered.
+        if not self.basepath and self.assets is None:
+            return html
+        if self.assets is not None and self.assets.styles:
+            html = link_tag_pattern.sub(self._inline_stylesheet, html)
+        return url_attribute_pattern.sub(
+            lambda m: f'{m.group(1)}="{self.resolve(m.group(2))}"', html
+        )
+
+    def _inline_stylesheet(self, match):
+        # <link rel="stylesheet" href="/x.css"> -> <style>...</style>, saving
+        # a render-blocking request for small stylesheets.
+        tag = match.group(0)
+        href = href_pattern.search(tag)
+        if href is None or not stylesheet_rel_pattern.search(tag):
+            return tag
+        self.used.add(href.group(1))
+        css = self.assets.styles.get(href.group(1))
+        return tag if css is None else f"<style>{css}</style>"
@@ -0,0 +1,457 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from compress import compress_outputs
+from copystatic import sync_files, sync_paths
+from gencontent import generate_pages_recursive, page_for_source, update_pages
+from linkcheck import report_broken_links
+from manifest import generator_hash, remove_output
+from siteindex import DEFAULT_IGNORE, SiteIndex, ignore_matcher
+from template import LAYOUT_NAME
+from urls import AssetMap
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+)
+
+event_header = struct.Struct("iIII")
+
+# Editors often save a file in several steps; wait this long after the first
+# event so the whole burst is handled as one rebuild.
+DEBOUNCE_SECONDS = 0.02
+
+POLL_INTERVAL = 0.25
+
+# The manifest, search store and deploy delta are saved once changes pause
+# for this long (and on exit) rather than after every batch: on a large site
+# saving takes longer than the rebuild itself.
+SAVE_DELAY = 1.0
+
+
+def _walk_dirs(root):
+    dirs = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                dirs.append(directory)
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+    return dirs
+
+
+def _snapshot(dirs, files):
+    state = {}
+    for root in dirs:
+        for directory in _walk_dirs(root):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        st = entry.stat()
+                        state[entry.path] = (st.st_size, st.st_mtime_ns)
+    for path in files:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state[path] = (st.st_size, st.st_mtime_ns)
+    return state
+
+
+class PollingWatcher:
+    def __init__(self, dirs, files, interval=POLL_INTERVAL):
+        self.dirs = dirs
+        self.files = files
+        self.interval = interval
+        self.state = _snapshot(dirs, files)
+
+    def changes(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = _snapshot(self.dirs, self.files)
+            changed = {
+                path
+                for path in state.keys() | self.state.keys()
+                if state.get(path) != self.state.get(path)
+            }
+            self.state = state
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+            time.sleep(self.interval)
+
+    def add_files(self, paths):
+        new = set(paths) - set(self.files)
+        self.files = list(self.files) + sorted(new)
+        self.state.update(_snapshot([], new))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    def __init__(self, dirs, files):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Trees report every event; the directories holding single watched
+        # files (template.html) only report those files.
+        self.dirs = {}
+        self.tree_wds = set()
+        self.files = set(files)
+        for directory in {os.path.dirname(path) for path in files}:
+            self._watch(directory)
+        for root in dirs:
+            self._watch_tree(root)
+
+    def _watch(self, directory, tree=False):
+        wd = self._add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            return
+        self.dirs[wd] = directory
+        if tree:
+            self.tree_wds.add(wd)
+
+    def _watch_tree(self, root):
+        for directory in _walk_dirs(root):
+            self._watch(directory, tree=True)
+
+    def add_files(self, paths):
+        watched = set(self.dirs.values())
+        for directory in {os.path.dirname(path) for path in paths} - watched:
+            self._watch(directory)
+        self.files.update(paths)
+
+    def changes(self, timeout=None):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        time.sleep(DEBOUNCE_SECONDS)
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            changed.update(self._parse(data))
+        return changed
+
+    def _parse(self, data):
+        changed = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, length = event_header.unpack_from(data, pos)
+            pos += event_header.size
+            name = os.fsdecode(data[pos : pos + length].rstrip(b"\0"))
+            pos += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped; report every watched directory.
+                changed.update(self.dirs[wd] for wd in self.tree_wds)
+                changed.update(self.files)
+                continue
+
+            if mask & IN_IGNORED:
+                self.dirs.pop(wd, None)
+                self.tree_wds.discard(wd)
+                continue
+
+            directory = self.dirs.get(wd)
+            if directory is None or not name:
+                continue
+
+            path = os.path.join(directory, name)
+            if wd not in self.tree_wds:
+                if path in self.files:
+                    changed.add(path)
+                continue
+
+            changed.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # Anything created before this watch existed is reported via
+                # the directory path itself.
+                self._watch_tree(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def make_watcher(dirs, files):
+    try:
+        return InotifyWatcher(dirs, files)
+    except (OSError, AttributeError, TypeError):
+        # No inotify (non-Linux, or no libc symbol): fall back to polling.
+        return PollingWatcher(dirs, files)
+
+
+def _is_within(path, directory):
+    return path == directory or path.startswith(os.path.join(directory, ""))
+
+
+class SiteWatcher:
+    # Keeps the manifest, the page list and compiled templates in memory and
+    # turns each batch of file changes into the smallest rebuild that covers it.
+
+    def __init__(
+        self,
+        dir_path_content,
+        template_path,
+        dir_path_public,
+        dir_path_static,
+        basepath,
+        manifest,
+        use_hash=False,
+        link=False,
+        options=None,
+        deploy_path=None,
+        gzip=False,
+        asset_map_path=None,
+        images=None,
+        css=None,
+        search=None,
+        ignore=DEFAULT_IGNORE,
+    ):
+        self.dir_path_content = dir_path_content
+        self.template_path = template_path
+        self.dir_path_public = dir_path_public
+        self.dir_path_static = dir_path_static
+        self.basepath = basepath
+        self.manifest = manifest
+        self.use_hash = use_hash
+        self.link = link
+        self.options = options
+        self.deploy_path = deploy_path
+        self.gzip = gzip
+        self.asset_map_path = asset_map_path
+        self.images = images
+        self.css = css
+        self.search = search
+        self.ignore = ignore
+        self.ignored = ignore_matcher(ignore)
+        self.generator = generator_hash()
+        # Destination paths of the pages the last handle() rendered.
+        self.rebuilt = []
+        self._load_pages(self._scan())
+
+    def _scan(self):
+        return SiteIndex.scan(self.dir_path_content, self.dir_path_public, ignore=self.ignore)
+
+    def _load_pages(self, index):
+        pages = index.pages(self.template_path)
+        self.pages = {page[0]: page for page in pages}
+        self.pages_by_dest = {page[2]: page for page in pages}
+
+    def rebuild_all(self):
+        index = self._scan()
+        failures = generate_pages_recursive(
+            self.dir_path_content,
+            self.template_path,
+            self.dir_path_public,
+            self.basepath,
+            self.manifest,
+            options=self.options,
+            search=self.search,
+            index=index,
+        )
+        self._load_pages(index)
+        self.rebuilt = list(self.manifest.pages)
+        return failures
+
+    def handle(self, paths):
+        static_paths = []
+        sources = set()
+        dependencies = set()
+        rescan = False
+
+        for path in sorted(paths):
+            if self.ignored(os.path.basename(path)):
+                # Editor swap and backup files never reach the output.
+                continue
+            if _is_within(path, self.dir_path_static):
+                static_paths.append(path)
+            elif _is_within(path, self.dir_path_content):
+                if path.endswith(".md"):
+                    sources.add(path)
+                elif os.path.basename(path) == LAYOUT_NAME or os.path.isdir(path):
+                    rescan = True
+                elif not os.path.exists(path) and path not in self.manifest.files:
+                    # A deleted directory: we can't tell what was in it.
+                    rescan = True
+                else:
+                    dependencies.add(path)
+            else:
+                dependencies.add(path)
+
+        if static_paths and self.options is not None and self.options.assets is not None:
+            # Fingerprinted names, image sizes and inlined styles depend on
+            # content: resync the whole tree for a fresh asset map, and
+            # rebuild pages if it changed.
+            assets = AssetMap(fingerprint=self.options.assets.fingerprint)
+            sync_files(
+                self.dir_path_static,
+                self.dir_path_public,
+                self.manifest,
+                self.use_hash,
+                self.link,
+                assets,
+                self.images,
+                self.css,
+                ignore=self.ignore,
+            )
+            if assets.digest != self.options.assets.digest:
+                self.options.assets = assets
+                if self.asset_map_path is not None:
+                    assets.save(self.asset_map_path)
+                rescan = True
+        elif static_paths:
+            sync_paths(
+                static_paths,
+                self.dir_path_static,
+                self.dir_path_public,
+                self.manifest,
+                self.use_hash,
+                self.link,
+                self.images,
+                self.css,
+                self.ignore,
+            )
+
+        if rescan:
+            return self.rebuild_all()
+
+        pages = {}
+        for path in sources:
+            if os.path.isfile(path):
+                page = self.pages.get(path) or page_for_source(
+                    path, self.dir_path_content, self.template_path, self.dir_path_public
+                )
+                pages[path] = page
+            else:
+                self._remove_page(path)
+
+        for path in dependencies:
+            for dest_path in self.manifest.dependents(os.path.abspath(path)):
+                page = self.pages_by_dest.get(dest_path)
+                if page is not None:
+                    pages[page[0]] = page
+
+        for page in pages.values():
+            self.pages[page[0]] = page
+            self.pages_by_dest[page[2]] = page
+        self.rebuilt = [page[2] for page in pages.values()]
+
+        _, failures = update_pages(
+            [pages[path] for path in sorted(pages)],
+            self.basepath,
+            self.manifest,
+            generator=self.generator,
+            options=self.options,
+            search=self.search,
+        )
+        return failures
+
+    def watched_files(self):
+        # The root template and every other template file a page was built
+        # from (includes may live outside the content tree); the content and
+        # static trees are watched whole.
+        return {self.template_path} | self._outside_inputs(self.manifest.pages)
+
+    def _outside_inputs(self, dest_paths):
+        trees = [os.path.abspath(self.dir_path_content), os.path.abspath(self.dir_path_static)]
+        files = set()
+        for dest_path in dest_paths:
+            entry = self.manifest.pages.get(dest_path)
+            if entry is None:
+                continue
+            for path in entry["inputs"]["files"]:
+                if not any(_is_within(path, tree) for tree in trees):
+                    files.add(path)
+        return files
+
+    def _remove_page(self, from_path):
+        page = self.pages.pop(from_path, None)
+        if page is None:
+            return
+        dest_path = page[2]
+        self.pages_by_dest.pop(dest_path, None)
+        print(f"Removing stale page {dest_path}")
+        remove_output(dest_path, self.dir_path_public)
+        self.manifest.forget_page(dest_path)
+        self.manifest.forget_output(dest_path)
+        if self.search is not None:
+            self.search.remove(dest_path)
+
+    def watch(self, watcher=None, max_batches=None, save_delay=SAVE_DELAY):
+        files = self.watched_files()
+        if watcher is None:
+            watcher = make_watcher([self.dir_path_content, self.dir_path_static], sorted(files))
+        print(f"Watching for changes ({type(watcher).__name__})...")
+
+        batches = 0
+        unsaved = False
+        try:
+            while max_batches is None or batches < max_batches:
+                paths = watcher.changes(save_delay if unsaved else None)
+                if not paths:
+                    if unsaved:
+                        self.save()
+                        unsaved = False
+                    continue
+
+                start = time.perf_counter()
+                self.handle(paths)
+                if self.search is not None:
+                    self.search.write(self.manifest)
+                if self.options is not None and self.options.check_links:
+                    report_broken_links(self.manifest, self.dir_path_public, self.options.assets)
+                if self.gzip:
+                    compress_outputs(self.manifest)
+                # Only the pages just rendered can have picked up new includes.
+                new_files = self._outside_inputs(self.rebuilt) - files
+                if new_files:
+                    watcher.add_files(new_files)
+                    files |= new_files
+                elapsed = (time.perf_counter() - start) * 1000
+                print(f"Rebuilt {len(paths)} change(s) in {elapsed:.1f} ms")
+                unsaved = True
+                batches += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self.save()
+
+    def save(self):
+        # The deploy manifest covers the initial build and every batch since.
+        self.manifest.save()
+        if self.search is not None:
+            self.search.save()
+        if self.deploy_path is not None:
+            self.manifest.write_delta(self.deploy_path, self.dir_path_public)